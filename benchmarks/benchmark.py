@@ -0,0 +1,419 @@
+"""
+
+This module contains benchmarks of the image deidentification functions.
+
+The benchmark suite (`run_benchmark`) generates synthetic mammograms of
+realistic sizes and bit depths, with or without burned-in text, and times
+each stage of the deidentification of every file:
+
+- `decode`: reading the DICOM file and decoding its pixels.
+- `lut`: building the 8-bit image read by the OCR (windowing).
+- `ocr`: reading the words of the image.
+- `redaction`: hiding the words on the pixels.
+- `encode`: encoding the DICOM pixels and the PNG file.
+- `write`: writing the output files.
+
+The throughput of `df2dicom` on the same files is measured too. Another
+`reader` can be given to `run_benchmark` to replace the OCR, so that the
+other stages can be benchmarked alone. Results are written as JSON, to
+compare releases. The benchmarks are not part of the installed package:
+run them from the root of the repository, with deidcm installed:
+
+    python benchmarks/benchmark.py --output results.json
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from typing import Callable
+
+try:
+    from importlib import metadata
+except ImportError:
+    # Python < 3.8
+    import importlib_metadata as metadata
+
+import numpy as np
+import pydicom
+from PIL import Image, ImageFilter
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from deidcm.config import Config
+from deidcm.deid_verification import add_words_on_image
+from deidcm.dicom.deid_mammogram import get_PIL_image, get_text_areas, hide_text, numpy2bytes
+from deidcm.dicom.df2dicom import df2dicom
+from deidcm.dicom.dicom2df import dicom2df
+from deidcm.dicom.encoding import encode_frames, set_encoded_pixel_data
+from deidcm.dicom.png_export import encode_png
+from deidcm.dicom.redaction import get_redaction_boxes
+from deidcm.dicom.utils import log
+
+DIGITAL_MAMMOGRAPHY_SOP_CLASS_UID = '1.2.840.10008.5.1.4.1.1.1.2'
+
+# (rows, columns) of common full-field digital mammography detectors
+MAMMOGRAM_SHAPES = {
+    'small': (1024, 832),
+    'medium': (2294, 1914),
+    'large': (3328, 2560),
+    'xlarge': (4096, 3328)
+}
+BENCHMARK_STAGES = ('decode', 'lut', 'ocr', 'redaction', 'encode', 'write')
+BENCHMARK_WORDS = ['DUPONT', 'MARIE', '12/03/1954', 'CENTRE', 'IMAGERIE', 'MAMMO']
+
+
+def time_function(function: Callable, repeat: int = 3) -> float:
+    """Returns the best execution time of `function` over `repeat` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def legacy_pil_blur(pixels: np.ndarray, ocr_data: list, margin: int = 300) -> np.ndarray:
+    """Blur words like the previous implementation of `hide_text(mode="blur")` (30 PIL BLUR passes)"""
+    im = Image.fromarray(pixels)
+    for x1, y1, x2, y2 in get_redaction_boxes(ocr_data, margin):
+        box = (int(x1), int(y1), int(x2) + 1, int(y2) + 1)
+        cut = im.crop(box)
+        for _ in range(30):
+            cut = cut.filter(ImageFilter.BLUR)
+        im.paste(cut, box)
+    return np.asarray(im)
+
+
+def get_sample_ocr_data(shape: tuple, nb_words: int = 4) -> list:
+    """Returns fake OCR results spread along the left border of an image"""
+    height = shape[0]
+    ocr_data = []
+    for i in range(nb_words):
+        y = int((i + 0.5) * height / nb_words)
+        ocr_data.append(([[50, y], [250, y], [250, y + 40], [50, y + 40]], 'PATIENT', 0.9))
+    return ocr_data
+
+
+def benchmark_blur(shape: tuple = (3328, 2560), nb_words: int = 4, margin: int = 300,
+                   repeat: int = 3) -> dict:
+    """Compare the legacy PIL blur with the box-filter blur of `hide_text`.
+
+    Args:
+        shape: The shape of the synthetic 8-bit image.
+        nb_words: The number of words to blur.
+        margin: The margin around each word, as in `hide_text`.
+        repeat: The number of runs of each implementation. The best run is kept.
+
+    Returns:
+        A dictionary with the execution time of each implementation, in seconds.
+    """
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=shape, dtype=np.uint8)
+    ocr_data = get_sample_ocr_data(shape, nb_words)
+    results = {
+        'shape': list(shape),
+        'nb_words': nb_words,
+        'margin': margin,
+        'legacy_pil_blur': time_function(
+            lambda: legacy_pil_blur(pixels, ocr_data, margin), repeat),
+        'box_blur': time_function(
+            lambda: hide_text(pixels, ocr_data, mode='blur', margin=margin), repeat),
+        'pixelate': time_function(
+            lambda: hide_text(pixels, ocr_data, mode='pixelate', margin=margin), repeat),
+    }
+    results['speedup'] = results['legacy_pil_blur'] / results['box_blur']
+    return results
+
+
+def create_synthetic_mammogram(shape: tuple, bits_stored: int = 12, seed: int = 0) -> np.ndarray:
+    """Create the pixels of a synthetic mammogram: a noisy breast on a black background.
+
+    Args:
+        shape: The (rows, columns) of the image.
+        bits_stored: The number of bits of the pixel values (8 to 16).
+        seed: The seed of the noise.
+
+    Returns:
+        A uint8 (8 bits) or uint16 array.
+    """
+    rng = np.random.default_rng(seed)
+    rows, columns = shape
+    y, x = np.ogrid[:rows, :columns]
+    # Half ellipse against the left border, brighter towards the chest wall
+    distance = np.sqrt(((y - rows / 2) / (0.45 * rows)) ** 2 + (x / (0.6 * columns)) ** 2)
+    breast = np.clip(1 - distance, 0, None) ** 0.3 * (distance < 1)
+    noise = rng.normal(0, 0.03, size=shape) * (distance < 1)
+    max_value = 2 ** bits_stored - 1
+    pixels = np.clip((0.15 + 0.7 * breast + noise) * (distance < 1) * max_value, 0, max_value)
+    return pixels.astype(np.uint8 if bits_stored == 8 else np.uint16)
+
+
+def burn_words(pixels: np.ndarray, words: list, font: str, bits_stored: int = 12,
+               text_size: int = 2, seed: int = 0) -> np.ndarray:
+    """Burn words in the background of an image, with the maximum pixel value.
+
+    Words are placed by [add_words_on_image][deidcm.deid_verification.add_words_on_image]
+    on an 8-bit copy of the image, then copied on the pixels at their bit depth.
+
+    Args:
+        pixels: The pixels of the image, see `create_synthetic_mammogram`.
+        words: The words to burn in.
+        font: The path of a TrueType font.
+        bits_stored: The number of bits of the pixel values.
+        text_size: The size of the text, from 1 to 5.
+        seed: The seed of the random positions of the words.
+
+    Returns:
+        A copy of the pixels with the words burned in.
+    """
+    random.seed(seed)
+    eight_bits = (pixels >> (bits_stored - 8)).astype(np.uint8)
+    # add_words_on_image rescales the image through floats before drawing
+    reference = np.uint8(eight_bits / 255 * 255)
+    burned, _, _ = add_words_on_image(eight_bits, words, text_size, font)
+    pixels = pixels.copy()
+    pixels[burned != reference] = 2 ** bits_stored - 1
+    return pixels
+
+
+def write_synthetic_mammograms(outdir: str, count: int, shape: tuple, bits_stored: int = 12,
+                               font: str = None, words: list = None, seed: int = 0) -> list:
+    """Write synthetic mammograms with windowing information in outdir.
+
+    Args:
+        outdir: The directory of the DICOM files.
+        count: The number of files.
+        shape: The (rows, columns) of the images.
+        bits_stored: The number of bits of the pixel values.
+        font: If given, the path of the TrueType font used to burn words in the images.
+        words: The words burned in, `BENCHMARK_WORDS` by default.
+        seed: The seed of the first image.
+
+    Returns:
+        list: The paths of the DICOM files.
+    """
+    paths = []
+    for index in range(count):
+        pixels = create_synthetic_mammogram(shape, bits_stored, seed + index)
+        if font is not None:
+            pixels = burn_words(pixels, words or BENCHMARK_WORDS, font, bits_stored, seed=seed + index)
+        path = os.path.join(outdir, f'synthetic_{index:04d}.dcm')
+        create_mammogram_dataset(pixels, bits_stored).save_as(path, write_like_original=False)
+        paths.append(path)
+    return paths
+
+
+def create_mammogram_dataset(pixels: np.ndarray, bits_stored: int = 12) -> Dataset:
+    """Create a digital mammography dataset storing `pixels`, windowed on `bits_stored` bits"""
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.file_meta.MediaStorageSOPClassUID = DIGITAL_MAMMOGRAPHY_SOP_CLASS_UID
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.SOPClassUID = DIGITAL_MAMMOGRAPHY_SOP_CLASS_UID
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = 'MG'
+    ds.is_little_endian, ds.is_implicit_VR = True, False
+    ds.Rows, ds.Columns = pixels.shape
+    ds.BitsAllocated = pixels.dtype.itemsize * 8
+    ds.BitsStored, ds.HighBit = bits_stored, bits_stored - 1
+    ds.SamplesPerPixel, ds.PixelRepresentation = 1, 0
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.WindowCenter, ds.WindowWidth = 2 ** (bits_stored - 1), 2 ** bits_stored
+    ds.PixelData = pixels.tobytes()
+    return ds
+
+
+def time_stages(path: str, outdir: str, reader=None, output_encoding: str = None,
+                png_options: dict = None) -> dict:
+    """Deidentify a DICOM file stage by stage and return the duration of each stage, in seconds.
+
+    Args:
+        path: The path of the DICOM file.
+        outdir: The directory of the DICOM and PNG outputs.
+        reader: The OCR reader. If None, a cached easyOCR reader is used.
+        output_encoding: If given, the lossless encoding of the DICOM output (see `deidcm.dicom.encoding`).
+        png_options: The options of `encode_png` (`bit_depth`, `compression`, `strategy`).
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = now - start
+        start = now
+
+    ds = pydicom.dcmread(path)
+    pixels = ds.pixel_array
+    lap('decode')
+    ocr_image = np.array(get_PIL_image(ds, pixels=pixels))
+    lap('lut')
+    ocr_data = get_text_areas(ocr_image, reader=reader)
+    lap('ocr')
+    pixels = hide_text(pixels, ocr_data) if ocr_data else pixels
+    lap('redaction')
+    if output_encoding is not None:
+        set_encoded_pixel_data(ds, encode_frames(pixels, ds.BitsAllocated, output_encoding), output_encoding)
+    else:
+        ds.PixelData = numpy2bytes(pixels, ds)
+    png = encode_png(pixels, **(png_options or {}))
+    lap('encode')
+    outpath = os.path.join(outdir, os.path.splitext(os.path.basename(path))[0])
+    ds.save_as(f'{outpath}.dcm', write_like_original=False)
+    with open(f'{outpath}.png', 'wb') as f:
+        f.write(png)
+    lap('write')
+    return timings
+
+
+def summarize_timings(timings: list) -> dict:
+    """Aggregate the stage durations of several files (total, mean, min and max per stage)"""
+    summary = {}
+    for stage in BENCHMARK_STAGES:
+        values = [timing[stage] for timing in timings]
+        summary[stage] = {
+            'total': sum(values),
+            'mean': sum(values) / len(values),
+            'min': min(values),
+            'max': max(values)
+        }
+    total = sum(summary[stage]['total'] for stage in BENCHMARK_STAGES)
+    summary['images_per_second'] = len(timings) / total if total else None
+    return summary
+
+
+def benchmark_df2dicom(indir: str, outdir: str, reader=None, **df2dicom_options) -> dict:
+    """Measure the throughput of df2dicom on a directory of DICOM files.
+
+    Args:
+        indir: The directory of the DICOM files.
+        outdir: The directory of the outputs.
+        reader: The OCR reader. If None, a cached easyOCR reader is used.
+        df2dicom_options: Other keyword arguments given to `df2dicom`.
+
+    Returns:
+        dict: The number of files, the duration in seconds and the number of images per second.
+    """
+    df = dicom2df(indir)
+    options = {'do_image_deidentification': True, 'output_file_formats': ['dcm', 'png']}
+    options.update(df2dicom_options)
+    start = time.perf_counter()
+    df2dicom(df, outdir, reader=reader, **options)
+    seconds = time.perf_counter() - start
+    return {'files': len(df), 'seconds': seconds, 'images_per_second': len(df) / seconds}
+
+
+def get_environment() -> dict:
+    """Describe the versions and the machine used for a benchmark"""
+    versions = {}
+    for package in ('deidcm', 'numpy', 'pydicom', 'easyocr', 'opencv-python-headless', 'pillow'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions
+    }
+
+
+def run_benchmark(shapes: list = ('large',), bits_stored: list = (12,), count: int = 4,
+                  font: str = None, reader=None, output_encoding: str = None,
+                  png_options: dict = None, with_df2dicom: bool = True) -> dict:
+    """Benchmark the deidentification of synthetic mammograms, stage by stage.
+
+    A case is run for each shape and bit depth, without burned-in text, and with burned-in
+    text if `font` is given.
+
+    Args:
+        shapes: The image shapes, as names of `MAMMOGRAM_SHAPES` or (rows, columns) tuples.
+        bits_stored: The bit depths of the images.
+        count: The number of files of each case.
+        font: The path of a TrueType font used to burn words in the images.
+        reader: The OCR reader. If None, a cached easyOCR reader is used. Any object with a
+            `readtext` method returning easyOCR-like results can replace the OCR, so that the
+            other stages are benchmarked alone.
+        output_encoding: If given, the lossless encoding of the DICOM outputs.
+        png_options: The options of the PNG outputs (`bit_depth`, `compression`, `strategy`).
+        with_df2dicom: Whether to measure the throughput of `df2dicom` too.
+
+    Returns:
+        dict: The environment, the parameters and the results of each case.
+    """
+    Config()
+    results = {
+        'environment': get_environment(),
+        'parameters': {
+            'count': count, 'reader': type(reader).__name__ if reader is not None else 'easyocr',
+            'output_encoding': output_encoding,
+            'png_options': png_options
+        },
+        'cases': []
+    }
+    for shape in shapes:
+        shape_name = shape if isinstance(shape, str) else f'{shape[0]}x{shape[1]}'
+        shape = MAMMOGRAM_SHAPES[shape] if isinstance(shape, str) else tuple(shape)
+        for bits in bits_stored:
+            for with_text in ((False, True) if font else (False,)):
+                with tempfile.TemporaryDirectory() as indir, tempfile.TemporaryDirectory() as outdir:
+                    paths = write_synthetic_mammograms(
+                        indir, count, shape, bits, font if with_text else None)
+                    timings = [time_stages(path, outdir, reader, output_encoding, png_options)
+                               for path in paths]
+                    case = {
+                        'shape': shape_name,
+                        'rows': shape[0],
+                        'columns': shape[1],
+                        'bits_stored': bits,
+                        'with_text': with_text,
+                        'stages': summarize_timings(timings)
+                    }
+                    if with_df2dicom:
+                        case['df2dicom'] = benchmark_df2dicom(
+                            indir, outdir, reader, output_encoding=output_encoding,
+                            png_options=png_options)
+                text = ' with text' if with_text else ''
+                log(f"{shape_name} {bits} bits{text}: {case['stages']['images_per_second']:.2f} images/s")
+                results['cases'].append(case)
+    return results
+
+
+def write_benchmark_results(results: dict, path: str) -> None:
+    """Write the results of `run_benchmark` in a JSON file"""
+    with open(path, 'w', encoding='utf8') as f:
+        json.dump(results, f, indent=4)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the deidentification of synthetic mammograms')
+    parser.add_argument('--output', help='path of the JSON results (printed if not given)')
+    parser.add_argument('--shapes', nargs='+', default=['large'], choices=list(MAMMOGRAM_SHAPES))
+    parser.add_argument('--bits', nargs='+', type=int, default=[12])
+    parser.add_argument('--count', type=int, default=4)
+    parser.add_argument('--font', help='TrueType font used to burn words in the images')
+    parser.add_argument('--encoding', help='lossless encoding of the DICOM outputs')
+    parser.add_argument('--no-df2dicom', action='store_true', help='skip the df2dicom benchmark')
+    parser.add_argument('--blur', action='store_true', help='compare the legacy PIL blur instead')
+    args = parser.parse_args()
+
+    if args.blur:
+        results = benchmark_blur()
+    else:
+        results = run_benchmark(args.shapes, args.bits, args.count, args.font,
+                                output_encoding=args.encoding, with_df2dicom=not args.no_df2dicom)
+    if args.output:
+        write_benchmark_results(results, args.output)
+    else:
+        print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ import os
 import warnings
 from typing_extensions import Self
 
+from deidcm.dicom.recipe import CompiledRecipe, load_compiled_recipe
+from deidcm.dicom.word_matcher import AuthorizedWordMatcher
+
 
 class Config:
     """This class is used to change the configuration of your environment.
@@ -20,15 +23,22 @@ class Config:
     """
     _instance = None
     _recipe = None
+    _compiled_recipe = None
     _authorized_words = []
+    _word_matcher = AuthorizedWordMatcher([])
 
-    def __new__(cls, recipe_path: str = None, authorized_words_path: str = None) -> Self:
+    def __new__(cls, recipe_path: str = None, authorized_words_path: str = None,
+                authorized_words_max_distance: int = 0, use_recipe_cache: bool = True) -> Self:
         """
         Create a new instance of Config if it does not exist.
 
         Args:
             recipe_path: the path of your custom `recipe.json` file.
             authorized_words_path: the path of your custom `authorized_words.txt` file
+            authorized_words_max_distance: the maximum number of OCR errors (edits)
+                tolerated when matching an authorized word. 0 only allows exact matches.
+            use_recipe_cache: whether the compiled recipe is cached in the cache directory
+                of the user (see `deidcm.dicom.recipe`). If False, nothing is written on disk.
 
         Returns:
             Config: The single instance of the Config class.
@@ -37,7 +47,9 @@ class Config:
             cls._instance = super(Config, cls).__new__(cls)
 
             # Init recipe
-            cls._recipe = cls.load_recipe(recipe_path)
+            cls._compiled_recipe = load_compiled_recipe(cls.get_recipe_path(recipe_path),
+                                                        use_cache=use_recipe_cache)
+            cls._recipe = cls._compiled_recipe.recipe
 
             # Init authorized_words
             if authorized_words_path is None:
@@ -46,7 +58,41 @@ class Config:
             else:
                 cls._authorized_words = cls.load_authorized_words(
                     authorized_words_path)
+            cls._word_matcher = AuthorizedWordMatcher(
+                cls._authorized_words, authorized_words_max_distance)
+
+        return cls._instance
+
+    @classmethod
+    def get_state(cls) -> dict:
+        """Export the loaded configuration, e.g. for sending it to a worker process.
+
+        Returns:
+            A picklable dictionary accepted by `set_state`.
+        """
+        return {
+            'recipe': cls._recipe,
+            'authorized_words': cls._authorized_words,
+            'authorized_words_max_distance': cls._word_matcher.max_distance
+        }
 
+    @classmethod
+    def set_state(cls, state: dict) -> Self:
+        """Create the instance from a configuration exported with `get_state`.
+
+        This is used in worker processes that did not inherit the configuration
+        of their parent (spawned processes). An existing instance is left unchanged.
+
+        Returns:
+            Config: The single instance of the Config class.
+        """
+        if cls._instance is None:
+            cls._instance = super(Config, cls).__new__(cls)
+            cls._recipe = state['recipe']
+            cls._compiled_recipe = CompiledRecipe(cls._recipe)
+            cls._authorized_words = state['authorized_words']
+            cls._word_matcher = AuthorizedWordMatcher(
+                cls._authorized_words, state['authorized_words_max_distance'])
         return cls._instance
 
     @classmethod
@@ -67,6 +113,15 @@ class Config:
             words = list(map(str.strip, f.readlines()))
         return words
 
+    @classmethod
+    def get_recipe_path(cls, recipe_filepath: str) -> str:
+        """Get the path of the recipe to load: the user-defined one if it exists, the inbuilt one otherwise."""
+        if recipe_filepath is None or not os.path.exists(recipe_filepath):
+            print(
+                f"No customized recipe.json found at path `{recipe_filepath}`. Defaulting to package inbuilt recipe.json")
+            return os.path.join(os.path.dirname(__file__), 'dicom', 'recipe.json')
+        return recipe_filepath
+
     @classmethod
     def load_recipe(cls, recipe_filepath: str) -> dict:
         """Get the recipe from recipe.json and load it into a python dict.
@@ -81,20 +136,7 @@ class Config:
         Returns:
             A Python dictionary with recipe elements.
         """
-        recipe = None
-
-        # Load user customized recipe.json file
-        if recipe_filepath is None or not os.path.exists(recipe_filepath):
-            print(
-                f"No customized recipe.json found at path `{recipe_filepath}`. Defaulting to package inbuilt recipe.json")
-        else:
-            recipe = recipe_filepath
-
-        # Load default inbuilt recipe.json file
-        if recipe is None:
-            recipe = os.path.join(os.path.dirname(
-                __file__), 'dicom', 'recipe.json')
-
+        recipe = cls.get_recipe_path(recipe_filepath)
         try:
             with open(recipe, 'r', encoding="utf8") as f:
                 return json.load(f)
@@ -109,7 +151,19 @@ class Config:
             raise RuntimeError("Recipe has not been initialized")
         return self._recipe
 
+    @property
+    def compiled_recipe(self) -> CompiledRecipe:
+        """Getter of the recipe compiled for fast rule lookups, see `deidcm.dicom.recipe`"""
+        if self._compiled_recipe is None:
+            raise RuntimeError("Recipe has not been initialized")
+        return self._compiled_recipe
+
     @property
     def authorized_words(self) -> list:
         """Getter of authorized_words"""
         return self._authorized_words
+
+    @property
+    def word_matcher(self) -> AuthorizedWordMatcher:
+        """Getter of the compiled matcher of authorized_words"""
+        return self._word_matcher
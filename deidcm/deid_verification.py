@@ -39,7 +39,8 @@ DICOM_PREFIX_UID = '1.3.6.1.4.1.14519.5.2.1.2135.6389.'
 DICOM_SUFFIX_UID = 799402065306178004127703292730
 
 
-def search_false_positives(indir, list_dicom, list_chosen, outdir_intermediate, repetition, nb_images_tested, fp, tn):
+def search_false_positives(indir, list_dicom, list_chosen, outdir_intermediate, repetition, nb_images_tested, fp, tn,
+                           ocr_options=None):
     summary = "\nF stands for the FONT path" + \
         "\nB stands for the BLUR strength" + \
         "\nS stands for the text SIZE"
@@ -48,7 +49,7 @@ def search_false_positives(indir, list_dicom, list_chosen, outdir_intermediate,
     for _ in range(repetition):
         (pixels, ds, dicom, file_path, list_chosen) = get_random_dicom_ds_array(
             list_dicom, indir, list_chosen)
-        ocr_data = get_text_areas(pixels)
+        ocr_data = get_text_areas(pixels, **(ocr_options or {}))
         if is_there_ghost_words(ocr_data):
             fp += 1
         else:
@@ -426,6 +427,36 @@ def compare_ocr_data_and_reality(test_words, words_array, ocr_data):
     return (ocr_recognized_words, total_words)
 
 
+def compare_ocr_settings(pixels: np.ndarray, words: List[str], font: str, settings: dict,
+                         text_size: int = 3, color: int = 255) -> dict:
+    """Measure the recall of several OCR settings on the same test image.
+
+    Writes `words` on the image with `add_words_on_image`, then runs
+    `get_text_areas` once per setting. It allows to check that a faster setting
+    (e.g. a coarse-to-fine cascade with `{"scale": 0.5}`) does not miss words
+    detected by the default setting.
+
+    Args:
+        pixels: An array representing an image.
+        words: The words to write on the image.
+        font: The path of the font used for writing the words.
+        settings: A dictionary {setting name: keyword arguments of get_text_areas}.
+        text_size: The size of the text, from 1 to 5.
+        color: The color of the text.
+
+    Returns:
+        A dictionary {setting name: (number of recognized words, number of words on the image)}.
+    """
+    pixels, words_array, words = add_words_on_image(
+        pixels, words, text_size, font, color=color)
+    results = {}
+    for name, ocr_options in settings.items():
+        ocr_data = get_text_areas(pixels, **ocr_options) or []
+        results[name] = compare_ocr_data_and_reality(
+            words, words_array, list(ocr_data))
+    return results
+
+
 def save_test_information(nb_images_tested, nb_images_total, sum_ocr_recognized_words, sum_total_words,
                           ocr_recognized_words, total_words, tp, tn, fp, fn, outdir_intermediate, file_path, result):
     """
@@ -0,0 +1,126 @@
+"""
+
+This module contains an on-disk store of deidentified attributes.
+
+Large archives do not fit in a single DataFrame. Their attributes are
+deidentified by batches of files (see `deidentify_attributes_chunked`), and
+each batch is appended to the store as a Parquet file. The files of an
+archive do not all have the same attributes: the columns of the store are
+the union of the columns of its batches, and the columns missing from a
+batch are read as NaN. All values are stored as strings, like the values of
+`dicom2df`.
+
+Parquet files are written with pyarrow, an optional dependency
+(`pip install deidcm[parquet]`).
+
+"""
+
+import os
+from typing import Iterator, List
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+PART_PREFIX = 'part-'
+PART_SUFFIX = '.parquet'
+
+
+def is_parquet_available() -> bool:
+    """Check if pyarrow is installed"""
+    return pq is not None
+
+
+def check_parquet_available() -> None:
+    """Raise ImportError if pyarrow is not installed"""
+    if not is_parquet_available():
+        raise ImportError(
+            "The attribute store requires the pyarrow package (pip install deidcm[parquet])")
+
+
+def to_arrow_table(df: pd.DataFrame):
+    """Convert a DataFrame of attributes to an Arrow table of nullable strings.
+
+    Columns removed by the recipe only contain NaN (floats): they are stored as
+    null strings, so that the columns of all the batches have the same type.
+    """
+    schema = pa.schema([(str(column), pa.string()) for column in df.columns])
+    values = df.astype(object).where(df.notna(), None)
+    return pa.Table.from_pandas(values, schema=schema, preserve_index=False)
+
+
+class AttributeStore:
+    """Directory of Parquet files, one per batch of deidentified attributes"""
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path: The directory of the store. It is created if it does not exist.
+        """
+        check_parquet_available()
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def parts(self) -> List[str]:
+        """The paths of the Parquet files of the store, in the order they were appended"""
+        return [os.path.join(self.path, name) for name in sorted(os.listdir(self.path))
+                if name.startswith(PART_PREFIX) and name.endswith(PART_SUFFIX)]
+
+    def append(self, df: pd.DataFrame) -> str:
+        """Write a batch of attributes in a new Parquet file.
+
+        Returns:
+            The path of the Parquet file.
+        """
+        part = os.path.join(self.path, f'{PART_PREFIX}{len(self.parts):06d}{PART_SUFFIX}')
+        pq.write_table(to_arrow_table(df), part)
+        return part
+
+    def clear(self) -> None:
+        """Delete the Parquet files of the store"""
+        for part in self.parts:
+            os.remove(part)
+
+    @property
+    def columns(self) -> List[str]:
+        """The union of the columns of all the batches, in order of appearance"""
+        columns = {}
+        for part in self.parts:
+            columns.update(dict.fromkeys(pq.read_schema(part).names))
+        return list(columns)
+
+    def __len__(self) -> int:
+        return sum(pq.read_metadata(part).num_rows for part in self.parts)
+
+    def iter_chunks(self, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+        """Read the store batch by batch.
+
+        Each DataFrame can be given to `df2dicom`: its index starts at 0.
+
+        Args:
+            columns: The columns to read. If None, all the columns of the store.
+
+        Yields:
+            The attributes of a batch, with all the requested columns.
+        """
+        if columns is None:
+            columns = self.columns
+        for part in self.parts:
+            available = set(pq.read_schema(part).names)
+            df = pq.read_table(part, columns=[c for c in columns if c in available]).to_pandas()
+            yield df.reindex(columns=columns)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        return self.iter_chunks()
+
+    def read(self, columns: List[str] = None) -> pd.DataFrame:
+        """Read the whole store (or some of its columns) in a single DataFrame"""
+        chunks = list(self.iter_chunks(columns))
+        if not chunks:
+            return pd.DataFrame(columns=columns if columns is not None else [])
+        return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,259 @@
+"""
+
+This module contains a deidentifier walking the DICOM datasets directly.
+
+`deidentify_attributes` and `df2dicom` flatten every file to a line of a
+DataFrame, deidentify it, and rebuild the datasets from the column names.
+Here, the compiled recipe (see `deidcm.dicom.recipe`) is applied element by
+element while walking each dataset and its sequences, and the output files
+are written right away. The actions, pseudonyms and output files are the
+ones of `deidentify_attributes` followed by `df2dicom`, without building the
+DataFrame. It can still be exported for auditing (`audit=True`).
+
+A few differences remain, where the DataFrame loses information:
+
+- kept values are copied as they are, while the DataFrame does not restore
+  binary values, multi-valued strings and floats faithfully;
+- multi-valued attributes are pseudonymised value by value;
+- an attribute erased by the recipe is only kept empty in the files that
+  have it, while the DataFrame adds it to every file of the directory.
+
+"""
+
+import os
+from typing import List, Tuple
+
+import pandas as pd
+from easyocr import Reader
+from pydicom import Dataset
+from pydicom.dataelem import DataElement, empty_value_for_VR
+from pydicom.dataset import FileMetaDataset
+from pydicom.multival import MultiValue
+from pydicom.sequence import Sequence
+
+from deidcm.config import Config
+from deidcm.dicom.deid_mammogram import deidentify, deidentify_frames, deidentify_image_ndarray
+from deidcm.dicom.df2dicom import decode_unit, is_frame_by_frame, write_dicom_frames, write_outputs
+from deidcm.dicom.dicom2df import encode_unit, flat_dataset, is_readable, search_dicom
+from deidcm.dicom.encoding import is_encoding_available
+from deidcm.dicom.mmap_reader import get_pixel_array, read_dicom_pixels
+from deidcm.dicom.png_export import check_png_options
+from deidcm.dicom.profiling import get_profiler
+from deidcm.dicom.recipe import CompiledRecipe
+from deidcm.dicom.utils import log
+
+PIXEL_DATA_TAG = 0x7FE00010
+
+
+def deidentify_dataset(ds: Dataset, org_root: str, recipe: CompiledRecipe = None) -> Dataset:
+    """Deidentify the attributes of a dataset (and of its file meta information).
+
+    The source dataset is not modified (it may be shared by the cache of decoded
+    files, see `deidcm.dicom.pixel_cache`). The pixels are not copied: they are
+    added when the output file is written, like in `df2dicom`.
+
+    Args:
+        ds: The dataset to deidentify.
+        org_root: An organization root identifier for deidentifying DICOM UIDs.
+        recipe: The compiled recipe. If None, the recipe of the configuration is used.
+
+    Returns:
+        The deidentified dataset.
+    """
+    if recipe is None:
+        recipe = Config().compiled_recipe
+    deidentified = Dataset()
+    deidentified.file_meta = FileMetaDataset()
+    deidentify_elements(getattr(ds, 'file_meta', Dataset()), deidentified.file_meta, recipe, org_root)
+    deidentify_elements(ds, deidentified, recipe, org_root)
+    deidentified.PatientIdentityRemoved = 'YES'
+    deidentified.is_little_endian = ds.is_little_endian
+    deidentified.is_implicit_VR = ds.is_implicit_VR
+    return deidentified
+
+
+def deidentify_elements(source: Dataset, target: Dataset, recipe: CompiledRecipe, org_root: str,
+                        parent_tags: Tuple[int, ...] = ()) -> None:
+    """Add the deidentified elements of `source` to `target`.
+
+    Args:
+        source: A dataset, or an item of a sequence.
+        target: The dataset receiving the deidentified elements.
+        recipe: The compiled recipe.
+        org_root: An organization root identifier for deidentifying DICOM UIDs.
+        parent_tags: The tags of the sequences containing `source`.
+    """
+    for element in source:
+        if element.tag == PIXEL_DATA_TAG or element.tag.is_private:
+            continue
+        tags = parent_tags + (int(element.tag),)
+        if element.VR == 'SQ':
+            element = deidentify_sequence(element, tags, recipe, org_root)
+        else:
+            element = deidentify_element(element, tags, recipe.get_action(tags), org_root)
+        if element is not None:
+            target.add(element)
+
+
+def deidentify_sequence(element: DataElement, tags: Tuple[int, ...], recipe: CompiledRecipe,
+                        org_root: str) -> DataElement:
+    """Deidentify the items of a sequence.
+
+    Returns:
+        The deidentified sequence, or None if nothing is left in its items. Empty
+            sequences are kept when they are erased or kept by the recipe.
+    """
+    if len(element.value) == 0:
+        if recipe.get_action(tags) in ('EFFACER', 'CONSERVER'):
+            return DataElement(element.tag, 'SQ', Sequence())
+        return None
+    items = []
+    for item in element.value:
+        deidentified = Dataset()
+        deidentify_elements(item, deidentified, recipe, org_root, tags)
+        items.append(deidentified)
+    if not any(len(item) for item in items):
+        return None
+    return DataElement(element.tag, 'SQ', Sequence(items))
+
+
+def deidentify_element(element: DataElement, tags: Tuple[int, ...], action: str,
+                       org_root: str) -> DataElement:
+    """Apply a deidentification action to an element (see `apply_deidentification`).
+
+    Returns:
+        The deidentified element, or None if it is removed.
+    """
+    if action == 'RETIRER':
+        return None
+    if action == 'EFFACER':
+        return DataElement(element.tag, element.VR, empty_value_for_VR(element.VR))
+    if action == 'CONSERVER':
+        return element
+    str_tags = [f"{tag:#010x}" for tag in tags]
+    if isinstance(element.value, (list, MultiValue)) and len(element.value) > 0:
+        values = [pseudonymize_value(value, str_tags, element.VR, org_root) for value in element.value]
+        if any(value is None for value in values):
+            return None
+        return DataElement(element.tag, element.VR, values)
+    value = pseudonymize_value(element.value, str_tags, element.VR, org_root)
+    if value is None:
+        return None
+    return DataElement(element.tag, element.VR, value)
+
+
+def pseudonymize_value(value, tags: List[str], vr: str, org_root: str):
+    """Pseudonymise a single value with `deidentify`, through its encoding in `dicom2df`.
+
+    Returns:
+        The pseudonym converted back to a pydicom value, or None if the VR of the
+            attribute cannot be pseudonymised.
+    """
+    pseudonym = deidentify(tags, vr, encode_unit(value), org_root)
+    if pseudonym is None:
+        return None
+    return decode_unit(pseudonym, vr, '1')
+
+
+def get_output_name(ds: Dataset, infile: str) -> str:
+    """Name of the output files of a dataset: its deidentified SOPInstanceUID, like in `df2dicom`"""
+    uid = ds.get('SOPInstanceUID')
+    return str(uid) if uid else os.path.splitext(os.path.basename(infile))[0]
+
+
+def deidentify_dicom(infile: str, outdir: str, org_root: str, do_image_deidentification: bool = False,
+                     output_file_formats: list = None, reader: Reader = None, use_mmap: bool = False,
+                     output_encoding: str = None, png_options: dict = None) -> Dataset:
+    """Deidentify a DICOM file and write its DICOM and/or PNG outputs.
+
+    Args:
+        infile: The path of the DICOM file.
+        outdir: The output directory.
+        org_root: An organization root identifier for deidentifying DICOM UIDs.
+        do_image_deidentification: Whether or not the pixels are deidentified with the OCR.
+        output_file_formats: A list of formats among ["dcm", "png"]. Defaults to ["dcm"].
+        reader: A pre-built easyOCR reader. If None, a cached reader is used.
+        use_mmap: Whether to memory-map the pixels of uncompressed source files.
+        output_encoding: If given, the lossless encoding of the DICOM output
+            (see `deidcm.dicom.encoding`).
+        png_options: The options of the PNG output, see `deidcm.dicom.png_export`.
+
+    Returns:
+        The deidentified dataset, or None if the file cannot be read (see `is_readable`).
+    """
+    if output_file_formats is None:
+        output_file_formats = ["dcm"]
+    profiler = get_profiler()
+    with profiler.file(infile):
+        with profiler.stage('decode'):
+            source, pixels = read_dicom_pixels(infile, use_mmap)
+        if not is_readable(source.file_meta, source):
+            log(f"Unreadable file skipped: {infile}", logtype=1)
+            return None
+        with profiler.stage('metadata'):
+            ds = deidentify_dataset(source, org_root)
+        outpath = os.path.join(outdir, get_output_name(ds, infile))
+        if do_image_deidentification and is_frame_by_frame(source, output_file_formats):
+            profiler.set_image_size(source.Rows, source.Columns)
+            frames = deidentify_frames(source, reader=reader, pixels=pixels)
+            write_dicom_frames(ds, frames, outpath, output_encoding)
+            return ds
+        if do_image_deidentification:
+            pixels = deidentify_image_ndarray(source, reader=reader, pixels=pixels)
+        write_outputs(ds, get_pixel_array(source, pixels), outpath, output_file_formats, do_image_deidentification,
+                      output_encoding, png_options=png_options)
+    return ds
+
+
+def deidentify_dicoms(indir: str, outdir: str, org_root: str, do_image_deidentification: bool = False,
+                      output_file_formats: list = None, reader: Reader = None, use_mmap: bool = False,
+                      output_encoding: str = None, png_options: dict = None,
+                      audit: bool = False) -> pd.DataFrame:
+    """Deidentify all the DICOM files of a directory, without the DataFrame of `dicom2df`.
+
+    The output files are the ones of `deidentify_attributes` followed by `df2dicom`.
+
+    Args:
+        indir: The input directory (DICOM files to deidentify).
+        outdir: The output directory.
+        org_root: An organization root identifier for deidentifying DICOM UIDs.
+        do_image_deidentification: Whether or not the pixels are deidentified with the OCR.
+        output_file_formats: A list of formats among ["dcm", "png"]. Defaults to ["dcm"].
+        reader: A pre-built easyOCR reader. If None, a cached reader is used.
+        use_mmap: Whether to memory-map the pixels of uncompressed source files.
+        output_encoding: If given, the lossless encoding of the DICOM outputs.
+        png_options: The options of the PNG outputs, see `deidcm.dicom.png_export`.
+        audit: Whether to return the deidentified attributes as a DataFrame, with the
+            columns of `deidentify_attributes`.
+
+    Returns:
+        The DataFrame of the deidentified attributes if `audit` is True, None otherwise.
+    """
+    if False in list(map(os.path.exists, [indir, outdir])):
+        raise ValueError(f"Path {indir} or {outdir} does not exist.")
+    if output_file_formats is None:
+        output_file_formats = ["dcm"]
+    else:
+        output_file_formats = [f.lower() for f in output_file_formats]
+    if output_encoding is not None and not is_encoding_available(output_encoding):
+        raise ImportError(f"No codec installed for the {output_encoding} encoding")
+    png_options = check_png_options(png_options)
+
+    lines = []
+    files, unreadable = 0, 0
+    for infile in search_dicom(indir):
+        ds = deidentify_dicom(infile, outdir, org_root, do_image_deidentification, output_file_formats,
+                              reader, use_mmap, output_encoding, png_options)
+        if ds is None:
+            unreadable += 1
+            continue
+        files += 1
+        if audit:
+            line = flat_dataset(ds)
+            line['FilePath'] = infile
+            lines.append(line)
+    log([
+        f"Deidentified file(s): {files}",
+        f"Unreadable file(s): {unreadable}"
+    ])
+    return pd.DataFrame(lines) if audit else None
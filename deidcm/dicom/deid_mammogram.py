@@ -7,15 +7,15 @@ fulfills the following purposes:
 * deidentifying mammogram's metadata
 """
 
-import re
 import os
 import uuid
 import base64
 import string
 import hashlib
 import warnings
+from functools import lru_cache
 from random import choice
-from typing import List
+from typing import Iterator, List, Tuple, Union
 from datetime import datetime
 from datetime import timedelta
 
@@ -23,35 +23,305 @@ import pydicom
 from pydicom import Dataset
 import numpy as np
 import pandas as pd
-from PIL import Image, ImageDraw, ImageFilter
+from PIL import Image
 from easyocr import Reader
 
 from deidcm.config import Config
-from deidcm.dicom.dicom2df import dicom2df
+from deidcm.dicom.attribute_store import AttributeStore, check_parquet_available
+from deidcm.dicom.dicom2df import DICOM2DF_CHUNKSIZE, dicom2df, dicom2df_chunks
+from deidcm.dicom.device_templates import DeviceTemplateStore, get_device_key
+from deidcm.dicom.lut import apply_window, get_window_presets, window_image
+from deidcm.dicom.multiframe import (
+    MULTIFRAME_SAMPLE_FRAMES,
+    FrameReader,
+    get_number_of_frames,
+    get_sample_frame_indices
+)
+from deidcm.dicom.ocr_cache import OcrCache, get_ocr_fingerprint
+from deidcm.dicom.ocr_detection import read_text_detection_only
+from deidcm.dicom.ocr_reader import get_reader
+from deidcm.dicom.ocr_regions import (
+    TILE_OVERLAP,
+    get_roi_regions,
+    read_text_cascade,
+    read_text_in_regions,
+    read_text_tiled
+)
+from deidcm.dicom.pixel_cache import read_dicom
+from deidcm.dicom.png_export import check_png_options, write_png, write_pngs
+from deidcm.dicom.profiling import get_profiler
+from deidcm.dicom.recipe import CompiledRecipe, get_most_restrictive_action, get_range_rule, parse_tag
+from deidcm.dicom.redaction import (
+    BLUR_RADIUS,
+    PIXELATE_BLOCK_SIZE,
+    redact_blur,
+    redact_pixelate,
+    redact_rectangles,
+    redact_volume
+)
 from deidcm.dicom.utils import log
 
+BATCH_SHAPE_STEP = 256
 
-def deidentify_image_ndarray(ds: Dataset) -> np.ndarray:
-    """Deidentify image and return the image as a numpy array"""
-    img = get_PIL_image(ds)
 
-    if img is None:
+def deidentify_image_ndarray(ds: Dataset, reader: Reader = None, ocr_options: dict = None,
+                             roi: Union[str, list, dict] = None,
+                             templates: DeviceTemplateStore = None, pixels: np.ndarray = None) -> np.ndarray:
+    """Deidentify image and return the image as a numpy array
+
+    Args:
+        ds: A pydicom dataset which can be obtained from a DICOM file.
+        reader: A pre-built easyOCR reader. If None, a cached reader is used.
+        ocr_options: Keyword arguments given to [get_text_areas][deidcm.dicom.deid_mammogram.get_text_areas]
+            (e.g. `{"scale": 0.5}` for a coarse-to-fine OCR).
+        roi: A region of interest policy restricting the OCR to some parts of the image
+            (`"edges"`, `"auto"`, a list of fractional boxes or a dictionary of
+            per-manufacturer templates). If None, the whole image is read.
+            See [get_roi_regions][deidcm.dicom.ocr_regions.get_roi_regions].
+        templates: If given, the boxes hidden on the images of each device are learned,
+            and the OCR is skipped once the template of the device is stable.
+            See [DeviceTemplateStore][deidcm.dicom.device_templates.DeviceTemplateStore].
+        pixels: The pixel array of the dataset, if already available (e.g. memory-mapped
+            with [read_dicom_mmap][deidcm.dicom.mmap_reader.read_dicom_mmap]).
+            If None, `ds.pixel_array` is used.
+
+    Multi-frame datasets (e.g. breast tomosynthesis) are deidentified with
+    [deidentify_volume][deidcm.dicom.deid_mammogram.deidentify_volume], without templates.
+    """
+    if pixels is None and 'PixelData' not in ds:
         raise ValueError(f'Cannot open image from pydicom dataset {ds}')
+    profiler = get_profiler()
+    with profiler.file(get_dataset_name(ds)):
+        profiler.set_image_size(ds.Rows, ds.Columns)
+        if get_number_of_frames(ds) > 1:
+            return deidentify_volume(ds, reader=reader, ocr_options=ocr_options, roi=roi, pixels=pixels)
+
+        # Decode the pixels once for both the OCR image and the redaction
+        if pixels is None:
+            with profiler.stage('decode'):
+                pixels = ds.pixel_array
+        ocr_data, _ = find_words_to_hide(ds, pixels, reader=reader, ocr_options=ocr_options, roi=roi,
+                                         templates=templates)
+        profiler.count('boxes', len(ocr_data or []))
+        with profiler.stage('redaction'):
+            return hide_text(pixels, ocr_data) if ocr_data else pixels
+
+
+def get_dataset_name(ds: Dataset) -> str:
+    """Return the path of the file of a dataset, or its SOP Instance UID"""
+    filename = getattr(ds, 'filename', None)
+    return filename if isinstance(filename, str) else str(ds.get('SOPInstanceUID', ''))
+
+
+def find_words_to_hide(ds: Dataset, pixels: np.ndarray, reader: Reader = None, ocr_options: dict = None,
+                       roi: Union[str, list, dict] = None,
+                       templates: DeviceTemplateStore = None) -> Tuple[list, np.ndarray]:
+    """Run the OCR on a single-frame image and return the words to hide.
+
+    Args:
+        ds: A pydicom dataset which can be obtained from a DICOM file.
+        pixels: The decoded pixel array of the dataset.
+        reader: See [deidentify_image_ndarray][deidcm.dicom.deid_mammogram.deidentify_image_ndarray].
+        ocr_options: See [deidentify_image_ndarray][deidcm.dicom.deid_mammogram.deidentify_image_ndarray].
+        roi: See [deidentify_image_ndarray][deidcm.dicom.deid_mammogram.deidentify_image_ndarray].
+        templates: See [deidentify_image_ndarray][deidcm.dicom.deid_mammogram.deidentify_image_ndarray].
+
+    Returns:
+        tuple: The words to hide and the image read by the OCR (windowed 8-bit image when
+            the dataset has windowing information), or None if a template was applied.
+    """
+    profiler = get_profiler()
+    if templates is not None:
+        device_key = get_device_key(ds, pixels.shape)
+        ocr_data = templates.lookup(device_key)
+        if ocr_data is not None:
+            profiler.count('template_hits')
+            return ocr_data, None
+
+    with profiler.stage('lut'):
+        img = get_PIL_image(ds, pixels=pixels)
+
+        if img is None:
+            raise ValueError(f'Cannot open image from pydicom dataset {ds}')
+
+        ocr_image = np.array(img)
+    ocr_options = dict(ocr_options or {})
+    if roi is not None:
+        ocr_options['regions'] = get_roi_regions(
+            ocr_image, roi, ds.get('Manufacturer'))
+    with profiler.stage('ocr'):
+        ocr_data = get_text_areas(ocr_image, reader=reader, **ocr_options)
+    if templates is not None:
+        ocr_data = templates.update(device_key, ocr_data)
+    return ocr_data, ocr_image
+
+
+def deidentify_volume(ds: Dataset, reader: Reader = None, ocr_options: dict = None,
+                      roi: Union[str, list, dict] = None, pixels: np.ndarray = None,
+                      sample_frames: int = MULTIFRAME_SAMPLE_FRAMES) -> np.ndarray:
+    """Deidentify a multi-frame image and return it as a numpy array of frames.
+
+    The burned-in text of a tomosynthesis volume is the same on all its frames. The OCR
+    only runs on `sample_frames` frames evenly spread across the volume, and the words
+    found on any of them are hidden on every frame (see
+    [find_volume_words][deidcm.dicom.deid_mammogram.find_volume_words]).
+
+    The returned array holds the whole decoded volume. To redact and write the frames
+    one at a time, see [deidentify_frames][deidcm.dicom.deid_mammogram.deidentify_frames].
 
-    ocr_data = get_text_areas(np.array(img))
-    pixels = ds.pixel_array
-    pixels = hide_text(pixels, ocr_data) if ocr_data else pixels
-    return pixels
+    Args:
+        ds: A pydicom dataset with several frames.
+        reader: A pre-built easyOCR reader. If None, a cached reader is used.
+        ocr_options: Keyword arguments given to [get_text_areas][deidcm.dicom.deid_mammogram.get_text_areas].
+        roi: A region of interest policy, see [deidentify_image_ndarray][deidcm.dicom.deid_mammogram.deidentify_image_ndarray].
+        pixels: The pixel array of the dataset, if already available (e.g. memory-mapped).
+        sample_frames: The number of frames read by the OCR.
+
+    Returns:
+        The deidentified pixel array, of shape (frames, rows, columns).
+    """
+    profiler = get_profiler()
+    frames = FrameReader(ds, pixels)
+    ocr_data = find_volume_words(ds, frames, reader, ocr_options, roi, sample_frames)
+    with profiler.stage('decode'):
+        volume = np.empty((len(frames),) + tuple(frames.frame_shape), dtype=frames.dtype)
+        for index, frame in enumerate(frames):
+            volume[index] = frame
+    with profiler.stage('redaction'):
+        return hide_text_volume(volume, ocr_data, inplace=True) if ocr_data else volume
+
+
+def deidentify_frames(ds: Dataset, reader: Reader = None, ocr_options: dict = None,
+                      roi: Union[str, list, dict] = None, pixels: np.ndarray = None,
+                      sample_frames: int = MULTIFRAME_SAMPLE_FRAMES) -> Iterator[np.ndarray]:
+    """Deidentify a multi-frame image frame by frame.
+
+    The OCR runs on the sampled frames first, like in
+    [deidentify_volume][deidcm.dicom.deid_mammogram.deidentify_volume]. The frames are
+    then decoded, redacted and yielded one at a time, so that they can be encoded one
+    at a time too (see [write_dicom_frames][deidcm.dicom.df2dicom.write_dicom_frames]).
+    Frames without text are views of the source pixels when possible: do not modify them.
+
+    Args:
+        ds: A pydicom dataset with several frames.
+        reader: A pre-built easyOCR reader. If None, a cached reader is used.
+        ocr_options: Keyword arguments given to [get_text_areas][deidcm.dicom.deid_mammogram.get_text_areas].
+        roi: A region of interest policy, see [deidentify_image_ndarray][deidcm.dicom.deid_mammogram.deidentify_image_ndarray].
+        pixels: The pixel array of the dataset, if already available (e.g. memory-mapped).
+        sample_frames: The number of frames read by the OCR.
+
+    Yields:
+        The deidentified frames, of shape (rows, columns).
+    """
+    profiler = get_profiler()
+    frames = FrameReader(ds, pixels)
+    ocr_data = find_volume_words(ds, frames, reader, ocr_options, roi, sample_frames)
+    for index in range(len(frames)):
+        with profiler.stage('decode'):
+            frame = frames[index]
+        if ocr_data:
+            with profiler.stage('redaction'):
+                frame = hide_text(frame, ocr_data)
+        yield frame
+
+
+def find_volume_words(ds: Dataset, frames: FrameReader, reader: Reader = None, ocr_options: dict = None,
+                      roi: Union[str, list, dict] = None,
+                      sample_frames: int = MULTIFRAME_SAMPLE_FRAMES) -> list:
+    """Read the words of `sample_frames` frames evenly spread across a volume.
 
+    Returns:
+        The words found on all the sampled frames, to be hidden on every frame.
+    """
+    profiler = get_profiler()
+    ocr_data = []
+    for index in get_sample_frame_indices(len(frames), sample_frames):
+        with profiler.stage('decode'):
+            frame = frames[index]
+        with profiler.stage('lut'):
+            img = get_PIL_image(ds, pixels=frame)
+            if img is None:
+                raise ValueError(f'Cannot open image from pydicom dataset {ds}')
+            ocr_image = np.array(img)
+        options = dict(ocr_options or {})
+        if roi is not None:
+            options['regions'] = get_roi_regions(ocr_image, roi, ds.get('Manufacturer'))
+        with profiler.stage('ocr'):
+            ocr_data += get_text_areas(ocr_image, reader=reader, **options)
+    profiler.count('boxes', len(ocr_data))
+    return ocr_data
+
+
+def deidentify_images(paths: list, batch_size: int = 8, reader: Reader = None,
+                      languages: list = ['fr']) -> Iterator[Tuple[str, np.ndarray]]:
+    """Deidentify many DICOM images, submitting them to the OCR Reader by batches.
+
+    Images are grouped by size before being submitted to the easyOCR Reader, so
+    that the detection model processes a whole batch in a single pass. Images of
+    slightly different sizes are padded (bottom and right borders) to a common shape,
+    which keeps the coordinates of the detected words unchanged.
+
+    As images are grouped by size, results are not yielded in the order of `paths`.
 
-def deidentify_image_dcm(infile: str) -> bytes:
+    Args:
+        paths: The paths of the DICOM files to deidentify.
+        batch_size: The maximum number of images submitted together to the OCR Reader.
+        reader: A pre-built easyOCR reader. If None, a cached reader is used.
+        languages: A list of supported languages for the OCR Reader.
+
+    Yields:
+        A tuple (path, pixels) for each DICOM file, pixels being the deidentified
+            pixel array.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be positive, got {batch_size}")
+    if reader is None:
+        reader = get_reader(languages)
+
+    buckets = {}
+    for path in paths:
+        header = pydicom.dcmread(path, stop_before_pixels=True)
+        buckets.setdefault(get_batch_shape(header.Rows, header.Columns), []).append(path)
+
+    for shape, bucket in buckets.items():
+        for start in range(0, len(bucket), batch_size):
+            batch = bucket[start:start + batch_size]
+            datasets = [read_dicom(path) for path in batch]
+            images = []
+            for path, ds in zip(batch, datasets):
+                img = get_PIL_image(ds, pixels=ds.pixel_array) if 'PixelData' in ds else None
+                if img is None:
+                    raise ValueError(f'Cannot open image from DICOM file {path}')
+                images.append(pad_image(np.array(img), shape))
+            ocr_results = reader.readtext_batched(images)
+            for path, ds, ocr_data in zip(batch, datasets, ocr_results):
+                ocr_data = filter_ocr_data(ocr_data)
+                pixels = ds.pixel_array
+                yield path, hide_text(pixels, ocr_data) if ocr_data else pixels
+
+
+def get_batch_shape(rows: int, columns: int, step: int = BATCH_SHAPE_STEP) -> tuple:
+    """Round an image shape up to the shape shared by its batch"""
+    return (-(-rows // step) * step, -(-columns // step) * step)
+
+
+def pad_image(pixels: np.ndarray, shape: tuple) -> np.ndarray:
+    """Pad the bottom and right borders of an image with zeros to reach `shape`"""
+    padding = [(0, shape[0] - pixels.shape[0]), (0, shape[1] - pixels.shape[1])]
+    padding += [(0, 0)] * (pixels.ndim - 2)
+    return np.pad(pixels, padding)
+
+
+def deidentify_image_dcm(infile: str, reader: Reader = None) -> bytes:
     """Deidentify image and return bytes according to ds settings"""
-    ds = pydicom.read_file(infile)
-    pixels = deidentify_image_ndarray(ds)
+    ds = read_dicom(infile)
+    pixels = deidentify_image_ndarray(ds, reader=reader)
     return numpy2bytes(pixels.copy(), ds)
 
 
-def deidentify_image_png(infile: str, outdir: str, filename: str) -> None:
+def deidentify_image_png(infile: str, outdir: str, filename: str, reader: Reader = None,
+                         ocr_options: dict = None, roi: Union[str, list, dict] = None,
+                         templates: DeviceTemplateStore = None, png_options: dict = None) -> None:
     """Deidentify and write a given mammogram's image in outdir as filename.png
 
     This function invokes the OCR reader for getting all potential words on a 
@@ -61,54 +331,106 @@ def deidentify_image_png(infile: str, outdir: str, filename: str) -> None:
         infile: The path of the DICOM file to deidentify.
         outdir: The path of the directory that will store the output.
         filename: The name of the resulting PNG file. (don't add the file extension).
+        reader: A pre-built easyOCR reader. If None, a cached reader is used.
+        ocr_options: Keyword arguments given to [get_text_areas][deidcm.dicom.deid_mammogram.get_text_areas].
+        roi: A region of interest policy, see [deidentify_image_ndarray][deidcm.dicom.deid_mammogram.deidentify_image_ndarray].
+        templates: A store of per-device templates, see [deidentify_image_ndarray][deidcm.dicom.deid_mammogram.deidentify_image_ndarray].
+        png_options: The bit depth, compression and windowing of the PNG file, see
+            `deidcm.dicom.png_export`. With `window`, the windowed image computed for the
+            OCR is redacted and written, instead of windowing the pixels again.
     """
-    ds = pydicom.read_file(infile)
-    pixels = deidentify_image_ndarray(ds)
+    profiler = get_profiler()
     outfile = os.path.join(outdir, filename)
-    save_deidentified_image_png(pixels, outfile)
+    png_options = check_png_options(png_options)
+    with profiler.file(infile):
+        ds = read_dicom(infile)
+        if png_options.pop('window', False) and get_number_of_frames(ds) == 1:
+            with profiler.stage('decode'):
+                pixels = ds.pixel_array
+            profiler.set_image_size(ds.Rows, ds.Columns)
+            ocr_data, ocr_image = find_words_to_hide(ds, pixels, reader=reader, ocr_options=ocr_options,
+                                                     roi=roi, templates=templates)
+            if ocr_image is None:
+                ocr_image = get_windowed_image(ds, pixels)
+            profiler.count('boxes', len(ocr_data or []))
+            with profiler.stage('redaction'):
+                ocr_image = hide_text(ocr_image, ocr_data, inplace=True) if ocr_data else ocr_image
+            png_options['bit_depth'] = 8
+            with profiler.stage('write'):
+                write_png(f'{outfile}.png', ocr_image, **png_options)
+            return
+        pixels = deidentify_image_ndarray(ds, reader=reader, ocr_options=ocr_options, roi=roi,
+                                          templates=templates)
+        save_deidentified_image_png(pixels, outfile, png_options, ds)
+
+
+def save_deidentified_image_png(pixels: np.ndarray, outfile: str, png_options: dict = None,
+                                ds: Dataset = None) -> None:
+    """write a deidentified mammogram's image in outdir as outfile.png
+
+    The frames of a multi-frame image are written as outfile_0000.png, outfile_0001.png...
+    in parallel.
 
-
-def save_deidentified_image_png(pixels: np.ndarray, outfile: str) -> None:
-    """write a deidentified mammogram's image in outdir as outfile.png"""
-    try:
-        Image.fromarray(pixels).save(f'{outfile}.png')
-    except TypeError:
+    Args:
+        pixels: The pixels array to write.
+        outfile: The path of the PNG file, without the file extension.
+        png_options: The bit depth, compression and windowing of the PNG file, see
+            `deidcm.dicom.png_export`.
+        ds: The dataset of the image, required by the `window` option.
+    """
+    png_options = check_png_options(png_options)
+    window = png_options.pop('window', False)
+    if window and ds is None:
+        raise ValueError("The window PNG option requires the dataset of the image")
+    if window:
+        png_options['bit_depth'] = 8
+    with get_profiler().stage('write'):
         dimensions = pixels.shape
-        if len(dimensions) == 3 and all(map(lambda x: x > 3, dimensions)):
-            log("3D image, cannot process, cannot write PNG")
-        else:
+        # Channels are last and at most 4 (RGBA), other 3D arrays are stacks of frames
+        if len(dimensions) == 4 or (len(dimensions) == 3 and dimensions[-1] > 4):
+            frames = [get_windowed_image(ds, frame) for frame in pixels] if window else list(pixels)
+            paths = [f'{outfile}_{index:04d}.png' for index in range(len(frames))]
+            write_pngs(paths, frames, **png_options)
+            return
+        if len(dimensions) not in (2, 3):
             raise TypeError(f"Unknown format for pixels : {dimensions}")
+        write_png(f'{outfile}.png', get_windowed_image(ds, pixels) if window else pixels, **png_options)
+
+
+def get_windowed_image(ds: Dataset, pixels: np.ndarray) -> np.ndarray:
+    """Return the image read by the OCR: windowed 8-bit image if possible, raw pixels otherwise"""
+    return np.array(get_PIL_image(ds, pixels=pixels))
 
 
 def get_LUT_value(data, window, level):
-    """Apply the RGB Look-Up Table for the given
-       data and window/level value."""
-    return np.piecewise(data,
-                        [data <= (level - 0.5 - (window - 1) / 2),
-                         data > (level - 0.5 + (window - 1) / 2)],
-                        [0, 255, lambda data: ((data - (level - 0.5)) /
-                         (window - 1) + 0.5) * (255 - 0)])
+    """Apply the Look-Up Table for the given
+       data and window/level value and return an 8-bit image."""
+    return apply_window(data, window, level)
 
 
-def get_PIL_image(dataset: pydicom.dataset.Dataset) -> Image:
+def get_PIL_image(dataset: pydicom.dataset.Dataset, preset: int = 0, pixels: np.ndarray = None) -> Image:
     """Get Image object from Python Imaging Library(PIL)
 
     Get the image from the pydicom dataset and convert it from a numpy.ndarray
     to a PIL image object. If available, the function will use metadata information 
-    contained inside the pydicom dataset for the conversion.  
+    contained inside the pydicom dataset for the conversion (Window Width/Window Center
+    or VOI LUT Sequence, see `deidcm.dicom.lut`).
 
     Args:
         dataset: A pydicom dataset which can be obtained from a DICOM file.
+        preset: The index of the window preset to use when several are defined.
+        pixels: The already decoded pixel array of the dataset, if available. It is
+            required for datasets read without their Pixel Data element.
 
     Returns:
         Image: A PIL image object.
     """
 
-    if ('PixelData' not in dataset):
+    if 'PixelData' not in dataset and pixels is None:
         log("Cannot get image -- DICOM dataset does not have pixel data")
         return None
-    # can only apply LUT if these window info exists
-    if ('WindowWidth' not in dataset) or ('WindowCenter' not in dataset):
+    # can only apply LUT if window info or a VOI LUT exists
+    if not get_window_presets(dataset) and 'VOILUTSequence' not in dataset:
         bits = dataset.BitsAllocated
         samples = dataset.SamplesPerPixel
         if bits == 8 and samples == 1:
@@ -127,30 +449,30 @@ def get_PIL_image(dataset: pydicom.dataset.Dataset) -> Image:
         size = (dataset.Columns, dataset.Rows)
         # Recommended to specify all details
         # by http://www.pythonware.com/library/pil/handbook/image.htm
-        im = Image.frombuffer(mode, size, dataset.PixelData,
+        # Given pixels may be a single frame or memory-mapped (without Pixel Data element)
+        buffer = np.ascontiguousarray(pixels) if pixels is not None else dataset.PixelData
+        im = Image.frombuffer(mode, size, buffer,
                               "raw", mode, 0, 1)
     else:
-        ew = dataset['WindowWidth']
-        ec = dataset['WindowCenter']
-        ww = int(ew.value[0] if ew.VM > 1 else ew.value)
-        wc = int(ec.value[0] if ec.VM > 1 else ec.value)
-        image = get_LUT_value(dataset.pixel_array, ww, wc)
-        # Convert mode to L since LUT has only 256 values:
-        #   http://www.pythonware.com/library/pil/handbook/image.htm
-        im = Image.fromarray(image).convert('L')
+        # The LUT has only 256 values, the image is in mode L
+        im = Image.fromarray(window_image(dataset, pixels, preset=preset))
     return im
 
 
 def numpy2bytes(pixels: np.ndarray, ds: pydicom.dataset.Dataset) -> bytes:
     """Returns bytes form of a numpy array built with proper ds' settings"""
-    if ds.BitsAllocated == 8:
-        return pixels.astype(np.uint8).tobytes()
-    elif ds.BitsAllocated == 16:
-        return pixels.astype(np.uint16).tobytes()
-    else:
-        raise ValueError(f"Unsupported BitsAllocated value: {ds.BitsAllocated}")
+    with get_profiler().stage('encode'):
+        if ds.BitsAllocated == 8:
+            return pixels.astype(np.uint8).tobytes()
+        elif ds.BitsAllocated == 16:
+            return pixels.astype(np.uint16).tobytes()
+        else:
+            raise ValueError(f"Unsupported BitsAllocated value: {ds.BitsAllocated}")
 
-def get_text_areas(pixels: np.ndarray, languages: list = ['fr']) -> list:
+def get_text_areas(pixels: np.ndarray, languages: list = ['fr'], reader: Reader = None,
+                   scale: float = None, cascade_options: dict = None, regions: list = None,
+                   detection_only: bool = False, ocr_cache: OcrCache = None,
+                   tile_size: int = None, tile_overlap: int = TILE_OVERLAP) -> list:
     """Read and return words of an image.
 
     This function takes a pixel array in input and submits it to the easyOCR Reader.
@@ -162,12 +484,82 @@ def get_text_areas(pixels: np.ndarray, languages: list = ['fr']) -> list:
         languages:
             A list of supported languages for the OCR Reader.
             This allows to submit images with text written in different languages.
+        reader: A pre-built easyOCR reader. If None, a reader supporting `languages`
+            is taken from the process-wide cache (see `deidcm.dicom.ocr_reader`).
+        scale: If given, the OCR first runs on a copy of the image downscaled by this
+            factor and only low-confidence areas are read again at full resolution.
+            See [read_text_cascade][deidcm.dicom.ocr_regions.read_text_cascade].
+        cascade_options: Keyword arguments given to `read_text_cascade` for tuning its
+            recall safeguards (`min_confidence`, `min_text_height`, `padding`,
+            `full_resolution_fallback`).
+        regions: If given, a list of (x1, y1, x2, y2) boxes. Only these regions of the image
+            are read, in parallel. See [get_roi_regions][deidcm.dicom.ocr_regions.get_roi_regions].
+        detection_only: If True, only the text detector is run, and the recognizer only
+            reads the boxes that could contain an authorized word. Other boxes are
+            hidden without being read. Cannot be combined with `scale`.
+            See [read_text_detection_only][deidcm.dicom.ocr_detection.read_text_detection_only].
+        ocr_cache: If given, raw OCR results are looked up in this persistent cache
+            before running the OCR, and stored in it afterwards.
+            See [OcrCache][deidcm.dicom.ocr_cache.OcrCache].
+        tile_size: If given, the image (or each region) is split into overlapping square
+            tiles of this size, read in parallel. Words read in two tiles are merged.
+            See [read_text_tiled][deidcm.dicom.ocr_regions.read_text_tiled].
+        tile_overlap: The number of pixels shared by two neighbouring tiles.
 
     Returns:
         list: A list of words detected on the submitted image.
     """
-    reader = Reader(languages, gpu=False, verbose=False)
-    ocr_data = reader.readtext(pixels)
+    if detection_only and scale is not None:
+        raise ValueError("detection_only cannot be combined with scale")
+    if reader is None:
+        reader = get_reader(languages)
+
+    profiler = get_profiler()
+    # Regions and tiles are read by worker threads, which have no record of their own
+    record = profiler.current
+
+    def read(image):
+        with profiler.stage('readtext', record):
+            if detection_only:
+                return read_text_detection_only(image, reader, Config().authorized_words)
+            if scale is None:
+                return reader.readtext(image)
+            return read_text_cascade(image, reader, scale, **(cascade_options or {}))
+
+    if ocr_cache is not None:
+        # Detection-only results depend on the lengths of the authorized words
+        word_lengths = sorted({len(word) for word in Config().authorized_words}) \
+            if detection_only else None
+        fingerprint = get_ocr_fingerprint(
+            reader, scale=scale, cascade_options=cascade_options, regions=regions,
+            detection_only=detection_only, word_lengths=word_lengths,
+            tile_size=tile_size, tile_overlap=tile_overlap if tile_size else None)
+        key = ocr_cache.get_key(pixels, fingerprint)
+        ocr_data = ocr_cache.get(key)
+        if ocr_data is not None:
+            profiler.count('ocr_cache_hits')
+            return filter_ocr_data(ocr_data)
+
+    if tile_size is not None:
+        ocr_data = read_text_tiled(pixels, read, tile_size, tile_overlap, regions)
+    elif regions is None:
+        ocr_data = read(pixels)
+    else:
+        ocr_data = read_text_in_regions(pixels, regions, read)
+    if ocr_cache is not None:
+        ocr_cache.put(key, ocr_data)
+    return filter_ocr_data(ocr_data)
+
+
+def filter_ocr_data(ocr_data: list) -> list:
+    """Discard unreliable OCR results and authorized words from raw easyOCR output.
+
+    Args:
+        ocr_data: A list of words and coordinates returned by the easyOCR Reader.
+
+    Returns:
+        list: A list of words to hide on the image.
+    """
     # ocr data[0][2] is the level of confidence of the result
     # If the result is near 0, it is very likely that there is no text
     try:
@@ -186,85 +578,83 @@ def remove_authorized_words_from(ocr_data: list) -> list:
     It is useful if you want to keep some text information on your image such
     as image laterality information (RMLO, LCC, OBLIQUE G...).
 
+    Words are looked up with the matcher compiled when the configuration is loaded
+    (see [AuthorizedWordMatcher][deidcm.dicom.word_matcher.AuthorizedWordMatcher]).
+
     Args:
         ocr_data: A list of words and coordinates obtained after submitting an image to easyOCR Reader.
 
     Returns:
         The same list of words and coordinates minus the authorized words elements.
     """
-    config = Config()
+    matcher = Config().word_matcher
     if ocr_data is None:
         filtered_ocr_data = ocr_data
     else:
         filtered_ocr_data = []
-        for data in ocr_data:
-            if data[1].upper() in config.authorized_words:
-                log(f'Ignoring word {data[1].upper()}')
-            else:
-                filtered_ocr_data.append(data)
+        with get_profiler().stage('authorized_words'):
+            for data in ocr_data:
+                if matcher.is_authorized(data[1]):
+                    log(f'Ignoring word {data[1].upper()}')
+                else:
+                    filtered_ocr_data.append(data)
     return filtered_ocr_data
 
 
-def hide_text(pixels: np.ndarray, ocr_data: list, color_value: str = "black", mode: str = "rectangle", margin=300) -> np.ndarray:
+def hide_text(pixels: np.ndarray, ocr_data: list, color_value: str = "black", mode: str = "rectangle", margin=300,
+              inplace: bool = False, strength: int = None) -> np.ndarray:
     """Censor text present on the pixels array representing an image.
 
-    Take the input image and draw new shapes with PIL package in order to
-    censor OCR-detected words.
+    Draw filled rectangles, blur or pixelate the OCR-detected words directly on the
+    numpy array (see `deidcm.dicom.redaction`). The dtype of the array is preserved.
 
     Args:
         pixels: A pixels array representing an image
         ocr_data: A list of words and coordinates obtained by easyOCR Reader after submitting an image.
         color_value: A string indicating the color of the rectangle used for censoring information (`white` or `black`)
-        mode: A string indicating the method for censoring information. (`blur` or `rectangle`)
+        mode: A string indicating the method for censoring information. (`blur`, `pixelate` or `rectangle`)
+        margin: The number of pixels hidden around each word.
+        inplace: Modify `pixels` instead of a copy when the array is writeable.
+        strength: The radius of the blur filter (`blur` mode) or the size of the blocks
+            (`pixelate` mode). Defaults to `BLUR_RADIUS` and `PIXELATE_BLOCK_SIZE`.
 
     Returns:
         The deidentified pixels array.
     """
-    # Create a pillow image from the numpy array
-    im = Image.fromarray(pixels)
-    # Gets the coordinate of the top-left and the bottom-right points
-    for found in ocr_data:
-        # This condition avoids common false positives
-        if found[1] != "" and len(found[1]) > 1:
-            x1, y1 = int(found[0][0][0]), int(found[0][0][1])
-            x2, y2 = int(found[0][2][0]), int(found[0][2][1])
-
-            if x1 < x2:
-                x1 = x1 - margin
-                x2 = x2 + margin
-            else:
-                x1 = x1 + margin
-                x2 = x2 - margin
-
-            if y1 < y2:
-                y1 = y1 - margin
-                y2 = y2 + margin
-            else:
-                y1 = y1 + margin
-                y2 = y2 - margin
-
-            box = (x1, y1, x2, y2)
-
-            # Applies a hiding effect
-            if mode == "blur":
-                cut = im.crop(box)
-                for i in range(30):
-                    cut = cut.filter(ImageFilter.BLUR)
-                im.paste(cut, box)
-            else:
-                # Add a black rectangle on the targeted text
-                draw = ImageDraw.Draw(im)
-
-                # If the value in the pixel array is a tuple, the color has to be a tuple (RGB image)
-                if color_value == 'white':
-                    color = (255, 255, 255) if type(
-                        pixels[0][0]) == tuple else 255
-                else:
-                    color = (0, 0, 0) if type(pixels[0][0]) == tuple else 0
-                draw.rectangle([x1, y1, x2, y2], fill=color)
-                del draw
+    if mode == "blur":
+        return redact_blur(pixels, ocr_data, margin, strength or BLUR_RADIUS, inplace=inplace)
+    if mode == "pixelate":
+        return redact_pixelate(pixels, ocr_data, margin, strength or PIXELATE_BLOCK_SIZE, inplace=inplace)
+    return redact_rectangles(pixels, ocr_data, color_value, margin, inplace=inplace)
+
 
-    return np.asarray(im)
+def hide_text_volume(volume: np.ndarray, ocr_data: list, color_value: str = "black", mode: str = "rectangle",
+                     margin=300, inplace: bool = False, strength: int = None) -> np.ndarray:
+    """Censor text on every frame of a multi-frame pixels array.
+
+    Rectangles are filled on all the frames at once (see
+    [redact_volume][deidcm.dicom.redaction.redact_volume]). Blur and pixelation are
+    applied frame by frame, as they depend on the content of each frame.
+
+    Args:
+        volume: A pixels array of shape (frames, rows, columns).
+        ocr_data: A list of words and coordinates obtained by easyOCR Reader on any frame.
+        color_value: See [hide_text][deidcm.dicom.deid_mammogram.hide_text].
+        mode: See [hide_text][deidcm.dicom.deid_mammogram.hide_text].
+        margin: The number of pixels hidden around each word.
+        inplace: Modify `volume` instead of a copy when the array is writeable.
+        strength: See [hide_text][deidcm.dicom.deid_mammogram.hide_text].
+
+    Returns:
+        The deidentified volume.
+    """
+    if mode not in ("blur", "pixelate"):
+        return redact_volume(volume, ocr_data, color_value, margin, inplace=inplace)
+    if not inplace or not volume.flags.writeable:
+        volume = volume.copy()
+    for frame in volume:
+        hide_text(frame, ocr_data, color_value, mode, margin, inplace=True, strength=strength)
+    return volume
 
 
 def deidentify_attributes(indir: str, outdir: str, org_root: str, erase_outdir: bool = True) -> pd.DataFrame:
@@ -295,49 +685,182 @@ def deidentify_attributes(indir: str, outdir: str, org_root: str, erase_outdir:
         for file in os.listdir(outdir):
             os.remove(os.path.join(outdir, file))
 
-    df = dicom2df(indir)
+    return deidentify_dataframe(dicom2df(indir), org_root)
+
+
+def deidentify_attributes_chunks(indir: str, org_root: str,
+                                 chunksize: int = DICOM2DF_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """Deidentify the attributes of a folder of DICOM files by batches of `chunksize` files.
+
+    Only one batch is in memory at a time (see `dicom2df_chunks`). Pseudonyms of
+    UIDs and dates do not depend on the batch, so they are the ones of
+    `deidentify_attributes`. An attribute erased by the recipe is only set to an
+    empty value in the batches where at least one file has it.
+
+    Args:
+        indir: The input directory (DICOM files to deidentify)
+        org_root: An organization root identifier for deidentifying DICOM UIDs.
+        chunksize: The number of files of each batch.
+
+    Yields:
+        A Pandas dataframe with the deidentified attributes of the next batch of files.
+    """
+    for df in dicom2df_chunks(indir, chunksize):
+        yield deidentify_dataframe(df, org_root)
+
+
+def deidentify_attributes_chunked(indir: str, outdir: str, org_root: str, store_path: str,
+                                  chunksize: int = DICOM2DF_CHUNKSIZE,
+                                  erase_outdir: bool = True) -> AttributeStore:
+    """Deidentify the attributes of a large folder of DICOM files into an on-disk store.
 
+    Same as `deidentify_attributes`, except that files are deidentified by batches
+    of `chunksize` files, and each batch is written as a Parquet file in `store_path`
+    (see `deidcm.dicom.attribute_store`). Memory usage does not depend on the number
+    of files. The store can then be read batch by batch, e.g. for `df2dicom`:
+
+        store = deidentify_attributes_chunked(indir, outdir, org_root, store_path)
+        for df in store:
+            df2dicom(df, outdir, do_image_deidentification=True)
+
+    Args:
+        indir: The input directory (DICOM files to deidentify)
+        outdir: The output directory (deidentified/resulting files)
+        org_root: An organization root identifier for deidentifying DICOM UIDs.
+        store_path: The directory of the store. Its previous content is replaced.
+        chunksize: The number of files of each batch.
+        erase_outdir: Empty the output directory if True
+
+    Returns:
+        The store of the deidentified attributes.
+    """
+    check_parquet_available()
+    if False in list(map(os.path.exists, [indir, outdir])):
+        raise ValueError(f"Path {indir} or {outdir} does not exist.")
+
+    if erase_outdir:
+        for file in os.listdir(outdir):
+            # The store may be in the output directory, it is cleared below
+            if os.path.abspath(os.path.join(outdir, file)) != os.path.abspath(store_path):
+                os.remove(os.path.join(outdir, file))
+
+    store = AttributeStore(store_path)
+    store.clear()
+    for df in deidentify_attributes_chunks(indir, org_root, chunksize):
+        store.append(df)
+    return store
+
+
+def deidentify_dataframe(df: pd.DataFrame, org_root: str) -> pd.DataFrame:
+    """Deidentify the attributes of a dataframe built by `dicom2df`.
+
+    Args:
+        df: The dataframe of `dicom2df`.
+        org_root: An organization root identifier for deidentifying DICOM UIDs.
+
+    Returns:
+        A Pandas dataframe containing the deidentified attributes.
+    """
     config = Config()
-    for file in df.index:
-        for attribute in df.columns:
-            value = df[attribute][file]
-            if attribute != 'FilePath':
-                df.loc[file, attribute] = apply_deidentification(
-                    attribute,
-                    value,
-                    config.recipe,
-                    org_root
-                )
+    # The rule of each column is resolved once, and applied to the whole column
+    columns = {}
+    for attribute in df.columns:
+        if attribute == 'FilePath':
+            columns[attribute] = df[attribute]
+        else:
+            action, tags, valuerep = get_attribute_action(attribute, config.compiled_recipe)
+            columns[attribute] = deidentify_column(df[attribute], action, tags, valuerep, org_root)
+    df = pd.DataFrame(columns, index=df.index)
     df['PatientIdentityRemoved_0x00120062_CS_1____'] = 'YES'
     return df
 
 
+def deidentify_column(column: pd.Series, action: str, tags: list, valuerep: str, org_root: str) -> pd.Series:
+    """Apply a deidentification action to all the values of a column of `dicom2df`.
+
+    The result is the same as calling `apply_deidentification` on each value.
+    Pseudonyms that do not depend on random values are computed once per distinct value.
+
+    Args:
+        column: The values of an attribute.
+        action: The action of the attribute (RETIRER, EFFACER, PSEUDONYMISER or CONSERVER),
+            see `get_attribute_action`.
+        tags: The tags of the attribute.
+        valuerep: The VR of the attribute.
+        org_root: An organization root identifier for deidentifying DICOM UIDs.
+
+    Returns:
+        The deidentified column, with the same dtype as `column`.
+    """
+    if action == 'RETIRER':
+        values = pd.Series(float("NaN"), index=column.index)
+    elif action == 'EFFACER':
+        values = pd.Series('', index=column.index)
+    elif action == 'CONSERVER':
+        return column
+    else:
+        def pseudonymize(value):
+            return deidentify(tags, valuerep, value, org_root)
+        if not is_random_pseudonym(tags, valuerep):
+            pseudonymize = lru_cache(maxsize=None)(pseudonymize)
+        values = column.map(pseudonymize, na_action='ignore')
+    return values.astype(column.dtype)
+
+
+def is_random_pseudonym(tags: list, vr: str) -> bool:
+    """Check if `deidentify` generates random pseudonyms for an attribute (names, identifiers, SH and LO)"""
+    if vr in ['DA', 'DT', 'TM']:
+        return False
+    return vr in ['PN', 'SH', 'LO'] or any_in(tags, ['0x00100020'])
+
+
 def get_id(id_attribute):
     """reformats the id stored as a string 0xYYYYZZZZ to a tuple"""
     y_id = '0x' + id_attribute[6:len(id_attribute)]
     return (id_attribute[0:6], y_id)
 
 
-def apply_deidentification(attribute: str, value: str, recipe: dict, org_root: str):
+def apply_deidentification(attribute: str, value: str, recipe: Union[dict, CompiledRecipe], org_root: str):
     """Deidentifies the attribute depending on the deidentification recipe"""
-    attr_el = attribute.split('_')
-    tags = list(filter(lambda x: x if x.startswith('0x') else None, attr_el))
-    valuerep = get_vr(attr_el)
-    rules = list(map(lambda x: get_general_rule(
-        x, recipe["general_rules"]), tags))
-    specific_rules = get_specific_rule(tags, recipe["specific_rules"])
-    rules = [specific_rules] if specific_rules is not None else rules
-
-    if 'RETIRER' in rules:
+    action, tags, valuerep = get_attribute_action(attribute, recipe)
+    if action == 'RETIRER':
         return float("NaN")
-    elif 'EFFACER' in rules:
+    elif action == 'EFFACER':
         return ''
-    elif 'PSEUDONYMISER' in rules:
+    elif action == 'PSEUDONYMISER':
         return deidentify(tags, valuerep, value, org_root)
-    elif 'CONSERVER' in rules:
+    else:
         return value
+
+
+def get_attribute_action(attribute: str, recipe: Union[dict, CompiledRecipe]) -> Tuple[str, list, str]:
+    """Resolve the deidentification action of an attribute (a column of `dicom2df`)
+
+    When the attribute is in one or more sequences, the most restrictive rule of its
+    tags is applied, unless a specific rule is defined for it.
+
+    Args:
+        attribute: The name of a column of the dataframe built by `dicom2df`.
+        recipe: A Python dictionary containing recipe elements (see `load_recipe()`),
+            or the compiled recipe of the configuration (`Config().compiled_recipe`)
+            for faster lookups.
+
+    Returns:
+        tuple: The action (RETIRER, EFFACER, PSEUDONYMISER or CONSERVER), the tags of
+            the attribute and its VR.
+    """
+    attr_el = attribute.split('_')
+    tags = list(filter(lambda x: x if x.startswith('0x') else None, attr_el))
+    valuerep = get_vr(attr_el)
+    if isinstance(recipe, CompiledRecipe):
+        rules = recipe.get_rules(tags)
     else:
-        raise ValueError(f"Unknown rule {rules}")
+        rules = list(map(lambda x: get_general_rule(
+            x, recipe["general_rules"]), tags))
+        specific_rules = get_specific_rule(tags, recipe["specific_rules"])
+        rules = [specific_rules] if specific_rules is not None else rules
+
+    return get_most_restrictive_action(rules), tags, valuerep
 
 
 def get_vr(attr_el: list) -> str:
@@ -367,15 +890,14 @@ def get_general_rule(tag: str, recipe: dict) -> str:
         The action associated to this DICOM tag in the provided recipe. It can be anything among deidentification actions (CONSERVER, RETIRER EFFACER, PSEUDONYMISER)
     """
     # rule for 0x50xxxxxx, 0x60xx4000, 0x60xx3000, 0xggggeeee where gggg is odd
-    if re.match('^(0x60[0-9a-f]{2}[3-4]{1}000|0x50[0-9a-f]{6})$', tag) or \
-            int(tag[2:6], 16) % 2:
-        return 'RETIRER'
+    range_rule = get_range_rule(parse_tag(tag))
+    if range_rule is not None:
+        return range_rule
     # normal tag
-    else:
-        try:
-            return recipe[tag][2]
-        except KeyError:
-            return 'RETIRER'
+    try:
+        return recipe[tag][2]
+    except KeyError:
+        return 'RETIRER'
 
 
 def get_specific_rule(tags: List[str], recipe: dict) -> str:
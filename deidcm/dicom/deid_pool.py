@@ -0,0 +1,174 @@
+"""
+
+This module contains a process pool for deidentifying images on several cores.
+
+Each worker process builds its easyOCR reader once, at start-up, and warms it
+up on a blank image. Files are then distributed to the workers in chunks and
+results are returned in the order of the input files, whatever the order in
+which workers finish.
+
+Workers are spawned (not forked) so that torch is initialized in each
+worker. Scripts using the pool must therefore protect their entry point with
+`if __name__ == "__main__":`.
+
+"""
+
+import multiprocessing
+import os
+from typing import Iterator
+
+import numpy as np
+import torch
+
+from deidcm.config import Config
+from deidcm.dicom.deid_mammogram import deidentify_image_ndarray, deidentify_image_png
+from deidcm.dicom.encoding import encode_frames
+from deidcm.dicom.ocr_reader import DEFAULT_LANGUAGES, warm_up_reader
+from deidcm.dicom.pixel_cache import get_pixel_cache, read_dicom
+
+DEFAULT_TORCH_THREADS = 1
+DEFAULT_CHUNK_SIZE = 1
+DEFAULT_START_METHOD = 'spawn'
+
+# State of a worker process, set by init_worker
+_worker_reader = None
+_worker_ocr_options = None
+
+
+def init_worker(config_state: dict, languages: list, gpu: bool, torch_threads: int,
+                ocr_options: dict, reader_options: dict) -> None:
+    """Prepare a worker process: configuration, torch threads and warm easyOCR reader"""
+    global _worker_reader, _worker_ocr_options
+    Config.set_state(config_state)
+    torch.set_num_threads(torch_threads)
+    # Each file is read once by a single worker, there is nothing to cache
+    get_pixel_cache().max_bytes = 0
+    _worker_reader = warm_up_reader(languages, gpu, **reader_options)
+    _worker_ocr_options = ocr_options
+
+
+def deidentify_pixels_task(path: str) -> np.ndarray:
+    """Deidentify the image of a DICOM file in a worker process"""
+    return deidentify_image_ndarray(read_dicom(path), reader=_worker_reader,
+                                    ocr_options=_worker_ocr_options)
+
+
+def deidentify_encode_task(task: tuple) -> tuple:
+    """Deidentify the image of a DICOM file and losslessly encode it in a worker process"""
+    path, encoding = task
+    ds = read_dicom(path)
+    pixels = deidentify_image_ndarray(ds, reader=_worker_reader, ocr_options=_worker_ocr_options)
+    frames = encode_frames(pixels, ds.BitsAllocated, encoding,
+                           number_of_frames=int(ds.get('NumberOfFrames', 1) or 1),
+                           photometric_interpretation=ds.get('PhotometricInterpretation', 'MONOCHROME2'))
+    return pixels, frames
+
+
+def deidentify_png_task(task: tuple) -> str:
+    """Deidentify the image of a DICOM file and write it as PNG in a worker process"""
+    path, outdir, filename, png_options = task
+    deidentify_image_png(path, outdir, filename, reader=_worker_reader,
+                         ocr_options=_worker_ocr_options, png_options=png_options)
+    return os.path.join(outdir, f'{filename}.png')
+
+
+class DeidentificationPool:
+    """Pool of worker processes deidentifying images with a warm easyOCR reader.
+
+    The pool is a context manager:
+
+        with DeidentificationPool(workers=4) as pool:
+            for pixels in pool.deidentify_pixels(paths):
+                ...
+    """
+
+    def __init__(self, workers: int = None, torch_threads: int = DEFAULT_TORCH_THREADS,
+                 chunksize: int = DEFAULT_CHUNK_SIZE, languages: list = DEFAULT_LANGUAGES,
+                 gpu: bool = False, ocr_options: dict = None, start_method: str = DEFAULT_START_METHOD,
+                 **reader_options) -> None:
+        """
+        Args:
+            workers: The number of worker processes. Defaults to the number of CPUs.
+            torch_threads: The number of threads used by torch in each worker.
+            chunksize: The number of files sent to a worker at once.
+            languages: The languages of the easyOCR reader of each worker.
+            gpu: Whether the readers run on GPU or not.
+            ocr_options: Keyword arguments given to
+                [get_text_areas][deidcm.dicom.deid_mammogram.get_text_areas]. They must be picklable.
+            start_method: The multiprocessing start method (`spawn`, `forkserver` or `fork`).
+            **reader_options: Any other keyword argument accepted by `easyocr.Reader`.
+        """
+        if workers is not None and workers < 1:
+            raise ValueError(f"The number of workers must be positive, got {workers}")
+        self.workers = workers or os.cpu_count()
+        self.chunksize = chunksize
+        # Make sure the configuration is loaded before exporting it to the workers
+        Config()
+        context = multiprocessing.get_context(start_method)
+        self._pool = context.Pool(
+            self.workers,
+            initializer=init_worker,
+            initargs=(Config.get_state(), list(languages), gpu, torch_threads,
+                      ocr_options, reader_options)
+        )
+
+    def deidentify_pixels(self, paths: list) -> Iterator[np.ndarray]:
+        """Deidentify the images of DICOM files.
+
+        Args:
+            paths: The paths of the DICOM files.
+
+        Returns:
+            An iterator over the deidentified pixel arrays, in the order of `paths`.
+        """
+        return self._pool.imap(deidentify_pixels_task, paths, self.chunksize)
+
+    def deidentify_encoded(self, paths: list, encoding: str) -> Iterator[tuple]:
+        """Deidentify the images of DICOM files and losslessly encode them in the workers.
+
+        Args:
+            paths: The paths of the DICOM files.
+            encoding: The output encoding, see `deidcm.dicom.encoding`.
+
+        Returns:
+            An iterator over (deidentified pixel array, encoded frames) pairs, in the order
+                of `paths`. Frames are stored in a dataset with
+                [set_encoded_pixel_data][deidcm.dicom.encoding.set_encoded_pixel_data].
+        """
+        tasks = [(path, encoding) for path in paths]
+        return self._pool.imap(deidentify_encode_task, tasks, self.chunksize)
+
+    def deidentify_png(self, paths: list, outdir: str, filenames: list,
+                       png_options: dict = None) -> Iterator[str]:
+        """Deidentify the images of DICOM files and write them as PNG files in outdir.
+
+        Args:
+            paths: The paths of the DICOM files.
+            outdir: The path of the directory that will store the PNG files.
+            filenames: The name of each PNG file (without the file extension).
+            png_options: The options of the PNG files, see `deidcm.dicom.png_export`.
+
+        Returns:
+            An iterator over the paths of the PNG files, in the order of `paths`.
+        """
+        tasks = [(path, outdir, filename, png_options) for path, filename in zip(paths, filenames)]
+        return self._pool.imap(deidentify_png_task, tasks, self.chunksize)
+
+    def close(self) -> None:
+        """Wait for the pending files and stop the worker processes"""
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self) -> None:
+        """Stop the worker processes immediately"""
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,236 @@
+"""
+
+This module contains the per-device annotation templates.
+
+Screening centres use a small set of devices, and each device burns text in
+at the same positions on every image. The boxes hidden on the images of a
+device (identified by its Manufacturer, ManufacturerModelName,
+SoftwareVersions and image size) are learned from the OCR results. Once the
+same boxes have been found on `min_observations` consecutive images, the
+template is stable and is applied directly, without running the OCR.
+
+The values burned in differ from one image to another: a longer patient name
+does not fit in the learned box. Template boxes are therefore widened by
+`width_margin` times their width when they are applied, away from the
+vertical border of the image their text is aligned on. With the default
+margin, values up to twice as long as the learned ones are hidden.
+
+To detect a change of the burned-in annotations (drift), the OCR still runs
+on one image every `check_interval` images. If its results do not match the
+template, both the OCR boxes and the template boxes are hidden on that image
+and the template is learned again.
+
+"""
+
+import json
+import os
+import threading
+
+from pydicom import Dataset
+
+from deidcm.dicom.ocr_regions import get_bounding_box
+from deidcm.dicom.utils import log
+
+TEMPLATE_MIN_OBSERVATIONS = 5
+TEMPLATE_CHECK_INTERVAL = 10
+TEMPLATE_MATCH_IOU = 0.5
+TEMPLATE_WIDTH_MARGIN = 1.0
+
+# Text of the template boxes given to hide_text, which ignores texts of one character
+TEMPLATE_TEXT = 'TEMPLATE'
+
+
+def get_device_key(ds: Dataset, shape: tuple) -> tuple:
+    """Identify the device that produced an image, and the size of the image"""
+    return (
+        str(ds.get('Manufacturer', '')),
+        str(ds.get('ManufacturerModelName', '')),
+        str(ds.get('SoftwareVersions', '')),
+        int(shape[0]),
+        int(shape[1])
+    )
+
+
+def get_iou(box1: tuple, box2: tuple) -> float:
+    """Compute the intersection over union of two (x1, y1, x2, y2) boxes"""
+    width = min(box1[2], box2[2]) - max(box1[0], box2[0])
+    height = min(box1[3], box2[3]) - max(box1[1], box2[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    area1 = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    area2 = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    return intersection / (area1 + area2 - intersection)
+
+
+def match_boxes(template: list, boxes: list, min_iou: float = TEMPLATE_MATCH_IOU) -> list:
+    """Pair each template box with a box of the same position.
+
+    Returns:
+        list: The matched (template box, box) pairs, or None if the two lists of
+            boxes do not describe the same annotations.
+    """
+    if len(template) != len(boxes):
+        return None
+    remaining = list(boxes)
+    pairs = []
+    for template_box in template:
+        best = max(remaining, key=lambda box: get_iou(template_box, box), default=None)
+        if best is None or get_iou(template_box, best) < min_iou:
+            return None
+        remaining.remove(best)
+        pairs.append((template_box, best))
+    return pairs
+
+
+def get_ocr_boxes(ocr_data: list) -> list:
+    """Convert the words to hide to (x1, y1, x2, y2) boxes"""
+    return [get_bounding_box(found[0]) for found in ocr_data or [] if len(found[1]) > 1]
+
+
+def widen_box(box: tuple, columns: int, margin: float = TEMPLATE_WIDTH_MARGIN) -> tuple:
+    """Widen a template box by `margin` times its width, on the side where its text can grow.
+
+    Burned-in texts are aligned on the closest vertical border of the image, so a longer
+    value extends its box away from this border.
+
+    Args:
+        box: A (x1, y1, x2, y2) box.
+        columns: The width of the image.
+        margin: The added width, as a fraction of the width of the box.
+    """
+    x1, y1, x2, y2 = box
+    extra = int(round((x2 - x1) * margin))
+    if x1 <= columns - x2:
+        return (x1, y1, min(columns - 1, x2 + extra), y2)
+    return (max(0, x1 - extra), y1, x2, y2)
+
+
+def boxes_to_ocr_data(boxes: list) -> list:
+    """Convert (x1, y1, x2, y2) boxes to easyOCR-like results accepted by hide_text"""
+    return [
+        ([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], TEMPLATE_TEXT, 1.0)
+        for x1, y1, x2, y2 in boxes
+    ]
+
+
+class DeviceTemplateStore:
+    """Templates of the boxes to hide, learned for each device from the OCR results"""
+
+    def __init__(self, min_observations: int = TEMPLATE_MIN_OBSERVATIONS,
+                 check_interval: int = TEMPLATE_CHECK_INTERVAL,
+                 min_iou: float = TEMPLATE_MATCH_IOU,
+                 width_margin: float = TEMPLATE_WIDTH_MARGIN) -> None:
+        """
+        Args:
+            min_observations: The number of consecutive images with the same boxes
+                needed for a template to be applied without OCR.
+            check_interval: Once a template is stable, the OCR runs on one image out of
+                `check_interval` to detect drift.
+            min_iou: The minimum intersection over union of two boxes considered at the
+                same position.
+            width_margin: The width added to the template boxes when they are applied, as
+                a fraction of their width (see `widen_box`).
+        """
+        self.min_observations = min_observations
+        self.check_interval = check_interval
+        self.min_iou = min_iou
+        self.width_margin = width_margin
+        self.templates = {}
+        self.template_hits = 0
+        self.ocr_runs = 0
+        self.drifts = 0
+        self._lock = threading.Lock()
+
+    def is_stable(self, key: tuple) -> bool:
+        """Check if the template of a device can be applied without OCR"""
+        template = self.templates.get(key)
+        return template is not None and template['observations'] >= self.min_observations
+
+    def lookup(self, key: tuple) -> list:
+        """Get the boxes to hide on an image of a device without running the OCR.
+
+        Args:
+            key: The device key, see `get_device_key`.
+
+        Returns:
+            list: easyOCR-like results built from the widened template boxes, or None if the
+                OCR has to run on this image (unknown or unstable template, or drift check).
+        """
+        with self._lock:
+            if not self.is_stable(key):
+                return None
+            template = self.templates[key]
+            template['uses'] += 1
+            if template['uses'] % self.check_interval == 0:
+                return None
+            self.template_hits += 1
+            columns = key[4]
+            return boxes_to_ocr_data([widen_box(box, columns, self.width_margin) for box in template['boxes']])
+
+    def update(self, key: tuple, ocr_data: list) -> list:
+        """Learn from the OCR results of an image and return the words to hide on it.
+
+        Args:
+            key: The device key, see `get_device_key`.
+            ocr_data: The words to hide found by the OCR (authorized words already removed).
+
+        Returns:
+            list: The words to hide. If the OCR results do not match a stable template,
+                the template boxes are hidden too.
+        """
+        boxes = get_ocr_boxes(ocr_data)
+        ocr_data = list(ocr_data or [])
+        with self._lock:
+            self.ocr_runs += 1
+            template = self.templates.get(key)
+            pairs = match_boxes(template['boxes'], boxes, self.min_iou) if template else None
+            if pairs is not None:
+                template['observations'] += 1
+                template['boxes'] = [
+                    (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    for a, b in pairs
+                ]
+                return ocr_data
+            if self.is_stable(key):
+                self.drifts += 1
+                log(f'Annotations of device {key} changed, learning its template again')
+                ocr_data += boxes_to_ocr_data(template['boxes'])
+            self.templates[key] = {'boxes': boxes, 'observations': 1, 'uses': 0}
+            return ocr_data
+
+    def get_stats(self) -> dict:
+        """Return the number of images deidentified with a template and with the OCR"""
+        with self._lock:
+            return {
+                'devices': len(self.templates),
+                'stable_devices': sum(self.is_stable(key) for key in self.templates),
+                'template_hits': self.template_hits,
+                'ocr_runs': self.ocr_runs,
+                'drifts': self.drifts
+            }
+
+    def save(self, path: str) -> None:
+        """Write the templates in a JSON file"""
+        with self._lock:
+            templates = [
+                {'key': list(key), 'boxes': [list(box) for box in template['boxes']],
+                 'observations': template['observations']}
+                for key, template in self.templates.items()
+            ]
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump(templates, f, indent=4)
+
+    def load(self, path: str) -> None:
+        """Read templates written by `save`, replacing the templates of the same devices"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'Cannot load {path}')
+        with open(path, 'r', encoding='utf8') as f:
+            templates = json.load(f)
+        with self._lock:
+            for template in templates:
+                self.templates[tuple(template['key'])] = {
+                    'boxes': [tuple(box) for box in template['boxes']],
+                    'observations': template['observations'],
+                    'uses': 0
+                }
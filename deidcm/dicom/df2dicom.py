@@ -11,15 +11,30 @@ import os
 import traceback
 import base64
 import json
+from contextlib import nullcontext
 
 import pandas as pd
 from numpy import ndarray
 import pydicom
 from pydicom.dataset import Dataset, FileMetaDataset
 from pydicom.sequence import Sequence
-from PIL import Image
+from easyocr import Reader
 from deidcm.dicom.utils import log
+from deidcm.dicom.mmap_reader import get_pixel_array, read_dicom_pixels
+from deidcm.dicom.deid_pool import DeidentificationPool
+from deidcm.dicom.encoding import (
+    encode_dataset,
+    is_encoding_available,
+    set_encoded_pixel_data,
+    set_native_pixel_data,
+    set_frames_pixel_data
+)
+from deidcm.dicom.multiframe import get_number_of_frames, set_number_of_frames
+from deidcm.dicom.png_export import check_png_options
+from deidcm.dicom.profiling import get_profiler
+from deidcm.dicom.pipeline import DEFAULT_QUEUE_SIZE, Stage, run_pipeline
 from deidcm.dicom.deid_mammogram import (
+    deidentify_frames,
     deidentify_image_ndarray,
     deidentify_image_png,
     save_deidentified_image_png,
@@ -27,10 +42,15 @@ from deidcm.dicom.deid_mammogram import (
 )
 
 PIXEL = ('0x7fe0010', 'OB')
+PIPELINE_READ_WORKERS = 2
+PIPELINE_OCR_WORKERS = 1
+PIPELINE_WRITE_WORKERS = 2
 MAMMO_ID_COL = 'SOPInstanceUID_0x00080018_UI_1____'
 
 
-def df2dicom(df: pd.DataFrame, outdir: str, do_image_deidentification: bool = False, test: bool = False, output_file_formats: list = None) -> None:
+def df2dicom(df: pd.DataFrame, outdir: str, do_image_deidentification: bool = False, test: bool = False, output_file_formats: list = None, reader: Reader = None,
+             workers: int = 0, pool_options: dict = None, pipeline_options: dict = None,
+             use_mmap: bool = False, output_encoding: str = None, png_options: dict = None) -> dict:
     """
     Build DICOM and/or PNG files from a pandas DataFrame obtained with [dicom2df][deidcm.dicom.dicom2df.dicom2df].
 
@@ -43,73 +63,256 @@ def df2dicom(df: pd.DataFrame, outdir: str, do_image_deidentification: bool = Fa
         output_file_formats: A list of formats. Currently supported formats are ["dcm", "png"]. Both
             can be used alone if you need a single output format. If you select "png", the process
             will produce a PNG for each line of `df`
+        reader: A pre-built easyOCR reader used when `do_image_deidentification` is True.
+            If None, a cached reader is used. Ignored when `workers` is positive.
+        workers: If positive, images are deidentified by this number of worker processes
+            (see [DeidentificationPool][deidcm.dicom.deid_pool.DeidentificationPool]).
+            Output files are still written in the order of `df`.
+        pool_options: Keyword arguments given to `DeidentificationPool` (`torch_threads`,
+            `chunksize`, `languages`...).
+        pipeline_options: If given, files are processed by a streaming pipeline of
+            threaded stages (see [df2dicom_pipeline][deidcm.dicom.df2dicom.df2dicom_pipeline]).
+            Accepted keys are `read_workers`, `ocr_workers`, `write_workers` and `queue_size`.
+            Cannot be combined with `workers`.
+        use_mmap: Whether to memory-map the pixels of uncompressed source files instead of
+            loading them in memory (see [read_dicom_mmap][deidcm.dicom.mmap_reader.read_dicom_mmap]).
+        output_encoding: If given, the pixels of the DICOM outputs are losslessly compressed
+            (`rle`, `jpeg2000` or `jpeg-ls`, see `deidcm.dicom.encoding`). When `workers`
+            is positive, the encoding runs in the worker processes.
+        png_options: The bit depth (`8` or `16`), zlib `compression` level and `strategy` of
+            the PNG outputs, and whether to `window` them to 8 bits (see `deidcm.dicom.png_export`).
+
+    Returns:
+        The report of the pipeline if `pipeline_options` is given, None otherwise.
     """
-    for index in range(len(df)):
-        ds = build_dicom(df, index, parent_path='')
-        num_file = df[MAMMO_ID_COL][index]
-        img_path = df["FilePath"][index]
-        outfile = os.path.basename(img_path)
+    if output_file_formats is None:
+        output_file_formats = ["png"]
+    else:
+        output_file_formats = [f.lower() for f in output_file_formats]
+
+    if output_encoding is not None and not is_encoding_available(output_encoding):
+        raise ImportError(f"No codec installed for the {output_encoding} encoding")
+    png_options = check_png_options(png_options)
+
+    if pipeline_options is not None and not test:
+        if workers > 0:
+            raise ValueError("workers and pipeline_options cannot be combined")
+        return df2dicom_pipeline(df, outdir, do_image_deidentification, output_file_formats,
+                                 reader=reader, use_mmap=use_mmap, output_encoding=output_encoding,
+                                 png_options=png_options, **pipeline_options)
+
+    profiler = get_profiler()
+    use_pool = workers > 0 and do_image_deidentification and not test
+    pool_context = DeidentificationPool(workers, **(pool_options or {})) if use_pool else nullcontext()
+    with pool_context as pool:
+        encode_in_pool = use_pool and output_encoding is not None and "dcm" in output_file_formats
+        if encode_in_pool:
+            deidentified_pixels = pool.deidentify_encoded(list(df["FilePath"]), output_encoding)
+        elif use_pool:
+            deidentified_pixels = pool.deidentify_pixels(list(df["FilePath"]))
+
+        for index in range(len(df)):
+            ds = build_dicom(df, index, parent_path='')
+            num_file = df[MAMMO_ID_COL][index]
+            img_path = df["FilePath"][index]
+            outfile = os.path.basename(img_path)
+
+            # Backward compatibility with old tests in deidcm package
+            # This parameter should not be True otherwise
+            if test:
+                ds.save_as(f"{outdir}/{outfile}", write_like_original=False)
+                continue
+
+            outpath = os.path.join(outdir, num_file)
+
+            with profiler.file(img_path):
+                # The source file is read and decoded once for all outputs (see pixel_cache)
+                frames = None
+                if encode_in_pool:
+                    pixels, frames = next(deidentified_pixels)
+                elif use_pool:
+                    pixels = next(deidentified_pixels)
+                elif do_image_deidentification:
+                    with profiler.stage('decode'):
+                        source, source_pixels = read_dicom_pixels(img_path, use_mmap)
+                    if is_frame_by_frame(source, output_file_formats):
+                        profiler.set_image_size(source.Rows, source.Columns)
+                        volume = deidentify_frames(source, reader=reader, pixels=source_pixels)
+                        write_dicom_frames(ds, volume, outpath, output_encoding)
+                        continue
+                    pixels = deidentify_image_ndarray(source, reader=reader, pixels=source_pixels)
+                else:
+                    with profiler.stage('decode'):
+                        pixels = get_original_img(img_path, use_mmap)
 
-        # Backward compatibility with old tests in deidcm package
-        # This parameter should not be True otherwise
-        if test:
-            ds.save_as(f"{outdir}/{outfile}", write_like_original=False)
-            continue
+                write_outputs(ds, pixels, outpath, output_file_formats, do_image_deidentification,
+                              output_encoding, frames, png_options)
 
-        outpath = os.path.join(outdir, num_file)
 
-        if output_file_formats is None:
-            output_file_formats = ["png"]
-        else:
-            output_file_formats = [f.lower() for f in output_file_formats]
+def df2dicom_pipeline(df: pd.DataFrame, outdir: str, do_image_deidentification: bool,
+                      output_file_formats: list, reader: Reader = None,
+                      read_workers: int = PIPELINE_READ_WORKERS, ocr_workers: int = PIPELINE_OCR_WORKERS,
+                      write_workers: int = PIPELINE_WRITE_WORKERS,
+                      queue_size: int = DEFAULT_QUEUE_SIZE, use_mmap: bool = False,
+                      output_encoding: str = None, png_options: dict = None) -> dict:
+    """Build DICOM and/or PNG files from a pandas DataFrame with a streaming pipeline.
 
-        if do_image_deidentification:
-            ds = pydicom.read_file(img_path)
-            pixels = deidentify_image_ndarray(ds)
+    The files listed in `df` go through three stages connected by bounded queues
+    (see `deidcm.dicom.pipeline`): reading and decoding, OCR and redaction,
+    encoding and writing. Output files are identical to the ones of `df2dicom`.
 
-        if "png" in output_file_formats:
-            if do_image_deidentification:
-                save_deidentified_image_png(pixels, outpath)
-            else:
-                pixels = get_original_img(img_path)
-                Image.fromarray(pixels).save(f'{outpath}.png')
+    Args:
+        df: The pandas DataFrame obtained with `dicom2df`.
+        outdir: Path of the directory that will contain your files at the end of the process.
+        do_image_deidentification: Whether or not the pixels are deidentified with the OCR.
+        output_file_formats: A list of lowercase formats among ["dcm", "png"].
+        reader: A pre-built easyOCR reader. If None, a cached reader is used.
+        read_workers: The number of threads reading and decoding files.
+        ocr_workers: The number of threads running the OCR and hiding text.
+        write_workers: The number of threads encoding and writing output files.
+        queue_size: The maximum number of files waiting between two stages.
+        use_mmap: Whether to memory-map the pixels of uncompressed source files.
+        output_encoding: If given, the lossless encoding of the DICOM outputs. Files are
+            encoded by the write stage.
+        png_options: The options of the PNG outputs, see `deidcm.dicom.png_export`.
+
+    Returns:
+        dict: The report of the pipeline, with the statistics of each stage.
+
+    Raises:
+        ValueError: If the profiler has a sampler, which cannot profile several files at once.
+    """
+    if getattr(get_profiler(), 'sampler', None) is not None:
+        raise ValueError("The sampler of the profiler cannot be used with the pipeline, "
+                         "which deidentifies several files at once")
+    def read(index):
+        ds = build_dicom(df, index, parent_path='')
+        return (index, ds) + read_dicom_pixels(df["FilePath"][index], use_mmap)
 
-        if "dcm" in output_file_formats:
-            if do_image_deidentification:
-                ds.PixelData = numpy2bytes(pixels, ds)
-            else:
-                ds.PixelData = get_original_img(img_path).tobytes()
-            try:
-                # write_like_original=False in order to force pydicom to write
-                #  correct DICOM headers at file writing time
+    def deidentify(item):
+        index, ds, source, pixels = item
+        if do_image_deidentification:
+            pixels = deidentify_image_ndarray(source, reader=reader, pixels=pixels)
+        return index, ds, get_pixel_array(source, pixels)
+
+    def write(item):
+        index, ds, pixels = item
+        outpath = os.path.join(outdir, df[MAMMO_ID_COL][index])
+        # The write stage runs in its own thread, it has its own profiling record
+        with get_profiler().file(df["FilePath"][index]):
+            write_outputs(ds, pixels, outpath, output_file_formats, do_image_deidentification,
+                          output_encoding, png_options=png_options)
+
+    stages = [
+        Stage('read', read, read_workers),
+        Stage('ocr', deidentify, ocr_workers),
+        Stage('write', write, write_workers)
+    ]
+    report = run_pipeline(range(len(df)), stages, queue_size)
+    log(f"Pipeline bottleneck: {report['bottleneck']} stage")
+    return report
+
+
+def write_outputs(ds: Dataset, pixels: ndarray, outpath: str, output_file_formats: list,
+                  do_image_deidentification: bool, output_encoding: str = None,
+                  frames: list = None, png_options: dict = None) -> None:
+    """Write the PNG and/or DICOM outputs of a file built by `df2dicom`.
+
+    If `output_encoding` is given, the DICOM pixels are losslessly compressed, or
+    taken from `frames` if they were already encoded (e.g. by a worker process).
+    PNG files are written with `png_options` (see `deidcm.dicom.png_export`).
+    """
+    if "png" in output_file_formats:
+        save_deidentified_image_png(pixels, outpath, png_options, ds)
+
+    if "dcm" in output_file_formats:
+        profiler = get_profiler()
+        # The recipe removes the number of frames, needed to decode multi-frame outputs
+        set_number_of_frames(ds, pixels)
+        if frames is not None:
+            set_encoded_pixel_data(ds, frames, output_encoding)
+        elif output_encoding is not None:
+            with profiler.stage('encode'):
+                encode_dataset(ds, pixels, output_encoding)
+        elif do_image_deidentification:
+            set_native_pixel_data(ds, numpy2bytes(pixels, ds))
+        else:
+            set_native_pixel_data(ds, pixels.tobytes())
+        try:
+            # write_like_original=False in order to force pydicom to write
+            #  correct DICOM headers at file writing time
+            with profiler.stage('write'):
                 ds.save_as(f'{outpath}.dcm', write_like_original=False)
-            except (ValueError, AttributeError):
-                traceback.print_exc()
-                raise ValueError(f"DICOM file may be malformed")
+        except (ValueError, AttributeError):
+            traceback.print_exc()
+            raise ValueError(f"DICOM file may be malformed")
+
+
+def is_frame_by_frame(source: Dataset, output_file_formats: list) -> bool:
+    """Check if a file can be deidentified and written frame by frame.
+
+    Only the DICOM output of multi-frame files is: PNG files are written from the
+    whole deidentified volume.
+    """
+    return get_number_of_frames(source) > 1 and list(output_file_formats) == ["dcm"]
 
 
-def df2hdh(df: pd.DataFrame, outdir: str, exclude_images: bool) -> None:
+def write_dicom_frames(ds: Dataset, frames, outpath: str, output_encoding: str = None) -> None:
+    """Write the DICOM output of a multi-frame file from an iterator of deidentified frames.
+
+    Frames are converted, or encoded with `output_encoding`, as soon as they are
+    deidentified (see [deidentify_frames][deidcm.dicom.deid_mammogram.deidentify_frames]),
+    so that the decoded volume is never held in memory.
+    """
+    set_frames_pixel_data(ds, frames, output_encoding)
+    try:
+        with get_profiler().stage('write'):
+            ds.save_as(f'{outpath}.dcm', write_like_original=False)
+    except (ValueError, AttributeError):
+        traceback.print_exc()
+        raise ValueError(f"DICOM file may be malformed")
+
+
+def df2hdh(df: pd.DataFrame, outdir: str, exclude_images: bool, reader: Reader = None,
+           workers: int = 0, pool_options: dict = None, png_options: dict = None) -> None:
     """Special pipeline for HDH. 
 
     Deidentifies all the mammograms listed in df
     Write all the deidentified mammograms in outdir
     Write df as meta.csv in outdir 
+    Use `reader` as OCR reader if given, a cached reader otherwise
+    If `workers` is positive, use a pool of worker processes configured with `pool_options`
+    (see [DeidentificationPool][deidcm.dicom.deid_pool.DeidentificationPool])
+    Write the PNG files with `png_options` (see `deidcm.dicom.png_export`)
     """
     if not exclude_images:
-        for _, index in enumerate(range(len(df))):
-            try:
-                deidentify_image_png(
-                    df["FilePath"][index], outdir, df[MAMMO_ID_COL][index])
-            except ValueError:
-                traceback.print_exc()
-                raise ValueError(
-                    f"The file {df['FilePath'][index]} may be corrupted")
+        if workers > 0:
+            with DeidentificationPool(workers, **(pool_options or {})) as pool:
+                results = pool.deidentify_png(
+                    list(df["FilePath"]), outdir, list(df[MAMMO_ID_COL]), png_options)
+                for index in range(len(df)):
+                    try:
+                        next(results)
+                    except ValueError:
+                        traceback.print_exc()
+                        raise ValueError(
+                            f"The file {df['FilePath'][index]} may be corrupted")
+        else:
+            for _, index in enumerate(range(len(df))):
+                try:
+                    deidentify_image_png(
+                        df["FilePath"][index], outdir, df[MAMMO_ID_COL][index],
+                        reader=reader, png_options=png_options)
+                except ValueError:
+                    traceback.print_exc()
+                    raise ValueError(
+                        f"The file {df['FilePath'][index]} may be corrupted")
     df.to_csv(os.path.join(outdir, 'meta.csv'))
 
 
-def get_original_img(filepath) -> ndarray:
-    """Finds and returns the original image"""
-    return pydicom.read_file(filepath).pixel_array
+def get_original_img(filepath, use_mmap: bool = False) -> ndarray:
+    """Finds and returns the original image (read-only, see pixel_cache and mmap_reader)"""
+    return get_pixel_array(*read_dicom_pixels(filepath, use_mmap))
 
 
 def get_ds_attr(df, parent_path, attr):
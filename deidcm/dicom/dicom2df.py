@@ -14,8 +14,11 @@ import pandas as pd
 import json
 import itertools
 import time
+from typing import Iterator
 from deidcm.dicom.utils import log
 
+DICOM2DF_CHUNKSIZE = 1000
+
 
 def write_dicom(infiles):
     i = 0
@@ -54,6 +57,38 @@ def dicom2df(search_dir: str, with_private: bool = False, with_pixels: bool = Fa
     return pd.DataFrame(filter(lambda x: x, dicos))
 
 
+def dicom2df_chunks(search_dir: str, chunksize: int = DICOM2DF_CHUNKSIZE, with_private: bool = False,
+                    with_pixels: bool = False, with_seqs: bool = True) -> Iterator[pd.DataFrame]:
+    """Same as `dicom2df`, with one DataFrame per batch of `chunksize` files.
+
+    Files are read lazily, so that only one batch is in memory at a time. The
+    columns of each DataFrame are the attributes of the files of its batch.
+
+    Yields:
+        A dataframe with information of the next `chunksize` DICOM files of `search_dir`
+            (fewer for the last one, unreadable files are skipped).
+    """
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be positive, got {chunksize}")
+    files = search_dicom(search_dir)
+    success, nb_files = 0, 0
+    while True:
+        batch = list(itertools.islice(files, chunksize))
+        if not batch:
+            break
+        nb_files += len(batch)
+        lines = [line for line in (
+            flat_dicom(f, with_private=with_private, with_pixels=with_pixels, with_seqs=with_seqs)
+            for f in batch) if line]
+        success += len(lines)
+        if lines:
+            yield pd.DataFrame(lines)
+    log([
+        f"Successfully retrieved file(s): {success}",
+        f"Unreadable file(s): {nb_files - success}"
+    ])
+
+
 def get_success_rate(search_dir):
     success = 0
     nb_files = 0
@@ -80,16 +115,24 @@ def flat_dicom(dicom_file, with_private=False, with_pixels=False, with_seqs=True
     line = {}
 
     if is_readable(ds.file_meta, ds):
-        for element in itertools.chain(ds.file_meta, ds):
-            if ((with_pixels or element.tag != 0x7FE00010) and
-                (with_private or not element.is_private) and
-                    (with_seqs or element.VR != "SQ")):
-                dico_add(element, line=line, with_private=with_private,
-                         with_pixels=with_pixels, with_seqs=with_seqs)
+        line = flat_dataset(ds, with_private=with_private,
+                            with_pixels=with_pixels, with_seqs=with_seqs)
         line['FilePath'] = dicom_file
     return line
 
 
+def flat_dataset(ds, with_private=False, with_pixels=False, with_seqs=True):
+    """Flatten a dataset (and its file meta information) to a line of the dataframe of `dicom2df`"""
+    line = {}
+    for element in itertools.chain(ds.file_meta, ds):
+        if ((with_pixels or element.tag != 0x7FE00010) and
+            (with_private or not element.is_private) and
+                (with_seqs or element.VR != "SQ")):
+            dico_add(element, line=line, with_private=with_private,
+                     with_pixels=with_pixels, with_seqs=with_seqs)
+    return line
+
+
 def dico_add(element, line, base="", with_private=False, with_pixels=False, with_seqs=True):
     tag = f"{element.tag:#0{10}x}"
     name = f"{element.keyword}_" if element.keyword != '' else '_'
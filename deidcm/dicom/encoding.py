@@ -0,0 +1,226 @@
+"""
+
+This module contains the lossless encoders used for writing compressed DICOM files.
+
+Deidentified pixels are written uncompressed by default. They can instead be
+re-encoded with one of the following lossless transfer syntaxes:
+
+- `rle`: RLE Lossless, with the encoders of pydicom (always available).
+- `jpeg2000`: JPEG 2000 Image Compression (Lossless Only), with Pillow built
+  with OpenJPEG.
+- `jpeg-ls`: JPEG-LS Lossless Image Compression, with the optional `pyjpegls`
+  package (CharLS).
+
+Encoding is split in two steps: `encode_frames` compresses the pixels (it can
+run in a worker process), `set_encoded_pixel_data` stores the result in the
+dataset and updates its transfer syntax. `set_frames_pixel_data` does both
+from an iterator of frames, so that the frames of a volume are encoded as
+they are deidentified.
+
+"""
+
+import io
+from typing import Iterable, Iterator
+
+import numpy as np
+from PIL import Image, features
+from pydicom import Dataset
+from pydicom.encaps import encapsulate
+from pydicom.encoders import RLELosslessEncoder
+from pydicom.uid import ExplicitVRLittleEndian, JPEG2000Lossless, JPEGLSLossless, RLELossless
+
+from deidcm.dicom.multiframe import get_number_of_frames, set_number_of_frames
+
+try:
+    import jpeg_ls
+except ImportError:
+    jpeg_ls = None
+
+OUTPUT_TRANSFER_SYNTAXES = {
+    'rle': RLELossless,
+    'jpeg2000': JPEG2000Lossless,
+    'jpeg-ls': JPEGLSLossless
+}
+
+
+def get_transfer_syntax(encoding: str) -> str:
+    """Return the transfer syntax UID of an output encoding (`rle`, `jpeg2000` or `jpeg-ls`)"""
+    if encoding not in OUTPUT_TRANSFER_SYNTAXES:
+        raise ValueError(
+            f"Unknown encoding {encoding}, expected one of {list(OUTPUT_TRANSFER_SYNTAXES)}")
+    return OUTPUT_TRANSFER_SYNTAXES[encoding]
+
+
+def is_encoding_available(encoding: str) -> bool:
+    """Check if the codec of an output encoding is installed"""
+    transfer_syntax = get_transfer_syntax(encoding)
+    if transfer_syntax == RLELossless:
+        return RLELosslessEncoder.is_available
+    if transfer_syntax == JPEG2000Lossless:
+        return features.check('jpg_2000')
+    return jpeg_ls is not None
+
+
+def get_available_encodings() -> list:
+    """Return the output encodings whose codec is installed"""
+    return [encoding for encoding in OUTPUT_TRANSFER_SYNTAXES if is_encoding_available(encoding)]
+
+
+def encode_rle_frame(frame: np.ndarray, photometric_interpretation: str) -> bytes:
+    """Encode a frame with RLE Lossless"""
+    samples_per_pixel = frame.shape[2] if frame.ndim == 3 else 1
+    return RLELosslessEncoder.encode(
+        np.ascontiguousarray(frame),
+        rows=frame.shape[0],
+        columns=frame.shape[1],
+        samples_per_pixel=samples_per_pixel,
+        bits_allocated=frame.dtype.itemsize * 8,
+        bits_stored=frame.dtype.itemsize * 8,
+        photometric_interpretation=photometric_interpretation,
+        pixel_representation=0,
+        number_of_frames=1
+    )
+
+
+def encode_jpeg2000_frame(frame: np.ndarray) -> bytes:
+    """Encode a frame with lossless JPEG 2000 (codestream without JP2 header).
+
+    Pillow writes the codestream at the precision of the frame dtype (8 or 16 bits),
+    whatever the Bits Stored of the dataset: see `set_encoded_pixel_data`.
+    """
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format='JPEG2000', irreversible=False, no_jp2=True)
+    return buffer.getvalue()
+
+
+def encode_jpegls_frame(frame: np.ndarray) -> bytes:
+    """Encode a frame with lossless JPEG-LS"""
+    if jpeg_ls is None:
+        raise ImportError("JPEG-LS encoding requires the pyjpegls package")
+    if hasattr(jpeg_ls, 'encode_array'):
+        return bytes(jpeg_ls.encode_array(np.ascontiguousarray(frame), lossy_error=0))
+    return jpeg_ls.encode(np.ascontiguousarray(frame)).tobytes()
+
+
+def to_bits_allocated(pixels: np.ndarray, bits_allocated: int) -> np.ndarray:
+    """Convert pixels to unsigned integers of `bits_allocated` bits (8 or 16), as in `numpy2bytes`"""
+    if bits_allocated == 8:
+        return pixels.astype(np.uint8, copy=False)
+    if bits_allocated == 16:
+        return pixels.astype(np.uint16, copy=False)
+    raise ValueError(f"Unsupported BitsAllocated value: {bits_allocated}")
+
+
+def encode_frames(pixels: np.ndarray, bits_allocated: int, encoding: str,
+                  number_of_frames: int = 1, photometric_interpretation: str = 'MONOCHROME2') -> list:
+    """Losslessly encode the frames of a pixel array.
+
+    Args:
+        pixels: The pixel array, as returned by `pixel_array`.
+        bits_allocated: The number of bits allocated for each pixel (8 or 16). Pixels
+            are converted to unsigned integers of this size, as in `numpy2bytes`.
+        encoding: The output encoding (`rle`, `jpeg2000` or `jpeg-ls`).
+        number_of_frames: The number of frames of the pixel array.
+        photometric_interpretation: The photometric interpretation of the pixels.
+
+    Returns:
+        list: The encoded frames.
+    """
+    frames = pixels if number_of_frames > 1 else [pixels]
+    return list(iter_encoded_frames(frames, bits_allocated, encoding, photometric_interpretation))
+
+
+def iter_encoded_frames(frames: Iterable[np.ndarray], bits_allocated: int, encoding: str,
+                        photometric_interpretation: str = 'MONOCHROME2') -> Iterator[bytes]:
+    """Losslessly encode frames one at a time, see `encode_frames`"""
+    transfer_syntax = get_transfer_syntax(encoding)
+    if not is_encoding_available(encoding):
+        raise ImportError(f"No codec installed for the {encoding} encoding")
+    if bits_allocated not in (8, 16):
+        raise ValueError(f"Unsupported BitsAllocated value: {bits_allocated}")
+    for frame in frames:
+        frame = to_bits_allocated(frame, bits_allocated)
+        if transfer_syntax == RLELossless:
+            yield encode_rle_frame(frame, photometric_interpretation)
+        elif transfer_syntax == JPEG2000Lossless:
+            yield encode_jpeg2000_frame(frame)
+        else:
+            yield encode_jpegls_frame(frame)
+
+
+def set_encoded_pixel_data(ds: Dataset, frames: list, encoding: str) -> None:
+    """Store encoded frames in a dataset and update its transfer syntax.
+
+    The Number of Frames of multi-frame datasets is set to the number of frames.
+    JPEG 2000 frames are encoded at the precision of Bits Allocated: Bits Stored and
+    High Bit are updated to match the codestream.
+
+    Args:
+        ds: The pydicom dataset, with a file meta information.
+        frames: The frames encoded with `encode_frames`.
+        encoding: The encoding used for the frames.
+    """
+    ds.PixelData = encapsulate(frames)
+    ds['PixelData'].VR = 'OB'
+    ds['PixelData'].is_undefined_length = True
+    ds.file_meta.TransferSyntaxUID = get_transfer_syntax(encoding)
+    ds.is_little_endian, ds.is_implicit_VR = True, False
+    if ds.file_meta.TransferSyntaxUID == JPEG2000Lossless:
+        ds.BitsStored, ds.HighBit = ds.BitsAllocated, ds.BitsAllocated - 1
+    if len(frames) > 1:
+        ds.NumberOfFrames = len(frames)
+
+
+def set_native_pixel_data(ds: Dataset, pixel_data: bytes) -> None:
+    """Store uncompressed pixels in a dataset.
+
+    Datasets deidentified from compressed files keep the transfer syntax of their
+    source: it is replaced by Explicit VR Little Endian.
+    """
+    ds.PixelData = pixel_data
+    transfer_syntax = ds.file_meta.get('TransferSyntaxUID')
+    if transfer_syntax is not None and transfer_syntax.is_compressed:
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds.is_little_endian, ds.is_implicit_VR = True, False
+        ds['PixelData'].VR = 'OW' if ds.BitsAllocated > 8 else 'OB'
+        ds['PixelData'].is_undefined_length = False
+
+
+def encode_dataset(ds: Dataset, pixels: np.ndarray, encoding: str) -> None:
+    """Losslessly encode pixels and store them in a dataset.
+
+    The number of frames is taken from the shape of `pixels`, as the recipe removes
+    it from deidentified datasets.
+    """
+    set_number_of_frames(ds, pixels)
+    frames = encode_frames(
+        pixels, ds.BitsAllocated, encoding,
+        number_of_frames=get_number_of_frames(ds),
+        photometric_interpretation=ds.get('PhotometricInterpretation', 'MONOCHROME2'))
+    set_encoded_pixel_data(ds, frames, encoding)
+
+
+def set_frames_pixel_data(ds: Dataset, frames: Iterable[np.ndarray], encoding: str = None) -> None:
+    """Store the frames of a volume in a dataset, converting or encoding them one at a time.
+
+    The Number of Frames of the dataset is set to the number of frames stored.
+
+    With an `encoding`, only the encoded frames are kept in memory. Otherwise the
+    uncompressed Pixel Data is built from the bytes of each frame: pydicom writes it
+    from a single value, so it is held in memory as a whole.
+
+    Args:
+        ds: The pydicom dataset, with a file meta information.
+        frames: The frames of the volume, of shape (rows, columns).
+        encoding: The output encoding (`rle`, `jpeg2000` or `jpeg-ls`). If None,
+            the pixels are stored uncompressed (see `set_native_pixel_data`).
+    """
+    if encoding is not None:
+        photometric_interpretation = ds.get('PhotometricInterpretation', 'MONOCHROME2')
+        encoded = list(iter_encoded_frames(frames, ds.BitsAllocated, encoding, photometric_interpretation))
+        set_encoded_pixel_data(ds, encoded, encoding)
+    else:
+        encoded = [to_bits_allocated(frame, ds.BitsAllocated).tobytes() for frame in frames]
+        set_native_pixel_data(ds, b''.join(encoded))
+    # The recipe may have removed the number of frames, needed to decode the Pixel Data
+    ds.NumberOfFrames = len(encoded)
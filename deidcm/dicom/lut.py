@@ -0,0 +1,178 @@
+"""
+
+This module contains the look-up tables used for windowing DICOM images.
+
+Converting a 12 or 16-bit mammogram to an 8-bit image (for the OCR or for a
+PNG export) only depends on the window/level values and on the bit depth of
+the pixels. The conversion is therefore computed once for every possible
+pixel value, cached, and applied to an image with a single `np.take`.
+
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from pydicom import Dataset
+
+LUT_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=LUT_CACHE_SIZE)
+def get_window_lut(window: float, level: float, bits: int, signed: bool = False) -> np.ndarray:
+    """Build the 8-bit look-up table of a window/level pair.
+
+    The table has one entry for each value that can be stored on `bits` bits. Signed
+    values are shifted by 2 ** (bits - 1), see [apply_lut][deidcm.dicom.lut.apply_lut].
+
+    Args:
+        window: The window width.
+        level: The window center.
+        bits: The number of bits allocated for each pixel.
+        signed: Whether pixels are signed integers or not.
+
+    Returns:
+        A read-only uint8 array of 2 ** bits entries.
+    """
+    offset = 1 << (bits - 1) if signed else 0
+    lut = window_values(np.arange(1 << bits, dtype=np.float64) - offset, window, level)
+    lut.flags.writeable = False
+    return lut
+
+
+def window_values(values: np.ndarray, window: float, level: float) -> np.ndarray:
+    """Apply the window/level linear function on an array of values, without table"""
+    values = values.astype(np.float64, copy=False)
+    lower = level - 0.5 - (window - 1) / 2
+    upper = level - 0.5 + (window - 1) / 2
+    result = np.empty(values.shape, dtype=np.float64)
+    result[values <= lower] = 0
+    result[values > upper] = 255
+    middle = (values > lower) & (values <= upper)
+    result[middle] = ((values[middle] - (level - 0.5)) / (window - 1) + 0.5) * 255
+    return np.clip(np.trunc(result), 0, 255).astype(np.uint8)
+
+
+@lru_cache(maxsize=LUT_CACHE_SIZE)
+def get_voi_lut(descriptor: tuple, lut_data: tuple, bits: int, signed: bool = False) -> np.ndarray:
+    """Build the 8-bit look-up table of an item of the VOI LUT Sequence.
+
+    Args:
+        descriptor: The LUT Descriptor (number of entries, first mapped value, bits per entry).
+        lut_data: The LUT Data values.
+        bits: The number of bits allocated for each pixel.
+        signed: Whether pixels are signed integers or not.
+
+    Returns:
+        A read-only uint8 array of 2 ** bits entries.
+    """
+    nb_entries, first_mapped, entry_bits = descriptor
+    nb_entries = nb_entries or 65536
+    offset = 1 << (bits - 1) if signed else 0
+    values = np.arange(1 << bits, dtype=np.int64) - offset
+    indices = np.clip(values - first_mapped, 0, nb_entries - 1)
+    data = np.asarray(lut_data, dtype=np.float64)[:nb_entries]
+    lut = np.rint(data[np.minimum(indices, len(data) - 1)] * 255 / ((1 << entry_bits) - 1))
+    lut = np.clip(lut, 0, 255).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def apply_lut(pixels: np.ndarray, lut: np.ndarray, signed: bool = False) -> np.ndarray:
+    """Map every pixel through `lut` with a single gather"""
+    if signed:
+        bits = pixels.dtype.itemsize * 8
+        pixels = pixels.astype(np.int32) + (1 << (bits - 1))
+    return np.take(lut, pixels, mode='clip')
+
+
+def has_lut_support(pixels: np.ndarray) -> bool:
+    """Check if a pixel array can be windowed with a look-up table (integers up to 16 bits)"""
+    return np.issubdtype(pixels.dtype, np.integer) and pixels.dtype.itemsize <= 2
+
+
+def apply_window(pixels: np.ndarray, window: float, level: float) -> np.ndarray:
+    """Window a pixel array and return an 8-bit image"""
+    if not has_lut_support(pixels):
+        return window_values(pixels, window, level)
+    signed = np.issubdtype(pixels.dtype, np.signedinteger)
+    lut = get_window_lut(window, level, pixels.dtype.itemsize * 8, signed)
+    return apply_lut(pixels, lut, signed)
+
+
+def get_window_presets(ds: Dataset) -> list:
+    """Return the list of (window, level) presets defined in a DICOM dataset"""
+    if 'WindowWidth' not in ds or 'WindowCenter' not in ds:
+        return []
+    ew, ec = ds['WindowWidth'], ds['WindowCenter']
+    widths = ew.value if ew.VM > 1 else [ew.value]
+    centers = ec.value if ec.VM > 1 else [ec.value]
+    return [(int(ww), int(wc)) for ww, wc in zip(widths, centers)]
+
+
+def has_linear_window(ds: Dataset) -> bool:
+    """Check if the windowing of a dataset is a plain LINEAR window on unscaled pixels.
+
+    Only these windows give the same image with `window_image` as with pydicom's
+    `apply_voi_lut`. Other VOI LUT functions (SIGMOID, LINEAR_EXACT), rescaled pixels
+    and VOI LUT Sequences (preferred by pydicom over the windows) are not handled here.
+    """
+    if not get_window_presets(ds) or ds.get('VOILUTSequence') or ds.get('ModalityLUTSequence'):
+        return False
+    if (ds.get('VOILUTFunction') or 'LINEAR').upper() != 'LINEAR':
+        return False
+    slope, intercept = ds.get('RescaleSlope'), ds.get('RescaleIntercept')
+    return float(1 if slope is None else slope) == 1 and float(intercept or 0) == 0
+
+
+def get_dataset_lut(ds: Dataset, pixels: np.ndarray, preset: int = 0) -> np.ndarray:
+    """Get the 8-bit look-up table matching the windowing information of a dataset.
+
+    Window Width/Window Center presets are used first, then the VOI LUT Sequence.
+
+    Args:
+        ds: A pydicom dataset which can be obtained from a DICOM file.
+        pixels: The pixel array of the dataset. It must contain integers up to 16 bits.
+        preset: The index of the window preset (or of the VOI LUT Sequence item) to use.
+
+    Returns:
+        A uint8 look-up table, or None if the dataset does not contain windowing information.
+    """
+    if not has_lut_support(pixels):
+        raise TypeError(f"Cannot build a look-up table for {pixels.dtype} pixels")
+    signed = np.issubdtype(pixels.dtype, np.signedinteger)
+    bits = pixels.dtype.itemsize * 8
+    presets = get_window_presets(ds)
+    if presets:
+        window, level = presets[min(preset, len(presets) - 1)]
+        return get_window_lut(window, level, bits, signed)
+    if 'VOILUTSequence' in ds and len(ds.VOILUTSequence) > 0:
+        item = ds.VOILUTSequence[min(preset, len(ds.VOILUTSequence) - 1)]
+        lut_data = item.LUTData
+        if isinstance(lut_data, bytes):
+            lut_data = np.frombuffer(lut_data, dtype=np.uint16)
+        return get_voi_lut(tuple(item.LUTDescriptor), tuple(int(v) for v in lut_data), bits, signed)
+    return None
+
+
+def window_image(ds: Dataset, pixels: np.ndarray = None, preset: int = 0) -> np.ndarray:
+    """Convert the pixels of a dataset to an 8-bit image with its windowing information.
+
+    Args:
+        ds: A pydicom dataset which can be obtained from a DICOM file.
+        pixels: The pixel array of the dataset. If None, `ds.pixel_array` is used.
+        preset: The index of the window preset (or of the VOI LUT Sequence item) to use.
+
+    Returns:
+        A uint8 array, or None if the dataset does not contain windowing information.
+    """
+    if pixels is None:
+        pixels = ds.pixel_array
+    if not has_lut_support(pixels):
+        presets = get_window_presets(ds)
+        if not presets:
+            return None
+        return window_values(pixels, *presets[min(preset, len(presets) - 1)])
+    lut = get_dataset_lut(ds, pixels, preset)
+    if lut is None:
+        return None
+    return apply_lut(pixels, lut, np.issubdtype(pixels.dtype, np.signedinteger))
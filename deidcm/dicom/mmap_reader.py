@@ -0,0 +1,140 @@
+"""
+
+This module contains a memory-mapped reader for uncompressed DICOM files.
+
+Reading a DICOM file with pydicom loads the whole Pixel Data element in
+memory, and `pixel_array` makes another copy of it. For native (uncompressed)
+little endian transfer syntaxes, the pixels are stored as they are in memory.
+The file can therefore be memory-mapped, and the Pixel Data element exposed
+as a read-only numpy view at the right offset, dtype and shape: pages are
+loaded by the operating system only when pixels are read, and the only copy
+of the image is the one made by the redaction.
+
+Compressed, big endian and other unusual files are read with pydicom.
+Compressed multi-frame files are not decoded: their frames are decoded one at
+a time by [FrameReader][deidcm.dicom.multiframe.FrameReader].
+
+"""
+
+import struct
+from typing import Tuple
+
+import numpy as np
+import pydicom
+from pydicom import Dataset
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+from deidcm.dicom.pixel_cache import is_compressed_volume, read_dicom
+
+PIXEL_DATA_TAG = (0x7fe0, 0x0010)
+MMAP_PHOTOMETRIC_INTERPRETATIONS = ('MONOCHROME1', 'MONOCHROME2', 'RGB')
+UNDEFINED_LENGTH = 0xFFFFFFFF
+
+
+def get_pixel_dtype(ds: Dataset) -> np.dtype:
+    """Return the little endian numpy dtype of the pixels of a dataset"""
+    kind = 'i' if ds.PixelRepresentation == 1 else 'u'
+    return np.dtype(f'<{kind}{ds.BitsAllocated // 8}')
+
+
+def get_pixel_shape(ds: Dataset) -> tuple:
+    """Return the shape of the pixel array of a dataset, as given by `pixel_array`"""
+    frames = int(ds.get('NumberOfFrames', 1) or 1)
+    shape = (ds.Rows, ds.Columns)
+    if frames > 1:
+        shape = (frames,) + shape
+    if ds.SamplesPerPixel > 1:
+        shape = shape + (ds.SamplesPerPixel,)
+    return shape
+
+
+def is_mappable(ds: Dataset) -> bool:
+    """Check if the pixels of a dataset can be memory-mapped (native little endian pixels)"""
+    transfer_syntax = getattr(ds, 'file_meta', Dataset()).get('TransferSyntaxUID')
+    return (
+        transfer_syntax in (ExplicitVRLittleEndian, ImplicitVRLittleEndian)
+        and ds.get('BitsAllocated') in (8, 16, 32)
+        and ds.get('PhotometricInterpretation') in MMAP_PHOTOMETRIC_INTERPRETATIONS
+        and ds.get('PlanarConfiguration', 0) == 0
+        # pydicom corrects the sign of values stored on fewer bits than allocated
+        and not (ds.get('PixelRepresentation') == 1 and ds.BitsStored != ds.BitsAllocated)
+    )
+
+
+def read_pixel_data_header(fp, implicit_vr: bool) -> Tuple[int, int]:
+    """Read the header of the Pixel Data element at the current position of fp.
+
+    Returns:
+        tuple: The offset of the pixel values in the file and their length in bytes.
+    """
+    tag = struct.unpack('<HH', fp.read(4))
+    if tag != PIXEL_DATA_TAG:
+        raise ValueError(f'Expected Pixel Data element, found tag {tag}')
+    if implicit_vr:
+        length = struct.unpack('<L', fp.read(4))[0]
+    else:
+        # VR (2 bytes), reserved (2 bytes) and length (4 bytes) for OB and OW
+        length = struct.unpack('<2sHL', fp.read(8))[2]
+    return fp.tell(), length
+
+
+def read_dicom_mmap(path: str) -> Tuple[Dataset, np.ndarray]:
+    """Read the attributes of a DICOM file and memory-map its pixels.
+
+    The returned dataset does not contain the Pixel Data element: pixels must be
+    taken from the returned array. If the pixels cannot be memory-mapped, the file
+    is read with pydicom and the decoded `pixel_array` is returned, except for
+    compressed multi-frame files (see `read_dicom_pixels`).
+
+    Args:
+        path: The path of the DICOM file.
+
+    Returns:
+        tuple: The pydicom dataset and the read-only pixel array, or None.
+    """
+    with open(path, 'rb') as fp:
+        ds = pydicom.dcmread(fp, stop_before_pixels=True)
+        if is_mappable(ds):
+            # pydicom stops at the beginning of the Pixel Data element
+            try:
+                offset, length = read_pixel_data_header(
+                    fp, ds.file_meta.TransferSyntaxUID == ImplicitVRLittleEndian)
+            except (ValueError, struct.error):
+                length = None
+            dtype, shape = get_pixel_dtype(ds), get_pixel_shape(ds)
+            if length not in (None, UNDEFINED_LENGTH) and length >= np.prod(shape) * dtype.itemsize:
+                return ds, np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+    ds = pydicom.read_file(path)
+    if is_compressed_volume(ds):
+        return ds, None
+    pixels = ds.pixel_array
+    pixels.flags.writeable = False
+    return ds, pixels
+
+
+def read_dicom_pixels(path: str, use_mmap: bool = False) -> Tuple[Dataset, np.ndarray]:
+    """Read a DICOM file and its pixels, memory-mapped or through the pixel cache.
+
+    Args:
+        path: The path of the DICOM file.
+        use_mmap: Whether to memory-map the pixels (see `read_dicom_mmap`) or to read
+            the file through the cache of decoded files (see `deidcm.dicom.pixel_cache`).
+
+    Returns:
+        tuple: The pydicom dataset and the read-only pixel array. The pixels of
+            compressed multi-frame files are not decoded: they are None, and the
+            frames are decoded on demand by `FrameReader` (see `get_pixel_array`
+            to decode the whole volume).
+    """
+    if use_mmap:
+        return read_dicom_mmap(path)
+    ds = read_dicom(path)
+    if is_compressed_volume(ds):
+        return ds, None
+    return ds, ds.pixel_array
+
+
+def get_pixel_array(ds: Dataset, pixels: np.ndarray = None) -> np.ndarray:
+    """Return the pixels returned by `read_dicom_pixels`, decoding them if they were not"""
+    return ds.pixel_array if pixels is None else pixels
@@ -0,0 +1,127 @@
+"""
+
+This module contains lazy access to the frames of multi-frame DICOM files.
+
+Breast tomosynthesis (DBT) volumes contain dozens of frames carrying the
+same burned-in text. The OCR only runs on a few sampled frames and the boxes
+found on them are hidden on every frame (see
+[deidentify_volume][deidcm.dicom.deid_mammogram.deidentify_volume]).
+
+Frames are decoded one at a time by `FrameReader`, so that the whole volume
+never has to be decoded at once to run the OCR, nor to write the DICOM
+output (see [deidentify_frames][deidcm.dicom.deid_mammogram.deidentify_frames]):
+
+- memory-mapped or already decoded pixels are sliced.
+- native pixels are exposed as a view of the Pixel Data element.
+- compressed pixels are decoded frame by frame.
+
+"""
+
+import numpy as np
+from pydicom import Dataset
+from pydicom.encaps import encapsulate, generate_pixel_data_frame
+
+from deidcm.dicom.mmap_reader import get_pixel_dtype, get_pixel_shape, is_mappable
+
+MULTIFRAME_SAMPLE_FRAMES = 3
+
+# Attributes needed to decode a single frame of a dataset
+IMAGE_PIXEL_ATTRIBUTES = (
+    'Rows', 'Columns', 'BitsAllocated', 'BitsStored', 'HighBit', 'PixelRepresentation',
+    'SamplesPerPixel', 'PhotometricInterpretation', 'PlanarConfiguration'
+)
+
+
+def get_number_of_frames(ds: Dataset) -> int:
+    """Return the number of frames of a dataset (1 for single-frame images)"""
+    return int(ds.get('NumberOfFrames', 1) or 1)
+
+
+def get_array_number_of_frames(pixels: np.ndarray, samples_per_pixel: int = 1) -> int:
+    """Return the number of frames of a pixel array, shaped like `pixel_array`"""
+    frame_ndim = 2 if samples_per_pixel == 1 else 3
+    return pixels.shape[0] if pixels.ndim > frame_ndim else 1
+
+
+def set_number_of_frames(ds: Dataset, pixels: np.ndarray) -> None:
+    """Set the Number of Frames of a multi-frame dataset from its pixel array.
+
+    The recipe removes the number of frames, which is needed to decode the Pixel
+    Data of the deidentified dataset. Single-frame datasets are left unchanged.
+    """
+    number_of_frames = get_array_number_of_frames(pixels, ds.get('SamplesPerPixel', 1))
+    if number_of_frames > 1:
+        ds.NumberOfFrames = number_of_frames
+
+
+def get_sample_frame_indices(number_of_frames: int, sample_frames: int = MULTIFRAME_SAMPLE_FRAMES) -> list:
+    """Return the indices of frames evenly spread across a volume, first and last included"""
+    if sample_frames < 1:
+        raise ValueError(f"At least one frame must be sampled, got {sample_frames}")
+    return sorted({int(i) for i in np.linspace(0, number_of_frames - 1, sample_frames).round()})
+
+
+def decode_frame(ds: Dataset, frame: bytes) -> np.ndarray:
+    """Decode a single compressed frame of a dataset"""
+    frame_ds = Dataset()
+    frame_ds.file_meta = ds.file_meta
+    frame_ds.is_little_endian, frame_ds.is_implicit_VR = True, False
+    for keyword in IMAGE_PIXEL_ATTRIBUTES:
+        if keyword in ds:
+            setattr(frame_ds, keyword, ds.data_element(keyword).value)
+    frame_ds.NumberOfFrames = 1
+    frame_ds.PixelData = encapsulate([frame])
+    return frame_ds.pixel_array
+
+
+class FrameReader:
+    """Lazy sequence of the frames of a dataset"""
+
+    def __init__(self, ds: Dataset, pixels: np.ndarray = None) -> None:
+        """
+        Args:
+            ds: A pydicom dataset.
+            pixels: The pixel array of the dataset, if already available (e.g. memory-mapped).
+                If None, frames are decoded from the Pixel Data element when accessed.
+        """
+        self.ds = ds
+        self.pixels = pixels
+        self.number_of_frames = get_number_of_frames(ds)
+        self.frame_shape = get_pixel_shape(ds)[1:] if self.number_of_frames > 1 else get_pixel_shape(ds)
+        transfer_syntax = getattr(ds, 'file_meta', Dataset()).get('TransferSyntaxUID')
+        self.compressed = transfer_syntax is not None and transfer_syntax.is_compressed
+        # Native little endian pixels can be sliced in the Pixel Data element
+        self.native = is_mappable(ds)
+        self._frames = None
+
+    def __len__(self) -> int:
+        return self.number_of_frames
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if not -self.number_of_frames <= index < self.number_of_frames:
+            raise IndexError(f"Frame {index} out of range ({self.number_of_frames} frames)")
+        index %= self.number_of_frames
+        if self.pixels is None and self.compressed:
+            if self._frames is None:
+                self._frames = list(generate_pixel_data_frame(self.ds.PixelData, self.number_of_frames))
+            return decode_frame(self.ds, self._frames[index])
+        if self.pixels is None and self.native:
+            dtype = get_pixel_dtype(self.ds)
+            count = int(np.prod(self.frame_shape))
+            frame = np.frombuffer(self.ds.PixelData, dtype=dtype, count=count,
+                                  offset=index * count * dtype.itemsize)
+            return frame.reshape(self.frame_shape)
+        if self.pixels is None:
+            self.pixels = self.ds.pixel_array
+        return self.pixels[index] if self.number_of_frames > 1 else self.pixels
+
+    def __iter__(self):
+        for index in range(self.number_of_frames):
+            yield self[index]
+
+    @property
+    def dtype(self) -> np.dtype:
+        """The dtype of the decoded frames"""
+        if self.pixels is not None:
+            return self.pixels.dtype
+        return self[0].dtype
@@ -0,0 +1,181 @@
+"""
+
+This module contains a persistent cache of OCR results.
+
+Campaigns often process the same mammograms again after a change of the
+recipe or of the authorized words. The raw easyOCR results of an image only
+depend on its pixels, on the OCR model and on the OCR parameters, so they
+are stored in a SQLite database keyed by a hash of the pixel buffer and a
+fingerprint of the model and parameters. Authorized words are filtered after
+the cache, so changing them does not invalidate cached results.
+
+The database is bounded by a size limit: the least recently used results are
+evicted first. The total size is loaded when the database is opened and kept
+up to date by each process; it is only summed again from the database when
+it exceeds the limit, and results are then evicted by batches, down to
+`EVICTION_TARGET` of the limit.
+
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import easyocr
+import numpy as np
+from easyocr import Reader
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+SQLITE_TIMEOUT = 30
+# Fraction of the size limit left after an eviction
+EVICTION_TARGET = 0.9
+
+
+def get_pixels_hash(pixels: np.ndarray) -> str:
+    """Compute a hash of a pixel array, including its shape and dtype"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f'{pixels.shape}{pixels.dtype.str}'.encode())
+    digest.update(np.ascontiguousarray(pixels).data)
+    return digest.hexdigest()
+
+
+def get_ocr_fingerprint(reader: Reader, **parameters) -> str:
+    """Compute a fingerprint of an OCR model and of the parameters used to run it.
+
+    Args:
+        reader: The easyOCR reader.
+        **parameters: Any parameter changing the raw OCR results (scale, regions...).
+            Values must be serializable to JSON.
+
+    Returns:
+        A string identifying the OCR configuration.
+    """
+    description = {
+        'easyocr': easyocr.__version__,
+        'reader': type(reader).__name__,
+        'model_lang': getattr(reader, 'model_lang', None),
+        'character': getattr(reader, 'character', None),
+        'parameters': parameters
+    }
+    encoded = json.dumps(description, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=20).hexdigest()
+
+
+def serialize_ocr_data(ocr_data: list) -> str:
+    """Convert raw easyOCR results (which may contain numpy numbers) to JSON"""
+    return json.dumps([
+        [[[int(x), int(y)] for x, y in box], str(text), float(confidence)]
+        for box, text, confidence in ocr_data
+    ])
+
+
+def deserialize_ocr_data(data: str) -> list:
+    """Convert JSON OCR results back to easyOCR-like (box, text, confidence) tuples"""
+    return [(box, text, confidence) for box, text, confidence in json.loads(data)]
+
+
+class OcrCache:
+    """SQLite cache of raw OCR results, bounded by a size in bytes.
+
+    The cache can be shared by several threads and several processes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_CACHE_SIZE) -> None:
+        """
+        Args:
+            path: The path of the SQLite database. It is created if it does not exist.
+            max_bytes: The maximum total size of the stored results.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS ocr_results ('
+                'key TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                'size INTEGER NOT NULL, last_access INTEGER NOT NULL)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS ocr_results_last_access ON ocr_results (last_access)')
+        self.total_bytes = self._get_stored_size()
+
+    @staticmethod
+    def get_key(pixels: np.ndarray, fingerprint: str) -> str:
+        """Build the cache key of an image read with a given OCR configuration"""
+        return f'{get_pixels_hash(pixels)}-{fingerprint}'
+
+    def get(self, key: str) -> list:
+        """Get the cached OCR results of a key.
+
+        Returns:
+            list: The raw OCR results, or None if the key is not cached.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT data FROM ocr_results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute(
+                'UPDATE ocr_results SET last_access = ? WHERE key = ?', (time.time_ns(), key))
+        return deserialize_ocr_data(row[0])
+
+    def put(self, key: str, ocr_data: list) -> None:
+        """Store raw OCR results and evict the least recently used results if needed"""
+        data = serialize_ocr_data(ocr_data)
+        with self._lock, self._connection:
+            replaced = self._connection.execute(
+                'SELECT size FROM ocr_results WHERE key = ?', (key,)).fetchone()
+            self._connection.execute(
+                'INSERT OR REPLACE INTO ocr_results VALUES (?, ?, ?, ?)',
+                (key, data, len(data), time.time_ns()))
+            self.total_bytes += len(data) - (replaced[0] if replaced else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _get_stored_size(self) -> int:
+        return self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM ocr_results').fetchone()[0]
+
+    def _evict(self) -> None:
+        # Other processes may have written or evicted results since the total was loaded
+        self.total_bytes = self._get_stored_size()
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * EVICTION_TARGET)
+        evicted = []
+        for key, size in self._connection.execute(
+                'SELECT key, size FROM ocr_results ORDER BY last_access'):
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self._connection.executemany('DELETE FROM ocr_results WHERE key = ?', evicted)
+
+    def get_size(self) -> int:
+        """Return the total size of the stored results, in bytes"""
+        with self._lock:
+            return self._get_stored_size()
+
+    def clear(self) -> None:
+        """Delete every cached result"""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM ocr_results')
+            self.total_bytes = 0
+
+    def close(self) -> None:
+        """Close the connection to the database"""
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM ocr_results').fetchone()[0]
@@ -0,0 +1,125 @@
+"""
+
+This module contains the detection-only OCR mode.
+
+A detected word is hidden unless it is an authorized word. When no authorized
+word can fit in a text box, reading its content cannot change the outcome: the
+box will be hidden anyway. The detection-only mode therefore only runs the
+text detector of easyOCR, and runs the recognizer on the few boxes whose
+shape is compatible with the length of an authorized word.
+
+"""
+
+from typing import Iterable
+
+import cv2
+import numpy as np
+from easyocr import Reader
+
+# Text returned for boxes that were not recognized. It is longer than one
+# character so that the box is not ignored by the redaction.
+UNRECOGNIZED_TEXT = '??'
+UNRECOGNIZED_CONFIDENCE = 1.0
+
+# Range of the width/height ratio of a single character (narrow "I" to wide "W"),
+# with a margin for the padding added around boxes by the detector.
+MIN_CHAR_ASPECT_RATIO = 0.3
+MAX_CHAR_ASPECT_RATIO = 1.5
+
+
+def horizontal_to_box(horizontal: list) -> list:
+    """Convert an easyOCR horizontal box [x_min, x_max, y_min, y_max] to four points"""
+    x_min, x_max, y_min, y_max = (int(value) for value in horizontal)
+    return [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+
+
+def get_box_size(box: list) -> tuple:
+    """Return the (width, height) of the bounding rectangle of a four-point box"""
+    xs = [point[0] for point in box]
+    ys = [point[1] for point in box]
+    return max(xs) - min(xs), max(ys) - min(ys)
+
+
+def could_contain_word(box: list, word_lengths: Iterable[int],
+                       min_char_aspect_ratio: float = MIN_CHAR_ASPECT_RATIO,
+                       max_char_aspect_ratio: float = MAX_CHAR_ASPECT_RATIO) -> bool:
+    """Check if a text box has the shape of a word of one of the given lengths.
+
+    Args:
+        box: A four-point easyOCR box.
+        word_lengths: The number of characters of the words to look for.
+        min_char_aspect_ratio: The width/height ratio of the narrowest character.
+        max_char_aspect_ratio: The width/height ratio of the widest character.
+
+    Returns:
+        bool: True if the box could contain one of the words.
+    """
+    width, height = get_box_size(box)
+    if height <= 0:
+        return False
+    nb_chars_min = width / (height * max_char_aspect_ratio)
+    nb_chars_max = width / (height * min_char_aspect_ratio)
+    return any(nb_chars_min <= length <= nb_chars_max for length in word_lengths)
+
+
+def detect_text(pixels: np.ndarray, reader: Reader, **detect_options) -> tuple:
+    """Run the text detector of easyOCR without the recognizer.
+
+    Args:
+        pixels: An array representing an image.
+        reader: The easyOCR reader.
+        detect_options: Keyword arguments given to `Reader.detect`.
+
+    Returns:
+        tuple: The horizontal boxes ([x_min, x_max, y_min, y_max]) and the free
+            boxes (four points) detected on the image.
+    """
+    horizontal_list, free_list = reader.detect(pixels, **detect_options)
+    return horizontal_list[0], free_list[0]
+
+
+def read_text_detection_only(pixels: np.ndarray, reader: Reader, authorized_words: list,
+                             min_char_aspect_ratio: float = MIN_CHAR_ASPECT_RATIO,
+                             max_char_aspect_ratio: float = MAX_CHAR_ASPECT_RATIO) -> list:
+    """Detect text and only recognize the boxes that could contain an authorized word.
+
+    Boxes that are not recognized are returned with the text `UNRECOGNIZED_TEXT` and
+    the confidence `UNRECOGNIZED_CONFIDENCE`, so they are always hidden. They come
+    first in the result. If `authorized_words` is empty, the recognizer is never run.
+
+    Args:
+        pixels: An array representing an image.
+        reader: The easyOCR reader.
+        authorized_words: The words kept on the image when they are recognized.
+        min_char_aspect_ratio: The width/height ratio of the narrowest character.
+        max_char_aspect_ratio: The width/height ratio of the widest character.
+
+    Returns:
+        list: easyOCR-like results (box, text, confidence).
+    """
+    horizontal_list, free_list = detect_text(pixels, reader)
+    word_lengths = {len(word) for word in authorized_words if word}
+
+    def is_candidate(box):
+        return could_contain_word(box, word_lengths, min_char_aspect_ratio, max_char_aspect_ratio)
+
+    ocr_data = []
+    candidates_horizontal, candidates_free = [], []
+    for horizontal in horizontal_list:
+        box = horizontal_to_box(horizontal)
+        if is_candidate(box):
+            candidates_horizontal.append(horizontal)
+        else:
+            ocr_data.append((box, UNRECOGNIZED_TEXT, UNRECOGNIZED_CONFIDENCE))
+    for box in free_list:
+        box = [[int(x), int(y)] for x, y in box]
+        if is_candidate(box):
+            candidates_free.append(box)
+        else:
+            ocr_data.append((box, UNRECOGNIZED_TEXT, UNRECOGNIZED_CONFIDENCE))
+
+    if candidates_horizontal or candidates_free:
+        grey = pixels if pixels.ndim == 2 else cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+        ocr_data.extend(reader.recognize(grey, horizontal_list=candidates_horizontal,
+                                         free_list=candidates_free))
+    return ocr_data
@@ -0,0 +1,132 @@
+"""
+
+This module manages the easyOCR readers used for image deidentification.
+
+Building an easyOCR `Reader` loads the CRAFT detector and the recognizer
+weights from disk, which takes far longer than reading a single mammogram.
+Readers are therefore built once per process, kept in a bounded cache keyed
+by their languages and model options, and shared by every call to
+[get_text_areas][deidcm.dicom.deid_mammogram.get_text_areas].
+
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from easyocr import Reader
+
+DEFAULT_LANGUAGES = ('fr',)
+MAX_CACHED_READERS = 4
+
+_readers = OrderedDict()
+_readers_lock = threading.Lock()
+# Locks of the readers being built, by key
+_build_locks = {}
+_max_cached_readers = MAX_CACHED_READERS
+
+
+def get_reader_key(languages: list = DEFAULT_LANGUAGES, gpu: bool = False, **options) -> tuple:
+    """Build the cache key identifying a reader.
+
+    Args:
+        languages: A list of languages supported by the reader. The order is ignored.
+        gpu: Whether the reader runs on GPU or not.
+        **options: Any other keyword argument accepted by `easyocr.Reader`.
+
+    Returns:
+        A hashable tuple identifying the reader configuration.
+    """
+    return (tuple(sorted(languages)), gpu, tuple(sorted(options.items())))
+
+
+def get_reader(languages: list = DEFAULT_LANGUAGES, gpu: bool = False, **options) -> Reader:
+    """Get a cached easyOCR reader, building it on first use.
+
+    This function is thread-safe: concurrent callers asking for the same
+    configuration always receive the same reader and the model weights are
+    loaded only once. Readers are built outside of the cache lock, so that
+    loading (or downloading) a model does not block the callers asking for
+    other configurations. When the cache is full, the least recently used
+    reader is dropped.
+
+    Args:
+        languages: A list of languages supported by the reader.
+        gpu: Whether the reader runs on GPU or not.
+        **options: Any other keyword argument accepted by `easyocr.Reader`
+            (e.g. `model_storage_directory`, `download_enabled`).
+
+    Returns:
+        An easyOCR reader.
+    """
+    key = get_reader_key(languages, gpu, **options)
+    with _readers_lock:
+        if key in _readers:
+            _readers.move_to_end(key)
+            return _readers[key]
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    with build_lock:
+        # Another caller may have built the reader while this one was waiting
+        with _readers_lock:
+            if key in _readers:
+                _readers.move_to_end(key)
+                return _readers[key]
+        try:
+            options.setdefault('verbose', False)
+            reader = Reader(list(languages), gpu=gpu, **options)
+            with _readers_lock:
+                _readers[key] = reader
+                while len(_readers) > _max_cached_readers:
+                    _readers.popitem(last=False)
+        finally:
+            with _readers_lock:
+                _build_locks.pop(key, None)
+        return reader
+
+
+def warm_up_reader(languages: list = DEFAULT_LANGUAGES, gpu: bool = False, **options) -> Reader:
+    """Build a reader and run it once on a blank image.
+
+    The first inference of a torch model is noticeably slower than the
+    following ones. Call this function before processing a batch of images
+    (e.g. at worker start-up) so that no image pays for the initialization.
+
+    Args:
+        languages: A list of languages supported by the reader.
+        gpu: Whether the reader runs on GPU or not.
+        **options: Any other keyword argument accepted by `easyocr.Reader`.
+
+    Returns:
+        The warmed-up easyOCR reader.
+    """
+    reader = get_reader(languages, gpu, **options)
+    reader.readtext(np.zeros((64, 64), dtype=np.uint8))
+    return reader
+
+
+def set_max_cached_readers(size: int) -> None:
+    """Change the maximum number of readers kept in the cache.
+
+    Args:
+        size: The new maximum number of readers. Must be strictly positive.
+    """
+    global _max_cached_readers
+    if size < 1:
+        raise ValueError(f"Reader cache size must be positive, got {size}")
+    with _readers_lock:
+        _max_cached_readers = size
+        while len(_readers) > _max_cached_readers:
+            _readers.popitem(last=False)
+
+
+def clear_reader_cache() -> None:
+    """Drop every cached reader and free the associated models."""
+    with _readers_lock:
+        _readers.clear()
+
+
+def get_cached_reader_count() -> int:
+    """Return the number of readers currently cached."""
+    with _readers_lock:
+        return len(_readers)
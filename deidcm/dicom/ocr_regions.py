@@ -0,0 +1,371 @@
+"""
+
+This module contains functions used to run the OCR on parts of an image
+instead of the whole full-resolution image.
+
+Boxes returned by easyOCR are lists of four [x, y] points. The functions
+below move these boxes between the coordinates of a sub-image (downscaled
+copy, crop...) and the coordinates of the original image, so that the
+result can be given to [hide_text][deidcm.dicom.deid_mammogram.hide_text]
+as if the OCR had been run on the original image.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Union
+
+import cv2
+import numpy as np
+from easyocr import Reader
+
+from deidcm.dicom.utils import log
+
+CASCADE_MIN_CONFIDENCE = 0.5
+CASCADE_MIN_TEXT_HEIGHT = 8
+CASCADE_REGION_PADDING = 20
+
+ROI_EDGE_BAND_RATIO = 0.15
+ROI_EDGE_BAND_OVERLAP = 64
+ROI_BACKGROUND_THRESHOLD = 20
+ROI_BACKGROUND_DOWNSCALE = 8
+ROI_BACKGROUND_MAX_COVERAGE = 0.9
+ROI_MIN_REGION_SIZE = 32
+ROI_WORKERS = 4
+
+TILE_SIZE = 1024
+TILE_OVERLAP = 128
+
+
+def get_bounding_box(box: list) -> tuple:
+    """Return the (x1, y1, x2, y2) bounding rectangle of an easyOCR box"""
+    xs = [point[0] for point in box]
+    ys = [point[1] for point in box]
+    return (int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys)))
+
+
+def scale_ocr_data(ocr_data: list, factor: float) -> list:
+    """Multiply the coordinates of every box by `factor`"""
+    return [
+        ([[int(round(x * factor)), int(round(y * factor))] for x, y in box], text, confidence)
+        for box, text, confidence in ocr_data
+    ]
+
+
+def translate_ocr_data(ocr_data: list, dx: int, dy: int) -> list:
+    """Move every box by (dx, dy)"""
+    return [
+        ([[int(x) + dx, int(y) + dy] for x, y in box], text, confidence)
+        for box, text, confidence in ocr_data
+    ]
+
+
+def read_text_cascade(pixels: np.ndarray, reader: Reader, scale: float = 0.5,
+                      min_confidence: float = CASCADE_MIN_CONFIDENCE,
+                      min_text_height: int = CASCADE_MIN_TEXT_HEIGHT,
+                      padding: int = CASCADE_REGION_PADDING,
+                      full_resolution_fallback: bool = True) -> list:
+    """Run the OCR on a downscaled copy of the image, then refine at full resolution.
+
+    Burned-in annotations on mammograms are large enough to be detected on a
+    downscaled image. Boxes found on the downscaled copy are mapped back to
+    full-resolution coordinates. A box is read again on a full-resolution crop
+    when its confidence is lower than `min_confidence` or when its text is too
+    small on the downscaled copy to be reliably read (`min_text_height`).
+
+    Recall safeguards:
+
+    - a box that cannot be confirmed at full resolution is kept as it is, so
+      it will still be hidden.
+    - if nothing is found on the downscaled copy, the whole image is read at full
+      resolution unless `full_resolution_fallback` is False.
+
+    Args:
+        pixels: An array representing an image.
+        reader: The easyOCR reader.
+        scale: The factor applied to each side of the image for the first pass (0 < scale <= 1).
+        min_confidence: Boxes with a lower confidence are read again at full resolution.
+        min_text_height: Boxes smaller than this height (in downscaled pixels) are read
+            again at full resolution.
+        padding: The number of full-resolution pixels added around a box before reading it again.
+        full_resolution_fallback: Whether to read the full-resolution image when the
+            first pass finds nothing.
+
+    Returns:
+        list: The raw easyOCR results in full-resolution coordinates.
+    """
+    if not 0 < scale <= 1:
+        raise ValueError(f"scale must be in ]0, 1], got {scale}")
+    if scale == 1:
+        return reader.readtext(pixels)
+
+    small = cv2.resize(pixels, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    coarse_data = reader.readtext(small)
+    if not coarse_data:
+        return reader.readtext(pixels) if full_resolution_fallback else []
+
+    ocr_data = []
+    for found in scale_ocr_data(coarse_data, 1 / scale):
+        x1, y1, x2, y2 = get_bounding_box(found[0])
+        if found[2] >= min_confidence and (y2 - y1) * scale >= min_text_height:
+            ocr_data.append(found)
+            continue
+        x1, y1 = max(x1 - padding, 0), max(y1 - padding, 0)
+        x2 = min(x2 + padding, pixels.shape[1])
+        y2 = min(y2 + padding, pixels.shape[0])
+        refined_data = reader.readtext(np.ascontiguousarray(pixels[y1:y2, x1:x2]))
+        ocr_data.extend(translate_ocr_data(refined_data, x1, y1) or [found])
+    return ocr_data
+
+
+def get_roi_regions(pixels: np.ndarray, roi: Union[str, list, dict], manufacturer: str = None) -> list:
+    """Compute the regions of an image that have to be submitted to the OCR.
+
+    Burned-in text on mammograms almost always sits in the corners and along the
+    edges of the image, outside of the breast. Restricting the OCR to these regions
+    greatly reduces the number of pixels to read.
+
+    Args:
+        pixels: An array representing an image (the 8-bit image submitted to the OCR).
+        roi: The region of interest policy:
+
+            - `"edges"`: four overlapping bands along the borders of the image,
+              covering 51% of it (see `get_edge_bands`).
+            - `"auto"`: the background around the breast, detected by thresholding.
+            - a list of (x1, y1, x2, y2) boxes expressed as fractions of the image
+              width and height.
+            - a dictionary {Manufacturer: list of fractional boxes}. Images of
+              unknown manufacturers are fully read.
+        manufacturer: The value of the Manufacturer attribute of the DICOM file. Only
+            used with per-manufacturer templates.
+
+    Returns:
+        list: A list of (x1, y1, x2, y2) boxes in pixel coordinates.
+    """
+    if roi == 'edges':
+        return get_edge_bands(pixels.shape)
+    if roi == 'auto':
+        return get_background_regions(pixels)
+    if isinstance(roi, dict):
+        if manufacturer not in roi:
+            log(f'No ROI template for manufacturer {manufacturer}, reading the whole image')
+            return [(0, 0, pixels.shape[1], pixels.shape[0])]
+        roi = roi[manufacturer]
+    if isinstance(roi, (list, tuple)):
+        return get_template_regions(pixels.shape, roi)
+    raise ValueError(f"Unknown ROI policy: {roi}")
+
+
+def get_edge_bands(shape: tuple, ratio: float = ROI_EDGE_BAND_RATIO,
+                   overlap: int = ROI_EDGE_BAND_OVERLAP) -> list:
+    """Return the top, bottom, left and right bands of an image.
+
+    The top and bottom bands span the whole width. The left and right bands extend
+    `overlap` pixels into them, so that a word sitting on the border between two bands
+    is read whole by one of them. The bands cover 1 - (1 - 2 * ratio) ** 2 of the image:
+    51% with the default ratio of 0.15.
+
+    Args:
+        shape: The shape of the image.
+        ratio: The thickness of each band, as a fraction of the height (top and bottom
+            bands) or of the width (left and right bands) of the image.
+        overlap: The number of pixels shared by two neighbouring bands. It should be
+            larger than the height of the burned-in text.
+
+    Returns:
+        list: A list of (x1, y1, x2, y2) boxes in pixel coordinates.
+    """
+    height, width = shape[:2]
+    band_height, band_width = int(height * ratio), int(width * ratio)
+    side_top = max(0, band_height - overlap)
+    side_bottom = min(height, height - band_height + overlap)
+    bands = [
+        (0, 0, width, band_height),
+        (0, height - band_height, width, height),
+        (0, side_top, band_width, side_bottom),
+        (width - band_width, side_top, width, side_bottom)
+    ]
+    return [band for band in bands if band[2] > band[0] and band[3] > band[1]]
+
+
+def get_template_regions(shape: tuple, template: list) -> list:
+    """Convert boxes expressed as fractions of the image size to pixel coordinates"""
+    height, width = shape[:2]
+    return [
+        (int(x1 * width), int(y1 * height), int(np.ceil(x2 * width)), int(np.ceil(y2 * height)))
+        for x1, y1, x2, y2 in template
+    ]
+
+
+def get_background_regions(pixels: np.ndarray, threshold: int = ROI_BACKGROUND_THRESHOLD,
+                           downscale: int = ROI_BACKGROUND_DOWNSCALE,
+                           min_size: int = ROI_MIN_REGION_SIZE,
+                           max_coverage: float = ROI_BACKGROUND_MAX_COVERAGE) -> list:
+    """Detect the background of a mammogram and return the regions surrounding the breast.
+
+    The image is thresholded on a downscaled copy. The largest bright connected
+    component is considered to be the breast, and the parts of the image located
+    above, below, left and right of its bounding box are returned. Text inside the
+    bounding box of the breast is not read.
+
+    The whole image is returned when no breast can be found, when the bounding box
+    of the bright component covers more than `max_coverage` of the image (white
+    background of MONOCHROME1 images, bright noise, exposure of the whole detector),
+    or when no region is left around it: reading nothing would leave the burned-in
+    text of the image visible.
+    """
+    height, width = pixels.shape[:2]
+    whole_image = [(0, 0, width, height)]
+    gray = pixels if pixels.ndim == 2 else cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    small = gray[::downscale, ::downscale]
+    foreground = (small >= threshold).astype(np.uint8)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(foreground)
+    if count < 2:
+        return whole_image
+
+    # Label 0 is the background, the breast is the largest remaining component
+    breast = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    left = stats[breast, cv2.CC_STAT_LEFT] * downscale
+    top = stats[breast, cv2.CC_STAT_TOP] * downscale
+    right = min(left + stats[breast, cv2.CC_STAT_WIDTH] * downscale, width)
+    bottom = min(top + stats[breast, cv2.CC_STAT_HEIGHT] * downscale, height)
+    if (right - left) * (bottom - top) > max_coverage * width * height:
+        return whole_image
+
+    regions = [
+        (0, 0, width, top),
+        (0, bottom, width, height),
+        (0, top, left, bottom),
+        (right, top, width, bottom)
+    ]
+    regions = [
+        (int(x1), int(y1), int(x2), int(y2)) for x1, y1, x2, y2 in regions
+        if x2 - x1 >= min_size and y2 - y1 >= min_size
+    ]
+    return regions or whole_image
+
+
+def read_text_in_regions(pixels: np.ndarray, regions: list, read: Callable[[np.ndarray], list],
+                         workers: int = ROI_WORKERS) -> list:
+    """Run the OCR on each region of an image in parallel.
+
+    Args:
+        pixels: An array representing an image.
+        regions: A list of (x1, y1, x2, y2) boxes in pixel coordinates.
+        read: The function running the OCR on an image (e.g. `reader.readtext`).
+        workers: The number of regions read at the same time.
+
+    Returns:
+        list: The raw easyOCR results in the coordinates of the whole image.
+    """
+    def read_region(region):
+        x1, y1, x2, y2 = region
+        crop = np.ascontiguousarray(pixels[y1:y2, x1:x2])
+        return translate_ocr_data(read(crop), x1, y1)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(read_region, regions)
+    return [found for region_data in results for found in region_data]
+
+
+def get_tiles(region: tuple, tile_size: int = TILE_SIZE, overlap: int = TILE_OVERLAP) -> list:
+    """Split a region into overlapping square tiles.
+
+    Tiles are `tile_size` pixels wide (smaller if the region is smaller) and two
+    neighbouring tiles share `overlap` pixels. The last row and column of tiles are
+    aligned on the bottom and right borders of the region.
+
+    Args:
+        region: A (x1, y1, x2, y2) box in pixel coordinates.
+        tile_size: The side of the tiles, in pixels.
+        overlap: The number of pixels shared by two neighbouring tiles. It should be
+            larger than the width of the longest word, so that every word fits in a tile.
+
+    Returns:
+        list: A list of (x1, y1, x2, y2) tiles in pixel coordinates.
+    """
+    if not 0 <= overlap < tile_size:
+        raise ValueError(f"overlap must be in [0, {tile_size}[, got {overlap}")
+
+    def get_starts(start, end):
+        if end - start <= tile_size:
+            return [start]
+        starts = list(range(start, end - tile_size, tile_size - overlap))
+        return starts + [end - tile_size]
+
+    x1, y1, x2, y2 = region
+    return [
+        (x, y, min(x + tile_size, x2), min(y + tile_size, y2))
+        for y in get_starts(y1, y2)
+        for x in get_starts(x1, x2)
+    ]
+
+
+def merge_tiled_ocr_data(tiled_ocr_data: list) -> list:
+    """Merge the boxes of words read twice in the overlap of neighbouring tiles.
+
+    Boxes found in different tiles that intersect are replaced by their bounding
+    rectangle, with the longest text and the highest confidence. Boxes found in the
+    same tile are never merged.
+
+    Args:
+        tiled_ocr_data: A list of (tile index, easyOCR result) pairs, in image coordinates.
+
+    Returns:
+        list: The merged easyOCR results.
+    """
+    clusters = []
+    for tile, (box, text, confidence) in tiled_ocr_data:
+        x1, y1, x2, y2 = get_bounding_box(box)
+        for cluster in clusters:
+            cx1, cy1, cx2, cy2 = cluster['box']
+            if tile not in cluster['tiles'] and x1 <= cx2 and cx1 <= x2 and y1 <= cy2 and cy1 <= y2:
+                cluster['box'] = (min(x1, cx1), min(y1, cy1), max(x2, cx2), max(y2, cy2))
+                cluster['tiles'].add(tile)
+                if len(text) > len(cluster['text']):
+                    cluster['text'] = text
+                cluster['confidence'] = max(confidence, cluster['confidence'])
+                break
+        else:
+            clusters.append({'box': (x1, y1, x2, y2), 'tiles': {tile}, 'text': text,
+                             'confidence': confidence})
+    ocr_data = []
+    for cluster in clusters:
+        x1, y1, x2, y2 = cluster['box']
+        box = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+        ocr_data.append((box, cluster['text'], cluster['confidence']))
+    return ocr_data
+
+
+def read_text_tiled(pixels: np.ndarray, read: Callable[[np.ndarray], list],
+                    tile_size: int = TILE_SIZE, overlap: int = TILE_OVERLAP,
+                    regions: list = None, workers: int = ROI_WORKERS) -> list:
+    """Run the OCR on overlapping tiles of an image in parallel.
+
+    Only `workers` tiles are copied and read at the same time, so the memory used by
+    the OCR depends on the tile size instead of the image size.
+
+    Args:
+        pixels: An array representing an image.
+        read: The function running the OCR on an image (e.g. `reader.readtext`).
+        tile_size: The side of the tiles, in pixels.
+        overlap: The number of pixels shared by two neighbouring tiles.
+        regions: If given, only these (x1, y1, x2, y2) regions are split into tiles and read.
+        workers: The number of tiles read at the same time.
+
+    Returns:
+        list: The raw easyOCR results in the coordinates of the whole image, with the words
+            found in several tiles merged.
+    """
+    if regions is None:
+        regions = [(0, 0, pixels.shape[1], pixels.shape[0])]
+    tiles = [tile for region in regions for tile in get_tiles(region, tile_size, overlap)]
+
+    def read_tile(tile):
+        x1, y1, x2, y2 = tile
+        crop = np.ascontiguousarray(pixels[y1:y2, x1:x2])
+        return translate_ocr_data(read(crop), x1, y1)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(read_tile, tiles)
+        tiled_ocr_data = [(i, found) for i, tile_data in enumerate(results) for found in tile_data]
+    return merge_tiled_ocr_data(tiled_ocr_data)
@@ -0,0 +1,133 @@
+"""
+
+This module contains a streaming pipeline of threaded stages.
+
+Deidentifying a file consists of three steps using different resources:
+reading and decoding the file (disk), running the OCR and hiding text (CPU),
+encoding and writing the outputs (disk). The pipeline runs each step in its
+own pool of threads, so that a file can be read while another one is being
+deidentified and a third one written. Stages are connected by bounded
+queues: a fast stage blocks when the next one lags behind, so the number of
+files held in memory never exceeds the queue sizes plus the number of
+workers.
+
+Each stage measures the time spent by its workers, so that the slowest stage
+(the bottleneck) can be identified from the report returned by `run_pipeline`.
+
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable
+
+DEFAULT_QUEUE_SIZE = 4
+
+# Marks the end of the items in a queue
+_STOP = object()
+
+
+class Stage:
+    """A step of the pipeline, run by a pool of threads"""
+
+    def __init__(self, name: str, function: Callable, workers: int = 1) -> None:
+        """
+        Args:
+            name: The name of the stage, used in the report.
+            function: The function applied on each item. Its result is given to the next stage.
+            workers: The number of threads running the stage.
+        """
+        if workers < 1:
+            raise ValueError(f"The number of workers of stage {name} must be positive, got {workers}")
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def run(self, inbox: queue.Queue, outbox: queue.Queue, errors: list) -> None:
+        """Apply the stage function on the items of inbox until the stop marker is received"""
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                return
+            # After an error, items are only drained so that upstream stages never block
+            if errors:
+                continue
+            start = time.perf_counter()
+            try:
+                result = self.function(item)
+            except Exception as exc:
+                errors.append(exc)
+                continue
+            with self._lock:
+                self.items += 1
+                self.busy_seconds += time.perf_counter() - start
+            if outbox is not None:
+                outbox.put(result)
+
+    def get_report(self) -> dict:
+        """Return the statistics of the stage.
+
+        `capacity` is the number of items per second the stage can process with all its
+        workers busy. The stage with the lowest capacity is the bottleneck.
+        """
+        capacity = self.items * self.workers / self.busy_seconds if self.busy_seconds else None
+        return {
+            'workers': self.workers,
+            'items': self.items,
+            'busy_seconds': self.busy_seconds,
+            'capacity': capacity
+        }
+
+
+def run_pipeline(items: Iterable, stages: list, queue_size: int = DEFAULT_QUEUE_SIZE) -> dict:
+    """Stream items through a sequence of threaded stages.
+
+    Args:
+        items: The inputs of the first stage.
+        stages: The list of stages. The results of the last stage are discarded.
+        queue_size: The maximum number of items waiting between two stages.
+
+    Returns:
+        dict: A report with the statistics of each stage, the total duration and the
+            name of the bottleneck stage.
+
+    Raises:
+        Exception: The first exception raised by a stage function, once all threads are stopped.
+    """
+    start = time.perf_counter()
+    errors = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages))] + [None]
+    threads = []
+    for i, stage in enumerate(stages):
+        threads.append([
+            threading.Thread(target=stage.run, args=(queues[i], queues[i + 1], errors),
+                             name=f'{stage.name}-{n}', daemon=True)
+            for n in range(stage.workers)
+        ])
+        for thread in threads[-1]:
+            thread.start()
+
+    for item in items:
+        if errors:
+            break
+        queues[0].put(item)
+
+    # Stop the stages one after the other, so that every item reaches the end
+    for i, stage in enumerate(stages):
+        for _ in range(stage.workers):
+            queues[i].put(_STOP)
+        for thread in threads[i]:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    report = {'stages': {stage.name: stage.get_report() for stage in stages}}
+    report['wall_seconds'] = time.perf_counter() - start
+    measured = [stage for stage in stages if stage.busy_seconds]
+    report['bottleneck'] = min(measured, key=lambda stage: stage.get_report()['capacity']).name \
+        if measured else None
+    return report
@@ -0,0 +1,154 @@
+"""
+
+This module contains a cache of decoded DICOM files.
+
+Several stages of the image deidentification need the pixels of the same
+file (OCR, redaction, PNG and DICOM outputs). Reading and decompressing a
+mammogram is expensive, so decoded files can be kept in a LRU cache bounded
+by a memory budget. Files are identified by their real path, size and
+modification time: a file modified on disk is read again.
+
+Compressed multi-frame files (e.g. breast tomosynthesis volumes) are not
+decoded: their frames are decoded one at a time by
+[FrameReader][deidcm.dicom.multiframe.FrameReader].
+
+The deidentification functions read each file once and pass its pixels
+along, so the budget is 0 by default and nothing is cached. Set a budget
+(`get_pixel_cache().max_bytes`, or a `PixelCache` given to `read_dicom`) when
+the same files are read several times, e.g. when exporting the same
+directory to several formats in separate runs.
+
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pydicom
+from pydicom import Dataset
+
+DEFAULT_MEMORY_BUDGET = 0
+
+
+def is_compressed_volume(ds: Dataset) -> bool:
+    """Check if a dataset has several compressed frames, which can be decoded one at a time"""
+    transfer_syntax = getattr(ds, 'file_meta', Dataset()).get('TransferSyntaxUID')
+    return (
+        transfer_syntax is not None and transfer_syntax.is_compressed
+        and int(ds.get('NumberOfFrames', 1) or 1) > 1
+    )
+
+
+def get_decoded_size(ds: Dataset) -> int:
+    """Return the size in bytes of the decoded pixel array of a dataset, without decoding it"""
+    frames = int(ds.get('NumberOfFrames', 1) or 1)
+    samples_per_pixel = ds.get('SamplesPerPixel', 1)
+    bytes_per_value = (ds.get('BitsAllocated', 8) + 7) // 8
+    return ds.Rows * ds.Columns * frames * samples_per_pixel * bytes_per_value
+
+
+class PixelCache:
+    """LRU cache of decoded DICOM files bounded by a memory budget in bytes.
+
+    Cached pixel arrays are read-only: they are shared by every caller, so
+    they must be copied before being modified (which `hide_text` does by default).
+    Files that are not cached are neither decoded in advance nor made read-only.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MEMORY_BUDGET) -> None:
+        """
+        Args:
+            max_bytes: The memory budget of the cache, in bytes. Files larger than the
+                budget are never cached: with the default budget of 0, nothing is.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_file_key(path: str) -> tuple:
+        """Return the identity of a file: (real path, size, modification time)"""
+        stat = os.stat(path)
+        return (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+    def read(self, path: str) -> Dataset:
+        """Get the dataset of a DICOM file, with its pixel array already decoded.
+
+        Files that do not fit in the budget (all files with the default budget of 0)
+        are returned as read by pydicom: their pixels are decoded when accessed and
+        can be modified. Compressed multi-frame files are not decoded either (see
+        `is_compressed_volume`).
+
+        Args:
+            path: The path of the DICOM file.
+
+        Returns:
+            The pydicom dataset. The `pixel_array` of cached datasets is read-only.
+        """
+        key = self.get_file_key(path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        ds = pydicom.read_file(path)
+        nbytes = 0
+        decode = 'PixelData' in ds and not is_compressed_volume(ds)
+        if 'PixelData' in ds:
+            nbytes = len(ds.PixelData) + (get_decoded_size(ds) if decode else 0)
+        if nbytes > self.max_bytes:
+            return ds
+        if decode:
+            ds.pixel_array.flags.writeable = False
+
+        with self._lock:
+            if nbytes <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (ds, nbytes)
+                self.current_bytes += nbytes
+                self._evict()
+        return ds
+
+    def get_pixels(self, path: str) -> np.ndarray:
+        """Get the read-only decoded pixel array of a DICOM file"""
+        return self.read(path).pixel_array
+
+    def _evict(self) -> None:
+        while self.current_bytes > self.max_bytes:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.current_bytes -= nbytes
+
+    def clear(self) -> None:
+        """Drop every cached file"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_default_cache = PixelCache()
+
+
+def get_pixel_cache() -> PixelCache:
+    """Return the process-wide cache of decoded DICOM files"""
+    return _default_cache
+
+
+def read_dicom(path: str, cache: PixelCache = None) -> Dataset:
+    """Read a DICOM file through a cache of decoded files.
+
+    Args:
+        path: The path of the DICOM file.
+        cache: The cache to use. If None, the process-wide cache is used.
+
+    Returns:
+        The pydicom dataset, see `PixelCache.read`.
+    """
+    return (_default_cache if cache is None else cache).read(path)
@@ -0,0 +1,124 @@
+"""
+
+This module contains the PNG writer of deidentified images.
+
+PNG files are encoded with OpenCV, which releases the GIL while compressing,
+so that several images (or the frames of a volume) are encoded in parallel
+by `write_pngs`. The following options are accepted by all the functions
+writing PNG files (`png_options`):
+
+- `bit_depth`: 8 or 16. If None, 8-bit images are written as they are and
+  other images are written on 16 bits.
+- `compression`: the zlib compression level, from 0 (fastest, largest files)
+  to 9 (slowest, smallest files).
+- `strategy`: the zlib strategy (`default`, `filtered`, `huffman`, `rle` or
+  `fixed`). `rle` and `huffman` are much faster on the large black background
+  of mammograms.
+- `window`: if True, an 8-bit image with the windowing of the DICOM file
+  (see `deidcm.dicom.lut`) is written instead of the raw pixel values.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+PNG_COMPRESSION = 6
+PNG_STRATEGIES = {
+    'default': cv2.IMWRITE_PNG_STRATEGY_DEFAULT,
+    'filtered': cv2.IMWRITE_PNG_STRATEGY_FILTERED,
+    'huffman': cv2.IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY,
+    'rle': cv2.IMWRITE_PNG_STRATEGY_RLE,
+    'fixed': cv2.IMWRITE_PNG_STRATEGY_FIXED
+}
+PNG_OPTIONS = ('bit_depth', 'compression', 'strategy', 'window')
+
+
+def check_png_options(png_options: dict) -> dict:
+    """Return a copy of png_options, raising ValueError on unknown or invalid options"""
+    png_options = dict(png_options or {})
+    unknown = set(png_options) - set(PNG_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown PNG options {sorted(unknown)}, expected some of {list(PNG_OPTIONS)}")
+    if png_options.get('bit_depth') not in (None, 8, 16):
+        raise ValueError(f"PNG bit depth must be 8 or 16, got {png_options['bit_depth']}")
+    if not 0 <= png_options.get('compression', PNG_COMPRESSION) <= 9:
+        raise ValueError(f"PNG compression level must be between 0 and 9, got {png_options['compression']}")
+    if png_options.get('strategy', 'default') not in PNG_STRATEGIES:
+        raise ValueError(
+            f"Unknown PNG strategy {png_options['strategy']}, expected one of {list(PNG_STRATEGIES)}")
+    return png_options
+
+
+def to_png_depth(pixels: np.ndarray, bit_depth: int = None) -> np.ndarray:
+    """Convert pixels to the unsigned integer type of a PNG bit depth.
+
+    Values are clipped to the range of a 16-bit image. Images converted to 8 bits
+    are shifted right just enough for their maximum value to fit in 8 bits.
+
+    Args:
+        pixels: A pixels array representing an image.
+        bit_depth: 8 or 16. If None, uint8 images are kept and other images use 16 bits.
+
+    Returns:
+        A uint8 or uint16 array.
+    """
+    if bit_depth is None:
+        bit_depth = 8 if pixels.dtype == np.uint8 else 16
+    if pixels.dtype == np.uint8:
+        return pixels if bit_depth == 8 else pixels.astype(np.uint16) << 8
+    if pixels.dtype != np.uint16:
+        pixels = np.clip(pixels, 0, 65535).astype(np.uint16)
+    if bit_depth == 16:
+        return pixels
+    shift = max(int(pixels.max(initial=0)).bit_length() - 8, 0)
+    return (pixels >> shift).astype(np.uint8)
+
+
+def encode_png(pixels: np.ndarray, bit_depth: int = None, compression: int = PNG_COMPRESSION,
+               strategy: str = 'default') -> bytes:
+    """Encode an image (grayscale or RGB, channels last) as PNG.
+
+    Args:
+        pixels: A pixels array representing an image.
+        bit_depth: The bit depth of the PNG file (8 or 16), see `to_png_depth`.
+        compression: The zlib compression level (0 to 9).
+        strategy: The zlib strategy, one of `PNG_STRATEGIES`.
+
+    Returns:
+        bytes: The content of the PNG file.
+    """
+    pixels = to_png_depth(pixels, bit_depth)
+    if pixels.ndim == 3 and pixels.shape[2] in (3, 4):
+        # OpenCV expects BGR(A) channels
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR if pixels.shape[2] == 3 else cv2.COLOR_RGBA2BGRA)
+    params = [cv2.IMWRITE_PNG_COMPRESSION, compression, cv2.IMWRITE_PNG_STRATEGY, PNG_STRATEGIES[strategy]]
+    success, buffer = cv2.imencode('.png', np.ascontiguousarray(pixels), params)
+    if not success:
+        raise ValueError(f"Cannot encode pixels of shape {pixels.shape} as PNG")
+    return buffer.tobytes()
+
+
+def write_png(path: str, pixels: np.ndarray, bit_depth: int = None, compression: int = PNG_COMPRESSION,
+              strategy: str = 'default') -> None:
+    """Write an image as a PNG file, see `encode_png`"""
+    content = encode_png(pixels, bit_depth, compression, strategy)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def write_pngs(paths: list, images: list, workers: int = None, **png_options) -> None:
+    """Write several images as PNG files, encoded in parallel by a pool of threads.
+
+    Args:
+        paths: The path of each PNG file.
+        images: The pixels of each image.
+        workers: The number of threads. If None, one per CPU.
+        png_options: The options of `write_png` (`bit_depth`, `compression`, `strategy`).
+    """
+    if len(paths) != len(images):
+        raise ValueError(f"Got {len(paths)} paths for {len(images)} images")
+    with ThreadPoolExecutor(workers) as executor:
+        # list() raises the first exception of the threads
+        list(executor.map(lambda item: write_png(*item, **png_options), zip(paths, images)))
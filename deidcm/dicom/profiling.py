@@ -0,0 +1,230 @@
+"""
+
+This module contains the profiling hooks of the image deidentification path.
+
+The deidentification functions report the duration of their stages to the
+process-wide profiler (see `get_profiler`):
+
+- `decode`: decoding the pixels of the DICOM file.
+- `metadata`: deidentifying the attributes (`deidcm.dicom.deid_dataset`).
+- `lut`: building the 8-bit image read by the OCR (`get_PIL_image`).
+- `ocr`: reading and filtering the words of the image (`get_text_areas`),
+  which includes:
+    - `readtext`: the easyOCR reader.
+    - `authorized_words`: removing the authorized words.
+- `redaction`: hiding the words (`hide_text`).
+- `encode`: converting the pixels to DICOM bytes (`numpy2bytes`, lossless encoding).
+- `write`: writing the output files.
+
+By default the profiler is a `NullProfiler` whose hooks do nothing. A
+`Profiler` collects one record per file, with the duration of each stage,
+counters (e.g. the number of hidden boxes) and the size of the image:
+
+    profiler = Profiler(jsonl_path='timings.jsonl')
+    with profiling(profiler):
+        df2dicom(df, outdir, do_image_deidentification=True)
+    print(profiler.get_stats())
+
+Records are kept per thread, so that files deidentified in parallel by
+threads are not mixed. Stages run by helper threads for a single file (e.g.
+the regions and tiles read in parallel by `get_text_areas`) have no record of
+their own: the record of the file is captured with `current` before starting
+the threads, and given to `stage`. Files deidentified in worker processes are
+not profiled by the profiler of the main process.
+
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+_NULL_CONTEXT = nullcontext()
+
+
+class NullProfiler:
+    """Profiler whose hooks do nothing, used when profiling is disabled"""
+
+    enabled = False
+    current = None
+
+    def file(self, name: str):
+        return _NULL_CONTEXT
+
+    def stage(self, name: str, record: dict = None):
+        return _NULL_CONTEXT
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def set_image_size(self, rows: int, columns: int) -> None:
+        pass
+
+
+class Profiler:
+    """Profiler collecting the stage durations and counters of each deidentified file"""
+
+    enabled = True
+
+    def __init__(self, jsonl_path: str = None, on_record: Callable = None, sampler=None,
+                 keep_records: bool = True) -> None:
+        """
+        Args:
+            jsonl_path: If given, each record is appended to this file as a JSON line.
+            on_record: If given, a function called with each record when its file is done.
+            sampler: An optional sampling profiler, with `start()` and `stop()` methods
+                (e.g. `pyinstrument.Profiler()`), run around each file. Sampling
+                profilers do not support overlapping runs: files must be deidentified
+                one at a time, so a sampler cannot be used with the pipeline of `df2dicom`.
+            keep_records: Whether to keep the records in the `records` list.
+        """
+        self.jsonl_path = jsonl_path
+        self.on_record = on_record
+        self.sampler = sampler
+        self.keep_records = keep_records
+        self.records = []
+        self.files = 0
+        self.stage_seconds = {}
+        self.counters = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> dict:
+        """The record of the file being deidentified by the current thread, or None"""
+        return getattr(self._local, 'record', None)
+
+    @contextmanager
+    def file(self, name: str):
+        """Collect the stages run in this context in the record of a file.
+
+        Nested contexts (e.g. `deidentify_image_ndarray` called by `df2dicom`) add
+        their stages to the record of the outermost one.
+        """
+        if self.current is not None:
+            yield self.current
+            return
+        record = {'file': name, 'rows': None, 'columns': None, 'stages': {}, 'counters': {}}
+        self._local.record = record
+        if self.sampler is not None:
+            self.sampler.start()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['total_seconds'] = time.perf_counter() - start
+            if self.sampler is not None:
+                self.sampler.stop()
+            self._local.record = None
+            self._add_record(record)
+
+    @contextmanager
+    def stage(self, name: str, record: dict = None):
+        """Measure the duration of a stage, added to a record and to the totals.
+
+        Args:
+            name: The name of the stage.
+            record: The record of the file, if the stage runs in another thread than
+                the one deidentifying the file. If None, the record of the current thread.
+        """
+        if record is None:
+            record = self.current
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            # The record may be shared by several threads
+            with self._lock:
+                if record is not None:
+                    record['stages'][name] = record['stages'].get(name, 0.0) + seconds
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increment a counter of the current record and of the totals"""
+        record = self.current
+        with self._lock:
+            if record is not None:
+                record['counters'][name] = record['counters'].get(name, 0) + value
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_image_size(self, rows: int, columns: int) -> None:
+        """Store the size of the image of the current record"""
+        record = self.current
+        if record is not None:
+            record['rows'], record['columns'] = int(rows), int(columns)
+
+    def _add_record(self, record: dict) -> None:
+        with self._lock:
+            self.files += 1
+            if self.keep_records:
+                self.records.append(record)
+            if self.jsonl_path is not None:
+                with open(self.jsonl_path, 'a', encoding='utf8') as f:
+                    f.write(json.dumps(record) + '\n')
+        if self.on_record is not None:
+            self.on_record(record)
+
+    def get_stats(self) -> dict:
+        """Return the number of files, the total duration of each stage and the counters"""
+        with self._lock:
+            return {
+                'files': self.files,
+                'stages': dict(self.stage_seconds),
+                'counters': dict(self.counters)
+            }
+
+    def write_jsonl(self, path: str) -> None:
+        """Write the kept records in a JSON lines file"""
+        with self._lock:
+            records = list(self.records)
+        with open(path, 'w', encoding='utf8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+    def clear(self) -> None:
+        """Drop the records, stage durations and counters"""
+        with self._lock:
+            self.records = []
+            self.files = 0
+            self.stage_seconds = {}
+            self.counters = {}
+
+
+_profiler = NullProfiler()
+
+
+def get_profiler():
+    """Return the process-wide profiler (a `NullProfiler` unless profiling is enabled)"""
+    return _profiler
+
+
+def set_profiler(profiler=None):
+    """Replace the process-wide profiler and return the previous one.
+
+    Args:
+        profiler: A `Profiler`, or None to disable profiling.
+    """
+    global _profiler
+    previous = _profiler
+    _profiler = profiler if profiler is not None else NullProfiler()
+    return previous
+
+
+@contextmanager
+def profiling(profiler: Profiler = None):
+    """Enable a profiler in a context, and restore the previous one afterwards.
+
+    Args:
+        profiler: The profiler to enable. If None, a new `Profiler` is created.
+
+    Yields:
+        The enabled profiler.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    previous = set_profiler(profiler)
+    try:
+        yield profiler
+    finally:
+        set_profiler(previous)
@@ -0,0 +1,260 @@
+"""
+
+This module contains the compiled form of the deidentification recipe.
+
+`recipe.json` maps tags written as strings (`0xggggeeee`) to rules. Looking
+up a rule in the JSON dictionary required parsing the tag and matching a
+regular expression for the overlay and curve tags on every attribute. The
+compiled recipe is built once when the configuration is loaded:
+
+- general rules are keyed by integer tag;
+- the rules of tag ranges (overlays `0x60xx3000`/`0x60xx4000`, curves
+  `0x50xxxxxx`, private tags of odd groups) are tested with bit masks;
+- specific rules are keyed by (sequence, attribute) pairs of integer tags.
+
+The compiled rules are cached as JSON in the cache directory of the user
+(`$XDG_CACHE_HOME/deidcm`, `~/.cache/deidcm` by default), in a file named
+after the path of the recipe. The cache stores the hash of the recipe it was
+compiled from, and is rebuilt when the recipe changes. The recipe is only
+compiled in memory when there is no cache directory (no home directory), when
+the directory cannot be written (read-only or sandboxed environments), or
+when the cache is disabled (`Config(use_recipe_cache=False)`).
+
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import List
+
+RECIPE_CACHE_VERSION = 2
+# From the most to the least restrictive
+ACTIONS = ('RETIRER', 'EFFACER', 'PSEUDONYMISER', 'CONSERVER')
+
+
+def parse_tag(tag: str) -> int:
+    """Convert a tag written as `0xggggeeee` to an integer"""
+    return int(tag, 16)
+
+
+def get_range_rule(tag: int) -> str:
+    """Get the rule of the tag ranges removed by the recipe.
+
+    Args:
+        tag: A DICOM tag as an integer.
+
+    Returns:
+        'RETIRER' for overlays (0x60xx3000, 0x60xx4000), curves (0x50xxxxxx) and
+            private tags (odd groups), None for other tags.
+    """
+    if tag >> 24 == 0x50 or (tag >> 16) & 1:
+        return 'RETIRER'
+    if tag >> 24 == 0x60 and (tag & 0xFFFF) in (0x3000, 0x4000):
+        return 'RETIRER'
+    return None
+
+
+def get_most_restrictive_action(rules: list) -> str:
+    """Return the most restrictive action among rules, raising ValueError on unknown rules"""
+    for action in ACTIONS:
+        if action in rules:
+            return action
+    raise ValueError(f"Unknown rule {rules}")
+
+
+def is_dicom2df_tag(tag: str) -> bool:
+    """Check if a tag of the recipe is written like the tags of `dicom2df` (lowercase hexadecimal)"""
+    return re.fullmatch('0x[0-9a-f]{8}', tag) is not None
+
+
+class CompiledRecipe:
+    """Recipe with rules indexed by integer tags, see the module documentation.
+
+    The tags of `dicom2df` are lowercase hexadecimal strings, and `recipe.json`
+    used to be looked up with these strings. Tags written with uppercase digits
+    in the JSON file never matched, so they are left out of the compiled recipe
+    to keep the same results. So are the entries documenting the tag ranges
+    (e.g. `0x50xxxxxx`), which are applied by `get_range_rule`.
+    """
+
+    def __init__(self, recipe: dict) -> None:
+        """
+        Args:
+            recipe: The recipe loaded from `recipe.json` (see `Config.load_recipe`).
+        """
+        self.recipe = recipe
+        self.general_rules = {
+            parse_tag(tag): rule[2]
+            for tag, rule in recipe['general_rules'].items()
+            if is_dicom2df_tag(tag)
+        }
+        self.specific_rules = {
+            (parse_tag(rule['sequence']), parse_tag(tag)): rule['rule']
+            for tag, rule in recipe['specific_rules'].items()
+            if is_dicom2df_tag(tag) and is_dicom2df_tag(rule['sequence'])
+        }
+
+    @classmethod
+    def from_rules(cls, recipe: dict, general_rules: dict, specific_rules: list) -> 'CompiledRecipe':
+        """Rebuild a compiled recipe from the rules stored by `write_recipe_cache`.
+
+        Args:
+            recipe: The recipe loaded from `recipe.json`.
+            general_rules: The rules keyed by tags written as decimal strings (JSON keys).
+            specific_rules: The [sequence, attribute, rule] lists of the specific rules.
+        """
+        compiled = cls.__new__(cls)
+        compiled.recipe = recipe
+        compiled.general_rules = {int(tag): rule for tag, rule in general_rules.items()}
+        compiled.specific_rules = {(int(parent), int(child)): rule for parent, child, rule in specific_rules}
+        return compiled
+
+    def get_general_rule(self, tag: int) -> str:
+        """Get the rule of a tag, 'RETIRER' if the recipe does not define one"""
+        rule = get_range_rule(tag)
+        if rule is not None:
+            return rule
+        return self.general_rules.get(tag, 'RETIRER')
+
+    def get_specific_rule(self, tags: List[int]) -> str:
+        """Get the specific rule of an attribute inside one or more sequences.
+
+        Args:
+            tags: The tags of the sequences containing the attribute, followed by
+                the tag of the attribute.
+
+        Returns:
+            The rule defined for the attribute in one of its sequences, or None.
+        """
+        if len(tags) == 1 or not self.specific_rules:
+            return None
+        child = tags[-1]
+        for parent in tags:
+            rule = self.specific_rules.get((parent, child))
+            if rule is not None:
+                return rule
+        return None
+
+    def get_rules(self, tags: List[str]) -> list:
+        """Get the rules applying to an attribute, see `get_attribute_action`.
+
+        Args:
+            tags: The tags of the attribute, as written by `dicom2df`.
+
+        Returns:
+            The specific rule of the attribute if there is one, otherwise the
+                general rule of each tag.
+        """
+        return self.get_tag_rules([parse_tag(tag) for tag in tags])
+
+    def get_tag_rules(self, tags: List[int]) -> list:
+        """Same as `get_rules`, with integer tags"""
+        specific_rule = self.get_specific_rule(tags)
+        if specific_rule is not None:
+            return [specific_rule]
+        return [self.get_general_rule(tag) for tag in tags]
+
+    def get_action(self, tags: List[int]) -> str:
+        """Get the action of an attribute from its integer tags (sequences first).
+
+        Returns:
+            The specific rule of the attribute if there is one, otherwise the most
+                restrictive general rule of its tags.
+        """
+        return get_most_restrictive_action(self.get_tag_rules(tags))
+
+
+def get_cache_dir() -> str:
+    """Return the directory of the cached compiled recipes of the user.
+
+    Relative values of `XDG_CACHE_HOME` are ignored, as required by the XDG Base
+    Directory specification.
+
+    Returns:
+        `$XDG_CACHE_HOME/deidcm` (`~/.cache/deidcm` by default), or None if the home
+            directory of the user cannot be found.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME', '')
+    if not os.path.isabs(cache_home):
+        home = os.path.expanduser('~')
+        # Without HOME nor password entry, '~' is not expanded
+        if not os.path.isabs(home):
+            return None
+        cache_home = os.path.join(home, '.cache')
+    return os.path.join(cache_home, 'deidcm')
+
+
+def get_recipe_cache_path(recipe_path: str, cache_dir: str = None) -> str:
+    """Return the path of the cached compiled recipe of a JSON file.
+
+    Args:
+        recipe_path: The path of `recipe.json`.
+        cache_dir: The cache directory. If None, the one of `get_cache_dir`.
+
+    Returns:
+        The path of the cache file, or None if there is no cache directory.
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    path_hash = hashlib.sha256(os.path.realpath(recipe_path).encode('utf8')).hexdigest()
+    return os.path.join(cache_dir, f'recipe-{path_hash[:32]}.json')
+
+
+def load_compiled_recipe(recipe_path: str, use_cache: bool = True, cache_dir: str = None) -> CompiledRecipe:
+    """Load a recipe from a JSON file and compile it.
+
+    Args:
+        recipe_path: The path of `recipe.json`.
+        use_cache: Whether to read and write the compiled recipe in the cache directory.
+        cache_dir: The cache directory. If None, the one of `get_cache_dir`.
+
+    Returns:
+        The compiled recipe. Its `recipe` attribute is the content of the JSON file.
+    """
+    try:
+        with open(recipe_path, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(
+            f"Recipe file {recipe_path} cannot be found.") from exc
+    recipe = json.loads(content.decode('utf8'))
+    cache_path = get_recipe_cache_path(recipe_path, cache_dir) if use_cache else None
+    if cache_path is None:
+        return CompiledRecipe(recipe)
+
+    # The cache is valid as long as the content of the recipe does not change
+    key = {'version': RECIPE_CACHE_VERSION, 'sha256': hashlib.sha256(content).hexdigest()}
+    try:
+        with open(cache_path, 'r', encoding='utf8') as f:
+            cache = json.load(f)
+        if cache['key'] == key:
+            return CompiledRecipe.from_rules(recipe, cache['general_rules'], cache['specific_rules'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    compiled = CompiledRecipe(recipe)
+    write_recipe_cache(cache_path, key, compiled)
+    return compiled
+
+
+def write_recipe_cache(cache_path: str, key: dict, compiled: CompiledRecipe) -> None:
+    """Write the rules of a compiled recipe atomically, ignoring unwritable directories"""
+    cache = {
+        'key': key,
+        'general_rules': {str(tag): rule for tag, rule in compiled.general_rules.items()},
+        'specific_rules': [[parent, child, rule] for (parent, child), rule in compiled.specific_rules.items()]
+    }
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,128 @@
+"""
+
+This module contains the matcher of authorized words.
+
+The matcher is built once when the configuration is loaded and reused for
+every image. Exact matches are looked up in a frozenset. Near matches (OCR
+confusions such as "RML0" for "RMLO") are found with a deletion-neighborhood
+index: every authorized word is indexed under all the strings obtained by
+deleting up to `max_distance` characters. Two words within `max_distance`
+edits of each other share at least one of these strings, so only a few
+candidates have to be compared with the OCR text.
+
+"""
+
+import threading
+from itertools import combinations
+
+FUZZY_MAX_DISTANCE = 2
+
+
+def get_deletions(word: str, max_distance: int) -> set:
+    """Return the strings obtained by deleting up to `max_distance` characters of `word`"""
+    deletions = set()
+    for distance in range(min(max_distance, len(word)) + 1):
+        for indices in combinations(range(len(word)), distance):
+            deletions.add(''.join(c for i, c in enumerate(word) if i not in indices))
+    return deletions
+
+
+def get_edit_distance(word1: str, word2: str, max_distance: int) -> int:
+    """Compute the Levenshtein distance between two words.
+
+    The computation stops as soon as the distance exceeds `max_distance`, in which
+    case `max_distance + 1` is returned.
+    """
+    if abs(len(word1) - len(word2)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(word2) + 1))
+    for i, c1 in enumerate(word1, 1):
+        current = [i]
+        for j, c2 in enumerate(word2, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (c1 != c2)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+class AuthorizedWordMatcher:
+    """Compiled set of authorized words with optional fuzzy matching.
+
+    OCR texts are uppercased before being looked up, words are looked up as they
+    are written in `authorized_words.txt`. Lookups are counted so that the hit rate
+    of the matcher can be measured with `get_stats`.
+    """
+
+    def __init__(self, words: list, max_distance: int = 0) -> None:
+        """
+        Args:
+            words: The authorized words.
+            max_distance: The maximum number of edits (insertions, deletions,
+                substitutions) between an OCR text and an authorized word. 0 only
+                allows exact matches.
+        """
+        if not 0 <= max_distance <= FUZZY_MAX_DISTANCE:
+            raise ValueError(f"max_distance must be in [0, {FUZZY_MAX_DISTANCE}], got {max_distance}")
+        self.words = frozenset(word for word in words if word)
+        self.max_distance = max_distance
+        self._index = {}
+        if max_distance > 0:
+            for word in self.words:
+                for deletion in get_deletions(word, max_distance):
+                    self._index.setdefault(deletion, set()).add(word)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def match(self, text: str) -> str:
+        """Find the authorized word matching an OCR text.
+
+        Args:
+            text: A text read by the OCR.
+
+        Returns:
+            The matching authorized word, or None if the text is not authorized.
+        """
+        text = text.upper()
+        result, counter = None, 'misses'
+        if text in self.words:
+            result, counter = text, 'exact_hits'
+        elif self._index:
+            candidates = set()
+            for deletion in get_deletions(text, self.max_distance):
+                candidates.update(self._index.get(deletion, ()))
+            distances = sorted(
+                (get_edit_distance(text, word, self.max_distance), word) for word in candidates)
+            if distances and distances[0][0] <= self.max_distance:
+                result, counter = distances[0][1], 'fuzzy_hits'
+        with self._lock:
+            self.lookups += 1
+            setattr(self, counter, getattr(self, counter) + 1)
+        return result
+
+    def is_authorized(self, text: str) -> bool:
+        """Check if an OCR text matches an authorized word"""
+        return self.match(text) is not None
+
+    def get_stats(self) -> dict:
+        """Return the lookup counters and the hit rate of the matcher"""
+        with self._lock:
+            hits = self.exact_hits + self.fuzzy_hits
+            return {
+                'lookups': self.lookups,
+                'exact_hits': self.exact_hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'hit_rate': hits / self.lookups if self.lookups else 0.0
+            }
+
+    def reset_stats(self) -> None:
+        """Reset the lookup counters"""
+        with self._lock:
+            self.lookups = 0
+            self.exact_hits = 0
+            self.fuzzy_hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.words)
@@ -4,6 +4,8 @@ import pydicom
 import numpy as np
 from PIL import Image
 
+from deidcm.dicom.lut import has_linear_window, window_image
+
 
 def dicom2png(infile, outfile):
     pixels = dicom2narray(infile)
@@ -29,6 +31,9 @@ def dicom2narray(path, voi_lut=False, fix_monochrome=True):
         if ds.Modality == "CT":
             data = apply_modality_lut(ds.pixel_array, ds)
             data = apply_voi_lut(data, ds)
+        elif has_linear_window(ds):
+            # Cached 8-bit look-up table shared with the OCR deidentification
+            data = window_image(ds)
         else:
             data = apply_voi_lut(ds.pixel_array, ds)
     else:
@@ -32,6 +32,9 @@ setup(
     include_package_data=True,
 
     extras_require={
+        "parquet": [
+            "pyarrow"
+        ],
         "quality-tools": [
             "pylint",
             "autopep8",
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+
+Helpers shared by the tests: synthetic DICOM files and a fake OCR reader.
+
+"""
+
+import os
+
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.sequence import Sequence
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from deidcm.dicom.ocr_detection import horizontal_to_box
+
+DIGITAL_MAMMOGRAPHY_SOP_CLASS_UID = '1.2.840.10008.5.1.4.1.1.1.2'
+
+# A word in the middle of small test images
+WORD = ([[20, 20], [40, 20], [40, 30], [20, 30]], 'PATIENT', 0.9)
+# A word in the top-left corner
+CORNER_WORD = ([[0, 0], [10, 0], [10, 5], [0, 5]], 'PATIENT', 0.9)
+# The attributes of `write_sample_files` that can be left out of some files
+SAMPLE_SPARSE_ATTRIBUTES = {'Manufacturer': 'MANUFACTURER', 'AccessionNumber': '', 'OperatorsName': 'SMITH'}
+
+
+def get_sample_ocr_data(shape: tuple, nb_words: int = 4) -> list:
+    """Return fake OCR results spread along the left border of an image"""
+    height = shape[0]
+    ocr_data = []
+    for i in range(nb_words):
+        y = int((i + 0.5) * height / nb_words)
+        ocr_data.append(([[50, y], [250, y], [250, y + 40], [50, y + 40]], 'PATIENT', 0.9))
+    return ocr_data
+
+
+def create_synthetic_dataset(pixels: np.ndarray) -> Dataset:
+    """Create a minimal monochrome DICOM dataset storing `pixels` (uint8 or uint16).
+
+    3D arrays are stored as multi-frame datasets (frames, rows, columns).
+    """
+    bits = pixels.dtype.itemsize * 8
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.file_meta.MediaStorageSOPClassUID = DIGITAL_MAMMOGRAPHY_SOP_CLASS_UID
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.SOPClassUID = DIGITAL_MAMMOGRAPHY_SOP_CLASS_UID
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = 'MG'
+    ds.is_little_endian, ds.is_implicit_VR = True, False
+    ds.Rows, ds.Columns = pixels.shape[-2:]
+    if pixels.ndim == 3:
+        ds.NumberOfFrames = pixels.shape[0]
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = bits, bits, bits - 1
+    ds.SamplesPerPixel, ds.PixelRepresentation = 1, 0
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.PixelData = pixels.tobytes()
+    return ds
+
+
+def write_synthetic_dicom(path: str, pixels: np.ndarray) -> Dataset:
+    """Write a minimal monochrome DICOM file storing `pixels` and return its dataset"""
+    ds = create_synthetic_dataset(pixels)
+    ds.save_as(path, write_like_original=False)
+    return ds
+
+
+def write_sample_files(indir: str, count: int = 3, sparse_attributes: tuple = ()) -> None:
+    """Write DICOM files with identifying attributes, sequences and private tags.
+
+    The files are named `0.dcm`, `1.dcm`... The pixels of each file are filled with
+    its index. The first two files share their ConcatenationUID.
+
+    Args:
+        indir: The directory of the files.
+        count: The number of files.
+        sparse_attributes: Keywords of `SAMPLE_SPARSE_ATTRIBUTES` only written in
+            the middle file, to have attributes missing from the other files.
+    """
+    for index in range(count):
+        ds = create_synthetic_dataset(np.full((4, 4), index, dtype=np.uint8))
+        ds.PatientName = f'DOE^JANE{index}'
+        ds.PatientID = f'ID{index}'
+        ds.PatientBirthDate = '19540312'
+        ds.StudyDate = f'2021031{index}'
+        ds.StudyTime = '101010'
+        ds.ConcatenationUID = '1.2.3.4.5' if index < 2 else '1.2.3.4.6'
+        ds.ContentTime = '101010'
+        ds.InstitutionName = 'CENTRE'
+        ds.StationName = 'STATION'
+        for keyword, value in SAMPLE_SPARSE_ATTRIBUTES.items():
+            if keyword not in sparse_attributes or index == count // 2:
+                setattr(ds, keyword, value)
+        code = Dataset()
+        code.CodeValue, code.CodeMeaning = 'R-10226', 'medio-lateral oblique'
+        ds.ViewCodeSequence = Sequence([code])
+        ds.add_new(0x00091010, 'LO', 'private')
+        ds.save_as(os.path.join(indir, f'{index}.dcm'), write_like_original=False)
+
+
+class FakeReader:
+    """OCR reader returning scripted words without running any model.
+
+    The reader records what it is given: the number of `readtext` calls, the shapes
+    of the images, the shapes of each batch and the boxes submitted to `recognize`.
+    """
+
+    def __init__(self, words: list = None, results: list = None, when=None, detections: tuple = None) -> None:
+        """
+        Args:
+            words: The easyOCR-like results returned for every image. If None, words
+                spread along the left border are returned (see `get_sample_ocr_data`).
+            results: Results returned for the first images, in turn, before `words`.
+            when: A function of the image. If given, `words` are only returned for the
+                images where it returns True.
+            detections: The (horizontal_list, free_list) returned by `detect`. Every box
+                given to `recognize` is read as `LCC`.
+        """
+        self.words = words
+        self.results = list(results or [])
+        self.when = when
+        self.detections = detections
+        self.calls = 0
+        self.shapes = []
+        self.batches = []
+        self.recognized = []
+
+    def readtext(self, image: np.ndarray, **kwargs) -> list:
+        self.calls += 1
+        self.shapes.append(image.shape)
+        if self.results:
+            return self.results.pop(0)
+        if self.when is not None and not self.when(image):
+            return []
+        if self.words is None:
+            return get_sample_ocr_data(image.shape)
+        return list(self.words)
+
+    def readtext_batched(self, images: list, **kwargs) -> list:
+        self.batches.append([image.shape for image in images])
+        return [self.readtext(image) for image in images]
+
+    def detect(self, image: np.ndarray, **kwargs) -> tuple:
+        horizontal_list, free_list = self.detections
+        return [horizontal_list], [free_list or []]
+
+    def recognize(self, image: np.ndarray, horizontal_list: list = None, free_list: list = None,
+                  **kwargs) -> list:
+        self.recognized.extend(horizontal_list)
+        return [(horizontal_to_box(box), 'LCC', 0.9) for box in horizontal_list]
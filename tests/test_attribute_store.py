@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from deidcm.config import Config
+from deidcm.dicom.attribute_store import AttributeStore, is_parquet_available
+from deidcm.dicom.deid_mammogram import (
+    deidentify_attributes,
+    deidentify_attributes_chunked,
+    deidentify_attributes_chunks
+)
+from deidcm.dicom.dicom2df import dicom2df_chunks
+
+from helpers import write_sample_files
+
+ORG_ROOT = "9.9.9.9.9"
+
+
+def normalize(df):
+    """Sort rows by file and use None for missing values, whatever the dtypes"""
+    df = df.sort_values('FilePath').reset_index(drop=True)
+    return df.astype(object).where(df.notna(), None)
+
+
+class ChunkedAttributesTest(unittest.TestCase):
+
+    def setUp(self):
+        Config()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.indir = os.path.join(self.tmpdir.name, 'in')
+        self.outdir = os.path.join(self.tmpdir.name, 'out')
+        os.mkdir(self.indir)
+        os.mkdir(self.outdir)
+        write_sample_files(self.indir, count=5, sparse_attributes=('Manufacturer',))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_dicom2df_chunks(self):
+        chunks = list(dicom2df_chunks(self.indir, chunksize=2))
+        self.assertEqual([len(df) for df in chunks], [2, 2, 1])
+        self.assertEqual(sum('Manufacturer_0x00080070_LO_1____' in df.columns for df in chunks), 1)
+        with self.assertRaises(ValueError):
+            next(dicom2df_chunks(self.indir, chunksize=0))
+
+    def test_chunks(self):
+        with mock.patch('deidcm.dicom.deid_mammogram.gen_dummy_str', lambda length, mode: 'X' * length):
+            expected = deidentify_attributes(self.indir, self.outdir, ORG_ROOT)
+            chunks = list(deidentify_attributes_chunks(self.indir, ORG_ROOT, chunksize=2))
+        self.assertEqual(len(chunks), 3)
+        df = pd.concat(chunks, ignore_index=True)
+        pd.testing.assert_frame_equal(normalize(df)[expected.columns], normalize(expected))
+
+    @unittest.skipUnless(is_parquet_available(), 'pyarrow is not installed')
+    def test_store(self):
+        store_path = os.path.join(self.outdir, 'attributes')
+        with mock.patch('deidcm.dicom.deid_mammogram.gen_dummy_str', lambda length, mode: 'X' * length):
+            expected = deidentify_attributes(self.indir, self.outdir, ORG_ROOT)
+            store = deidentify_attributes_chunked(self.indir, self.outdir, ORG_ROOT, store_path, chunksize=2)
+        self.assertEqual(len(store.parts), 3)
+        self.assertEqual(len(store), 5)
+        # Columns appearing in a later batch are added to the schema of the store
+        self.assertEqual(sorted(store.columns), sorted(expected.columns))
+        pd.testing.assert_frame_equal(normalize(store.read())[expected.columns], normalize(expected))
+
+        chunks = list(store)
+        self.assertTrue(all(list(df.columns) == store.columns for df in chunks))
+        self.assertEqual(list(chunks[0].index), [0, 1])
+        names = store.read(['PatientName_0x00100010_PN_1____'])
+        self.assertEqual(names.shape, (5, 1))
+
+        # Running again replaces the content of the store
+        store = deidentify_attributes_chunked(self.indir, self.outdir, ORG_ROOT, store_path, chunksize=5)
+        self.assertEqual(len(store.parts), 1)
+        self.assertEqual(len(AttributeStore(store_path)), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
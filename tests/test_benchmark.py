@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks.benchmark import (
+    BENCHMARK_STAGES,
+    burn_words,
+    create_synthetic_mammogram,
+    run_benchmark,
+    write_benchmark_results,
+    write_synthetic_mammograms
+)
+
+from helpers import FakeReader
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.font = os.path.join(os.path.dirname(__file__), 'assets', 'fonts', 'Arial.ttf')
+
+    def test_synthetic_mammogram(self):
+        pixels = create_synthetic_mammogram((400, 300), bits_stored=14)
+        self.assertEqual(pixels.dtype, np.uint16)
+        self.assertLess(pixels.max(), 2 ** 14)
+        # The right border is background
+        self.assertTrue((pixels[:, -10:] == 0).all())
+        self.assertEqual(create_synthetic_mammogram((40, 30), bits_stored=8).dtype, np.uint8)
+
+    def test_burn_words(self):
+        pixels = create_synthetic_mammogram((600, 500), bits_stored=12)
+        burned = burn_words(pixels, ['PATIENT', 'DUPONT'], self.font, bits_stored=12)
+        changed = burned != pixels
+        self.assertTrue(changed.any())
+        self.assertTrue((burned[changed] == 4095).all())
+
+    def test_write_synthetic_mammograms(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = write_synthetic_mammograms(tmpdir, 2, (120, 100), bits_stored=10)
+            self.assertEqual(len(paths), 2)
+            self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_sample_ocr_data(self):
+        words = FakeReader().readtext(np.zeros((400, 300)))
+        self.assertEqual(len(words), 4)
+        self.assertEqual(FakeReader([]).readtext(np.zeros((4, 3))), [])
+
+    def test_run_benchmark(self):
+        results = run_benchmark(shapes=[(600, 500)], bits_stored=[12], count=2, font=self.font,
+                                reader=FakeReader(), png_options={'compression': 1})
+        self.assertEqual(len(results['cases']), 2)
+        self.assertEqual([case['with_text'] for case in results['cases']], [False, True])
+        for case in results['cases']:
+            self.assertEqual(case['shape'], '600x500')
+            self.assertEqual(set(BENCHMARK_STAGES) | {'images_per_second'}, set(case['stages']))
+            self.assertGreater(case['stages']['images_per_second'], 0)
+            self.assertEqual(case['df2dicom']['files'], 2)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.json')
+            write_benchmark_results(results, path)
+            with open(path, encoding='utf8') as f:
+                self.assertEqual(json.load(f)['parameters']['count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pydicom
+
+from deidcm.config import Config
+from deidcm.dicom.deid_dataset import deidentify_dataset, deidentify_dicoms
+from deidcm.dicom.deid_mammogram import deidentify_attributes, gen_dicom_uid
+from deidcm.dicom.df2dicom import df2dicom
+from deidcm.dicom.encoding import encode_dataset
+
+from helpers import FakeReader, create_synthetic_dataset, write_sample_files
+
+ORG_ROOT = "9.9.9.9.9"
+
+
+def read_outputs(outdir):
+    return {file: pydicom.dcmread(os.path.join(outdir, file)) for file in os.listdir(outdir)}
+
+
+class DatasetDeidentificationTest(unittest.TestCase):
+
+    def setUp(self):
+        Config()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.indir = os.path.join(self.tmpdir.name, 'in')
+        os.mkdir(self.indir)
+        write_sample_files(self.indir)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_same_files_as_dataframe(self):
+        """the dataset walk writes the files of deidentify_attributes + df2dicom"""
+        df_outdir = os.path.join(self.tmpdir.name, 'df')
+        walk_outdir = os.path.join(self.tmpdir.name, 'walk')
+        os.mkdir(df_outdir)
+        os.mkdir(walk_outdir)
+        # Random pseudonyms are made constant to compare the two implementations
+        with mock.patch('deidcm.dicom.deid_mammogram.gen_dummy_str', lambda length, mode: 'X' * length):
+            df = deidentify_attributes(self.indir, df_outdir, org_root=ORG_ROOT)
+            df2dicom(df, df_outdir, output_file_formats=['dcm'])
+            audit = deidentify_dicoms(self.indir, walk_outdir, ORG_ROOT, audit=True)
+
+        expected, outputs = read_outputs(df_outdir), read_outputs(walk_outdir)
+        self.assertEqual(sorted(outputs), sorted(expected))
+        for file, ds in outputs.items():
+            self.assertEqual(ds, expected[file])
+            # The DataFrame encodes binary values twice (FileMetaInformationVersion)
+            self.assertEqual(ds.file_meta.FileMetaInformationVersion, b'\x00\x01')
+            for meta in ('MediaStorageSOPInstanceUID', 'TransferSyntaxUID'):
+                self.assertEqual(ds.file_meta[meta], expected[file].file_meta[meta])
+            np.testing.assert_array_equal(ds.pixel_array, expected[file].pixel_array)
+        self.assertEqual(len(audit), 3)
+        self.assertTrue(audit['PatientName_0x00100010_PN_1____'].str.startswith('PATIENT^').all())
+
+    def test_same_volumes_as_dataframe(self):
+        """multi-frame files are written like with deidentify_attributes + df2dicom"""
+        volume = np.arange(6 * 40 * 30, dtype=np.uint16).reshape(6, 40, 30)
+        indir = os.path.join(self.tmpdir.name, 'volumes')
+        os.mkdir(indir)
+        for compressed in (False, True):
+            ds = create_synthetic_dataset(volume)
+            ds.PatientName = 'DOE^JANE'
+            if compressed:
+                encode_dataset(ds, volume, 'rle')
+            ds.save_as(os.path.join(indir, f'{compressed}.dcm'), write_like_original=False)
+
+        for formats in (['dcm'], ['dcm', 'png']):
+            with self.subTest(formats=formats):
+                df_outdir = os.path.join(self.tmpdir.name, f'df{len(formats)}')
+                walk_outdir = os.path.join(self.tmpdir.name, f'walk{len(formats)}')
+                os.mkdir(df_outdir)
+                os.mkdir(walk_outdir)
+                with mock.patch('deidcm.dicom.deid_mammogram.gen_dummy_str', lambda length, mode: 'X' * length):
+                    df = deidentify_attributes(indir, df_outdir, org_root=ORG_ROOT)
+                    df2dicom(df, df_outdir, do_image_deidentification=True, output_file_formats=formats,
+                             reader=FakeReader([]))
+                    deidentify_dicoms(indir, walk_outdir, ORG_ROOT, do_image_deidentification=True,
+                                      output_file_formats=formats, reader=FakeReader([]))
+
+                expected = {file: pydicom.dcmread(os.path.join(df_outdir, file))
+                            for file in os.listdir(df_outdir) if file.endswith('.dcm')}
+                outputs = {file: pydicom.dcmread(os.path.join(walk_outdir, file))
+                           for file in os.listdir(walk_outdir) if file.endswith('.dcm')}
+                self.assertEqual(sorted(outputs), sorted(expected))
+                self.assertEqual(len(outputs), 2)
+                for file, ds in outputs.items():
+                    self.assertEqual(ds.NumberOfFrames, 6)
+                    self.assertEqual(ds.NumberOfFrames, expected[file].NumberOfFrames)
+                    np.testing.assert_array_equal(ds.pixel_array, volume)
+                    np.testing.assert_array_equal(ds.pixel_array, expected[file].pixel_array)
+
+    def test_deidentify_dataset(self):
+        source = pydicom.dcmread(os.path.join(self.indir, '1.dcm'))
+        ds = deidentify_dataset(source, ORG_ROOT)
+        self.assertEqual(source.PatientName, 'DOE^JANE1')
+        self.assertTrue(str(ds.PatientName).startswith('PATIENT^'))
+        self.assertEqual(ds.PatientBirthDate, '19540101')
+        self.assertEqual(ds.StudyDate, '20210101')
+        self.assertEqual(ds.StudyTime, '')
+        self.assertTrue(ds.ConcatenationUID.startswith(ORG_ROOT))
+        self.assertEqual(ds.PatientIdentityRemoved, 'YES')
+        self.assertNotIn(0x00091010, ds)
+        self.assertNotIn('PixelData', ds)
+
+    def test_multi_valued_pseudonyms(self):
+        """multi-valued attributes are pseudonymised value by value"""
+        source = create_synthetic_dataset(np.zeros((4, 4), dtype=np.uint8))
+        source.ConcatenationUID = ['1.2.3', '1.2.4']
+        ds = deidentify_dataset(source, ORG_ROOT)
+        self.assertEqual(list(ds.ConcatenationUID), [gen_dicom_uid('', uid, ORG_ROOT) for uid in ('1.2.3', '1.2.4')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from deidcm.config import Config
+from deidcm.dicom.deid_pool import DeidentificationPool
+
+from helpers import CORNER_WORD, FakeReader, write_synthetic_dicom
+
+
+def fake_warm_up_reader(languages, gpu, **options):
+    return FakeReader([CORNER_WORD])
+
+
+# Forked workers inherit the patched reader, spawned workers would load easyOCR models
+@mock.patch('deidcm.dicom.deid_pool.warm_up_reader', fake_warm_up_reader)
+class DeidentificationPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        Config()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i, rows in enumerate([40, 60, 80, 100]):
+            self.paths.append(os.path.join(self.tmpdir.name, f'{i}.dcm'))
+            write_synthetic_dicom(self.paths[-1], np.full((rows, 30), 128, dtype=np.uint8))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_deidentify_pixels_in_order(self):
+        """results are returned in the order of the input files"""
+        with DeidentificationPool(workers=2, chunksize=1, start_method='fork') as pool:
+            results = list(pool.deidentify_pixels(self.paths))
+        self.assertEqual([pixels.shape[0] for pixels in results], [40, 60, 80, 100])
+        for pixels in results:
+            self.assertEqual(pixels[0, 0], 0)
+
+    def test_deidentify_png(self):
+        filenames = [f'image{i}' for i in range(len(self.paths))]
+        with DeidentificationPool(workers=2, chunksize=2, start_method='fork') as pool:
+            outfiles = list(pool.deidentify_png(self.paths, self.tmpdir.name, filenames))
+        self.assertEqual(outfiles, [os.path.join(self.tmpdir.name, f'{name}.png') for name in filenames])
+        self.assertEqual(Image.open(outfiles[2]).size, (30, 80))
+
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            DeidentificationPool(workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from deidcm.config import Config
+from deidcm.dicom.deid_mammogram import deidentify_image_ndarray
+from deidcm.dicom.device_templates import (
+    DeviceTemplateStore,
+    get_device_key,
+    get_iou,
+    match_boxes,
+    widen_box
+)
+from deidcm.dicom.ocr_regions import get_bounding_box
+
+from helpers import FakeReader, create_synthetic_dataset
+
+KEY = ('GE', 'Senographe', '1.0', 100, 80)
+WORD = ([[0, 0], [20, 0], [20, 10], [0, 10]], 'DUPONT', 0.9)
+SHIFTED_WORD = ([[2, 1], [21, 1], [21, 10], [2, 10]], 'MARTIN', 0.8)
+OTHER_WORD = ([[50, 50], [70, 50], [70, 60], [50, 60]], 'DURAND', 0.9)
+
+
+class DeviceTemplatesTest(unittest.TestCase):
+
+    def test_get_iou(self):
+        self.assertEqual(get_iou((0, 0, 10, 10), (0, 0, 10, 10)), 1.0)
+        self.assertEqual(get_iou((0, 0, 10, 10), (20, 20, 30, 30)), 0.0)
+        self.assertAlmostEqual(get_iou((0, 0, 10, 10), (5, 0, 15, 10)), 1 / 3)
+
+    def test_match_boxes(self):
+        self.assertEqual(len(match_boxes([(0, 0, 20, 10)], [(2, 1, 21, 10)])), 1)
+        self.assertIsNone(match_boxes([(0, 0, 20, 10)], [(50, 50, 70, 60)]))
+        self.assertIsNone(match_boxes([(0, 0, 20, 10)], []))
+
+    def test_template_becomes_stable(self):
+        """the template is applied once the same boxes are found on consecutive images"""
+        store = DeviceTemplateStore(min_observations=2, check_interval=3)
+        self.assertIsNone(store.lookup(KEY))
+        store.update(KEY, [WORD])
+        self.assertIsNone(store.lookup(KEY))
+        store.update(KEY, [SHIFTED_WORD])
+        ocr_data = store.lookup(KEY)
+        # Template boxes are the union of the matched boxes, widened away from the left border
+        self.assertEqual(ocr_data[0][0], [[0, 0], [42, 0], [42, 10], [0, 10]])
+        self.assertIsNotNone(store.lookup(KEY))
+        # Every check_interval images, the OCR runs again
+        self.assertIsNone(store.lookup(KEY))
+
+    def test_longer_value_on_stable_device(self):
+        """a longer name than the learned one is still hidden by the template"""
+        store = DeviceTemplateStore(min_observations=1)
+        store.update(KEY, [WORD, OTHER_WORD])
+        longer_word = get_bounding_box([[0, 0], [38, 0], [38, 10], [0, 10]])
+        longer_other_word = get_bounding_box([[35, 50], [70, 50], [70, 60], [35, 60]])
+        boxes = [get_bounding_box(found[0]) for found in store.lookup(KEY)]
+        for longer, box in zip((longer_word, longer_other_word), boxes):
+            self.assertTrue(box[0] <= longer[0] and box[2] >= longer[2], (longer, box))
+        self.assertEqual(widen_box((60, 0, 75, 10), 80), (45, 0, 75, 10))
+        self.assertEqual(widen_box((0, 0, 60, 10), 80), (0, 0, 79, 10))
+        self.assertEqual(widen_box((0, 0, 20, 10), 80, margin=0), (0, 0, 20, 10))
+
+    def test_drift(self):
+        """changed annotations hide both boxes and reset the template"""
+        store = DeviceTemplateStore(min_observations=1)
+        store.update(KEY, [WORD])
+        ocr_data = store.update(KEY, [OTHER_WORD])
+        self.assertEqual(len(ocr_data), 2)
+        self.assertEqual(store.get_stats()['drifts'], 1)
+        self.assertEqual(store.templates[KEY]['boxes'], [(50, 50, 70, 60)])
+
+    def test_save_and_load(self):
+        store = DeviceTemplateStore(min_observations=1)
+        store.update(KEY, [WORD])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'templates.json')
+            store.save(path)
+            loaded = DeviceTemplateStore(min_observations=1)
+            loaded.load(path)
+        self.assertTrue(loaded.is_stable(KEY))
+        self.assertEqual(loaded.templates[KEY]['boxes'], [(0, 0, 20, 10)])
+
+    def test_deidentify_image_ndarray_with_templates(self):
+        """the OCR is skipped once the template of the device is stable"""
+        Config()
+        ds = create_synthetic_dataset(np.full((100, 80), 128, dtype=np.uint8))
+        ds.Manufacturer = 'GE'
+        reader = FakeReader([WORD])
+        store = DeviceTemplateStore(min_observations=2, check_interval=100)
+        results = [deidentify_image_ndarray(ds, reader=reader, templates=store) for _ in range(5)]
+        self.assertEqual(reader.calls, 2)
+        for pixels in results[1:]:
+            np.testing.assert_array_equal(pixels, results[0])
+        self.assertEqual(get_device_key(ds, (100, 80)), ('GE', '', '', 100, 80))
+        self.assertEqual(store.get_stats()['template_hits'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import pydicom
+from pydicom.uid import JPEG2000Lossless, RLELossless
+
+from deidcm.dicom.df2dicom import df2dicom
+from deidcm.dicom.dicom2df import dicom2df
+from deidcm.dicom.encoding import (
+    encode_dataset,
+    get_available_encodings,
+    get_transfer_syntax,
+    is_encoding_available
+)
+
+from helpers import create_synthetic_dataset, write_synthetic_dicom
+
+
+class EncodingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 4096, size=(64, 48), dtype=np.uint16)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def assert_lossless(self, encoding, pixels, transfer_syntax):
+        ds = create_synthetic_dataset(pixels)
+        encode_dataset(ds, pixels, encoding)
+        path = os.path.join(self.tmpdir.name, f'{encoding}.dcm')
+        ds.save_as(path, write_like_original=False)
+        written = pydicom.dcmread(path)
+        self.assertEqual(written.file_meta.TransferSyntaxUID, transfer_syntax)
+        self.assertLess(len(written.PixelData), pixels.nbytes + 1024)
+        np.testing.assert_array_equal(written.pixel_array, pixels)
+
+    def test_rle(self):
+        self.assertTrue(is_encoding_available('rle'))
+        self.assertIn('rle', get_available_encodings())
+        self.assert_lossless('rle', self.pixels, RLELossless)
+        self.assert_lossless('rle', (self.pixels // 16).astype(np.uint8), RLELossless)
+
+    @unittest.skipUnless(is_encoding_available('jpeg2000'), 'Pillow is built without OpenJPEG')
+    def test_jpeg2000(self):
+        self.assert_lossless('jpeg2000', self.pixels, JPEG2000Lossless)
+
+    @unittest.skipUnless(is_encoding_available('jpeg2000'), 'Pillow is built without OpenJPEG')
+    def test_jpeg2000_precision(self):
+        """the bits stored match the precision of the codestream"""
+        ds = create_synthetic_dataset(self.pixels)
+        ds.BitsStored, ds.HighBit = 12, 11
+        encode_dataset(ds, self.pixels, 'jpeg2000')
+        self.assertEqual((ds.BitsStored, ds.HighBit), (16, 15))
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            np.testing.assert_array_equal(ds.pixel_array, self.pixels)
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            get_transfer_syntax('png')
+
+    def test_df2dicom_output_encoding(self):
+        indir = os.path.join(self.tmpdir.name, 'in')
+        outdir = os.path.join(self.tmpdir.name, 'out')
+        os.makedirs(indir)
+        os.makedirs(outdir)
+        write_synthetic_dicom(os.path.join(indir, 'image.dcm'), self.pixels)
+        df = dicom2df(indir, with_pixels=True)
+        df2dicom(df, outdir, output_file_formats=['dcm'], output_encoding='rle')
+        written = pydicom.dcmread(os.path.join(outdir, os.listdir(outdir)[0]))
+        self.assertEqual(written.file_meta.TransferSyntaxUID, RLELossless)
+        np.testing.assert_array_equal(written.pixel_array, self.pixels)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+from pydicom import Dataset
+from pydicom.pixel_data_handlers.util import apply_voi_lut
+
+from deidcm.dicom.lut import (
+    get_window_lut,
+    apply_window,
+    get_window_presets,
+    has_linear_window,
+    window_image
+)
+from deidcm.dicom2png import dicom2narray
+
+from helpers import create_synthetic_dataset
+
+
+def legacy_windowing(data, window, level):
+    """Windowing as done by get_PIL_image with np.piecewise and PIL"""
+    image = np.piecewise(data,
+                         [data <= (level - 0.5 - (window - 1) / 2),
+                          data > (level - 0.5 + (window - 1) / 2)],
+                         [0, 255, lambda data: ((data - (level - 0.5)) /
+                          (window - 1) + 0.5) * (255 - 0)])
+    return np.array(Image.fromarray(image).convert('L'))
+
+
+class LutTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 4096, size=(64, 48), dtype=np.uint16)
+
+    def test_same_result_as_legacy_windowing(self):
+        """the look-up table reproduces the previous windowing"""
+        for window, level in [(4096, 2048), (600, 1500), (1, 100), (2, 3000)]:
+            np.testing.assert_array_equal(
+                apply_window(self.pixels, window, level),
+                legacy_windowing(self.pixels, window, level)
+            )
+
+    def test_lut_is_cached(self):
+        """tables are built once and cannot be modified"""
+        lut = get_window_lut(600, 1500, 16)
+        self.assertIs(get_window_lut(600, 1500, 16), lut)
+        self.assertEqual(lut.shape, (65536,))
+        self.assertFalse(lut.flags.writeable)
+
+    def test_signed_pixels(self):
+        """signed pixels are shifted before the look-up"""
+        pixels = np.array([[-1000, -10, 0, 10, 1000]], dtype=np.int16)
+        np.testing.assert_array_equal(
+            apply_window(pixels, 21, 0), [[0, 6, 133, 255, 255]])
+
+    def test_window_presets(self):
+        """the chosen preset is applied"""
+        ds = Dataset()
+        ds.WindowWidth = [4096, 600]
+        ds.WindowCenter = [2048, 1500]
+        self.assertEqual(get_window_presets(ds), [(4096, 2048), (600, 1500)])
+        np.testing.assert_array_equal(
+            window_image(ds, self.pixels, preset=1),
+            apply_window(self.pixels, 600, 1500)
+        )
+        self.assertIsNone(window_image(Dataset(), self.pixels))
+
+    def test_voi_lut_sequence(self):
+        """VOI LUT Sequence data is rescaled to 8 bits"""
+        item = Dataset()
+        item.LUTDescriptor = [4, 10, 8]
+        item.LUTData = [0, 51, 204, 255]
+        ds = Dataset()
+        ds.VOILUTSequence = [item]
+        pixels = np.array([[0, 10, 11, 12, 13, 4000]], dtype=np.uint16)
+        np.testing.assert_array_equal(
+            window_image(ds, pixels), [[0, 0, 51, 204, 255, 255]])
+        ds.WindowWidth, ds.WindowCenter = 600, 1500
+        # pydicom prefers the VOI LUT Sequence to the windows
+        self.assertFalse(has_linear_window(ds))
+
+
+class Dicom2NarrayTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 4096, size=(64, 48), dtype=np.uint16)
+        self.ds = create_synthetic_dataset(self.pixels)
+        self.ds.WindowCenter, self.ds.WindowWidth = 1500, 600
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'image.dcm')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def narray(self):
+        self.ds.save_as(self.path, write_like_original=False)
+        return dicom2narray(self.path, voi_lut=True)[0]
+
+    def test_linear_window(self):
+        """plain LINEAR windows use the cached look-up table"""
+        self.assertTrue(has_linear_window(self.ds))
+        np.testing.assert_array_equal(self.narray(), apply_window(self.pixels, 600, 1500))
+
+    def test_sigmoid_window_with_rescale(self):
+        """other VOI LUT functions and rescaled pixels are windowed by pydicom"""
+        self.ds.VOILUTFunction = 'SIGMOID'
+        self.ds.RescaleSlope, self.ds.RescaleIntercept = 2, -100
+        self.assertFalse(has_linear_window(self.ds))
+        expected = apply_voi_lut(self.pixels, self.ds)
+        expected = expected - np.min(expected)
+        expected = (expected / np.max(expected) * 255).astype(np.uint8)
+        np.testing.assert_array_equal(self.narray(), expected)
+
+        self.ds.VOILUTFunction = 'LINEAR'
+        self.assertFalse(has_linear_window(self.ds))
@@ -6,16 +6,21 @@ import tempfile
 import unittest
 from random import choice, randint
 import string
+from unittest import mock
 
 import pandas as pd
 
 from deidcm.config import Config
 from deidcm.dicom.deid_mammogram import (
+    apply_deidentification,
     get_general_rule,
     offset4date,
     gen_dicom_uid,
     deidentify_attributes,
 )
+from deidcm.dicom.dicom2df import dicom2df
+
+from helpers import write_sample_files
 
 ORG_ROOT: str = "9.9.9.9.9"
 
@@ -89,3 +94,37 @@ class MetadataDeidentificationTest(unittest.TestCase):
             )
 
             self.assertIsInstance(df, pd.DataFrame)
+
+    def test_column_wise_deidentification(self):
+        """the column-wise deidentification gives the same dataframe as the per-cell one"""
+        with tempfile.TemporaryDirectory() as indir, tempfile.TemporaryDirectory() as outdir:
+            write_sample_files(indir, sparse_attributes=('AccessionNumber', 'OperatorsName'))
+            # Random pseudonyms are made constant to compare the two implementations
+            with mock.patch('deidcm.dicom.deid_mammogram.gen_dummy_str',
+                            lambda length, mode: 'X' * length):
+                df = deidentify_attributes(indir, outdir, org_root=ORG_ROOT)
+
+                expected = dicom2df(indir)
+                for file in expected.index:
+                    for attribute in expected.columns:
+                        if attribute != 'FilePath':
+                            expected.loc[file, attribute] = apply_deidentification(
+                                attribute, expected[attribute][file], self.config.recipe, ORG_ROOT)
+                expected['PatientIdentityRemoved_0x00120062_CS_1____'] = 'YES'
+
+        pd.testing.assert_frame_equal(df, expected)
+        self.assertTrue(df['PatientName_0x00100010_PN_1____'].str.startswith('PATIENT^').all())
+        self.assertTrue((df['PatientBirthDate_0x00100030_DA_1____'] == '19540101').all())
+        self.assertTrue((df['ContentTime_0x00080033_TM_1____'] == '000000').all())
+        uids = dict(zip(df['FilePath'].map(os.path.basename), df['ConcatenationUID_0x00209161_UI_1____']))
+        self.assertTrue(uids['0.dcm'].startswith(ORG_ROOT))
+        self.assertEqual(uids['0.dcm'], uids['1.dcm'])
+        self.assertNotEqual(uids['0.dcm'], uids['2.dcm'])
+
+    def test_random_pseudonyms_per_value(self):
+        """random pseudonyms are still drawn for each file"""
+        with tempfile.TemporaryDirectory() as indir, tempfile.TemporaryDirectory() as outdir:
+            write_sample_files(indir, sparse_attributes=('AccessionNumber', 'OperatorsName'))
+            df = deidentify_attributes(indir, outdir, org_root=ORG_ROOT)
+        patient_names = df['PatientName_0x00100010_PN_1____']
+        self.assertEqual(len(set(patient_names)), 3)
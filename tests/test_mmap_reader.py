@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import filecmp
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pydicom
+from pydicom.uid import ImplicitVRLittleEndian, RLELossless
+
+from deidcm.config import Config
+from deidcm.dicom.deid_mammogram import deidentify_image_ndarray
+from deidcm.dicom.df2dicom import df2dicom
+from deidcm.dicom.dicom2df import dicom2df
+from deidcm.dicom.mmap_reader import is_mappable, read_dicom_mmap
+
+from helpers import WORD, FakeReader, create_synthetic_dataset, write_synthetic_dicom
+
+
+class MmapReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'image.dcm')
+        self.pixels = np.arange(100 * 80, dtype=np.uint16).reshape(100, 80)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_explicit_vr(self):
+        write_synthetic_dicom(self.path, self.pixels)
+        ds, pixels = read_dicom_mmap(self.path)
+        self.assertIsInstance(pixels, np.memmap)
+        self.assertFalse(pixels.flags.writeable)
+        self.assertNotIn('PixelData', ds)
+        np.testing.assert_array_equal(pixels, pydicom.dcmread(self.path).pixel_array)
+
+    def test_implicit_vr(self):
+        ds = create_synthetic_dataset(self.pixels.astype(np.uint8))
+        ds.file_meta.TransferSyntaxUID = ImplicitVRLittleEndian
+        ds.is_implicit_VR = True
+        ds.save_as(self.path, write_like_original=False)
+        _, pixels = read_dicom_mmap(self.path)
+        self.assertIsInstance(pixels, np.memmap)
+        np.testing.assert_array_equal(pixels, pydicom.dcmread(self.path).pixel_array)
+
+    def test_fallback(self):
+        """files that cannot be mapped are decoded by pydicom"""
+        ds = create_synthetic_dataset(self.pixels)
+        ds.file_meta.TransferSyntaxUID = RLELossless
+        self.assertFalse(is_mappable(ds))
+        ds = create_synthetic_dataset(self.pixels.astype(np.int16))
+        ds.PixelRepresentation, ds.BitsStored, ds.HighBit = 1, 12, 11
+        ds.save_as(self.path, write_like_original=False)
+        _, pixels = read_dicom_mmap(self.path)
+        self.assertNotIsInstance(pixels, np.memmap)
+        self.assertFalse(pixels.flags.writeable)
+
+    def test_deidentify_mapped_pixels(self):
+        """a memory-mapped image is deidentified like a decoded one"""
+        Config()
+        write_synthetic_dicom(self.path, self.pixels)
+        reader = FakeReader([WORD])
+        expected = deidentify_image_ndarray(pydicom.dcmread(self.path), reader=reader)
+        ds, pixels = read_dicom_mmap(self.path)
+        np.testing.assert_array_equal(
+            deidentify_image_ndarray(ds, reader=reader, pixels=pixels), expected)
+
+    def test_df2dicom_with_mmap(self):
+        with tempfile.TemporaryDirectory() as loaded_dir, tempfile.TemporaryDirectory() as mapped_dir:
+            write_synthetic_dicom(self.path, self.pixels.astype(np.uint8))
+            df = dicom2df(self.tmpdir.name, with_pixels=True)
+            df2dicom(df, loaded_dir, output_file_formats=['png', 'dcm'])
+            df2dicom(df, mapped_dir, output_file_formats=['png', 'dcm'], use_mmap=True)
+            for filename in os.listdir(loaded_dir):
+                self.assertTrue(filecmp.cmp(os.path.join(loaded_dir, filename),
+                                            os.path.join(mapped_dir, filename), shallow=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
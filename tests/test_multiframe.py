@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pydicom
+from PIL import Image
+
+from deidcm.config import Config
+from deidcm.dicom.deid_mammogram import (
+    deidentify_attributes,
+    deidentify_frames,
+    deidentify_image_ndarray,
+    deidentify_volume,
+    hide_text_volume,
+    save_deidentified_image_png
+)
+from deidcm.dicom.df2dicom import df2dicom, write_dicom_frames
+from deidcm.dicom.encoding import encode_dataset
+from deidcm.dicom import multiframe
+from deidcm.dicom.mmap_reader import read_dicom_mmap, read_dicom_pixels
+from deidcm.dicom.multiframe import FrameReader, get_number_of_frames, get_sample_frame_indices
+
+from helpers import WORD, FakeReader, create_synthetic_dataset, write_synthetic_dicom
+
+
+def get_frame_word_reader():
+    """OCR reader detecting a word on the frames where it is burned in"""
+    return FakeReader([WORD], when=lambda image: image[25, 30] != 0)
+
+
+def fake_warm_up_reader(languages, gpu, **options):
+    return FakeReader([])
+
+
+class MultiframeTest(unittest.TestCase):
+
+    def setUp(self):
+        Config()
+        self.volume = np.arange(12 * 60 * 50, dtype=np.uint16).reshape(12, 60, 50) % 4000 + 1
+
+    def test_sample_frame_indices(self):
+        self.assertEqual(get_sample_frame_indices(12, 3), [0, 6, 11])
+        self.assertEqual(get_sample_frame_indices(2, 3), [0, 1])
+        self.assertEqual(get_sample_frame_indices(1, 3), [0])
+        with self.assertRaises(ValueError):
+            get_sample_frame_indices(12, 0)
+
+    def test_frame_reader_native(self):
+        ds = create_synthetic_dataset(self.volume)
+        frames = FrameReader(ds)
+        self.assertEqual(len(frames), 12)
+        self.assertEqual(get_number_of_frames(ds), 12)
+        self.assertEqual(frames.dtype, np.uint16)
+        for index in (0, 5, -1):
+            np.testing.assert_array_equal(frames[index], ds.pixel_array[index])
+        with self.assertRaises(IndexError):
+            frames[12]
+
+    def test_frame_reader_compressed(self):
+        ds = create_synthetic_dataset(self.volume)
+        encode_dataset(ds, self.volume, 'rle')
+        frames = FrameReader(ds)
+        self.assertTrue(frames.compressed)
+        np.testing.assert_array_equal(np.stack(list(frames)), self.volume)
+
+    def test_frame_reader_mmap(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'volume.dcm')
+            write_synthetic_dicom(path, self.volume)
+            ds, pixels = read_dicom_mmap(path)
+            frames = FrameReader(ds, pixels)
+            np.testing.assert_array_equal(frames[3], self.volume[3])
+            del frames, pixels
+
+    def test_boxes_propagated_to_all_frames(self):
+        """words read on a sampled frame are hidden on every frame"""
+        volume = self.volume.copy()
+        volume[:6, 20:31, 20:41] = 0
+        ds = create_synthetic_dataset(volume)
+        reader = get_frame_word_reader()
+        pixels = deidentify_volume(ds, reader=reader, sample_frames=3)
+        self.assertEqual(reader.calls, 3)
+        self.assertEqual(pixels.shape, volume.shape)
+        # The default margin of 300 pixels hides these small frames entirely
+        self.assertTrue((pixels == 0).all())
+
+        pixels = deidentify_image_ndarray(ds, reader=reader, ocr_options={})
+        self.assertEqual(pixels.shape, volume.shape)
+
+    def test_deidentify_frames(self):
+        """frames are redacted one at a time, after the OCR of the sampled frames"""
+        volume = self.volume.copy()
+        volume[:6, 20:31, 20:41] = 0
+        ds = create_synthetic_dataset(volume)
+        reader = get_frame_word_reader()
+        frames = deidentify_frames(ds, reader=reader)
+        self.assertEqual(reader.calls, 0)
+        first = next(frames)
+        self.assertEqual(reader.calls, 3)
+        self.assertEqual(first.shape, (60, 50))
+        np.testing.assert_array_equal(np.stack([first] + list(frames)),
+                                      deidentify_volume(ds, reader=get_frame_word_reader()))
+        # Without words, frames are the source frames
+        frames = list(deidentify_frames(create_synthetic_dataset(self.volume), reader=FakeReader([])))
+        np.testing.assert_array_equal(np.stack(frames), self.volume)
+
+    def test_write_dicom_frames(self):
+        """volumes are written from their frames, uncompressed or encoded frame by frame"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for encoding in (None, 'rle'):
+                ds = create_synthetic_dataset(self.volume)
+                # The recipe removes the number of frames
+                del ds.NumberOfFrames
+                outpath = os.path.join(tmpdir, str(encoding))
+                write_dicom_frames(ds, iter(self.volume), outpath, encoding)
+                written = pydicom.dcmread(f'{outpath}.dcm')
+                self.assertEqual(written.file_meta.TransferSyntaxUID.is_compressed, encoding is not None)
+                self.assertEqual(written.NumberOfFrames, 12)
+                np.testing.assert_array_equal(written.pixel_array, self.volume)
+
+    def write_compressed_volume(self, path):
+        ds = create_synthetic_dataset(self.volume)
+        encode_dataset(ds, self.volume, 'rle')
+        ds.save_as(path, write_like_original=False)
+
+    def test_read_compressed_volume(self):
+        """compressed volumes are not decoded when read"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'volume.dcm')
+            self.write_compressed_volume(path)
+            for use_mmap in (False, True):
+                ds, pixels = read_dicom_pixels(path, use_mmap)
+                self.assertIsNone(pixels)
+                np.testing.assert_array_equal(np.stack(list(FrameReader(ds))), self.volume)
+
+    def test_df2dicom_compressed_volume(self):
+        """the frames of compressed volumes are decoded one at a time"""
+        decoded = []
+
+        def decode_frame(ds, frame):
+            decoded.append(frame)
+            return multiframe_decode_frame(ds, frame)
+
+        multiframe_decode_frame = multiframe.decode_frame
+        with mock.patch('deidcm.dicom.multiframe.decode_frame', decode_frame):
+            self.check_df2dicom_volume(['dcm'], reader=FakeReader([]), compressed=True)
+        # The sampled frames are decoded for the OCR, then every frame for the output
+        self.assertEqual(len(decoded), 3 + 12)
+
+    def check_df2dicom_volume(self, output_file_formats, compressed=False, **options):
+        """Deidentify a volume without words with df2dicom and check its DICOM output"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            indir, outdir = os.path.join(tmpdir, 'in'), os.path.join(tmpdir, 'out')
+            os.mkdir(indir)
+            os.mkdir(outdir)
+            if compressed:
+                self.write_compressed_volume(os.path.join(indir, 'volume.dcm'))
+            else:
+                write_synthetic_dicom(os.path.join(indir, 'volume.dcm'), self.volume)
+            df = deidentify_attributes(indir, outdir, org_root='9.9.9.9.9')
+            df2dicom(df, outdir, do_image_deidentification=True, output_file_formats=output_file_formats,
+                     **options)
+            outfile = [file for file in os.listdir(outdir) if file.endswith('.dcm')][0]
+            written = pydicom.dcmread(os.path.join(outdir, outfile))
+            self.assertEqual(written.NumberOfFrames, 12)
+            # Without words, the output frames are the source frames
+            np.testing.assert_array_equal(written.pixel_array, self.volume)
+
+    def test_df2dicom_volume(self):
+        """multi-frame outputs keep their number of frames, whatever the way they are written"""
+        for output_file_formats in (['dcm'], ['dcm', 'png']):
+            for encoding in (None, 'rle'):
+                with self.subTest(output_file_formats=output_file_formats, encoding=encoding):
+                    self.check_df2dicom_volume(output_file_formats, reader=FakeReader([]),
+                                               output_encoding=encoding)
+
+    def test_df2dicom_pipeline_volume(self):
+        for encoding in (None, 'rle'):
+            with self.subTest(encoding=encoding):
+                self.check_df2dicom_volume(['dcm'], reader=FakeReader([]), pipeline_options={},
+                                           output_encoding=encoding)
+
+    # Forked workers inherit the patched reader
+    @mock.patch('deidcm.dicom.deid_pool.warm_up_reader', fake_warm_up_reader)
+    def test_df2dicom_pool_volume(self):
+        for encoding in (None, 'rle'):
+            with self.subTest(encoding=encoding):
+                self.check_df2dicom_volume(['dcm'], workers=1, pool_options={'start_method': 'fork'},
+                                           output_encoding=encoding)
+
+    def test_hide_text_volume(self):
+        ocr_data = [([[20, 20], [40, 20], [40, 30], [20, 30]], 'PATIENT', 0.9)]
+        pixels = hide_text_volume(self.volume, ocr_data, margin=0)
+        self.assertTrue((pixels[:, 20:31, 20:41] == 0).all())
+        np.testing.assert_array_equal(pixels[:, 31:], self.volume[:, 31:])
+        blurred = hide_text_volume(self.volume, ocr_data, mode='blur', margin=0)
+        np.testing.assert_array_equal(blurred[:, 31:], self.volume[:, 31:])
+        self.assertFalse((blurred[:, 20:31, 20:41] == self.volume[:, 20:31, 20:41]).all())
+
+    def test_save_volume_png(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outfile = os.path.join(tmpdir, 'volume')
+            save_deidentified_image_png(self.volume[:4].astype(np.uint8), outfile)
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             [f'volume_{i:04d}.png' for i in range(4)])
+            np.testing.assert_array_equal(
+                np.array(Image.open(os.path.join(tmpdir, 'volume_0002.png'))),
+                self.volume[2].astype(np.uint8))
+
+
+if __name__ == '__main__':
+    unittest.main()
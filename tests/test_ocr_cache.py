@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from deidcm.dicom.deid_mammogram import get_text_areas
+from deidcm.dicom.ocr_cache import (
+    OcrCache,
+    get_ocr_fingerprint,
+    get_pixels_hash
+)
+
+from helpers import FakeReader
+
+BOX = [[np.int32(10), np.int32(10)], [30, 10], [30, 20], [10, 20]]
+# Raw easyOCR results contain numpy numbers
+WORDS = [(BOX, 'DUPONT', np.float64(0.9))]
+
+
+class OcrCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'ocr.sqlite')
+        self.pixels = np.zeros((64, 64), dtype=np.uint8)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_pixels_hash(self):
+        """the hash depends on the values, the shape and the dtype of the pixels"""
+        other = self.pixels.copy()
+        other[0, 0] = 1
+        hashes = {
+            get_pixels_hash(self.pixels),
+            get_pixels_hash(other),
+            get_pixels_hash(self.pixels.reshape(32, 128)),
+            get_pixels_hash(self.pixels.astype(np.uint16))
+        }
+        self.assertEqual(len(hashes), 4)
+        self.assertEqual(get_pixels_hash(self.pixels), get_pixels_hash(self.pixels.copy()))
+
+    def test_fingerprint(self):
+        reader = FakeReader(WORDS)
+        self.assertEqual(get_ocr_fingerprint(reader, scale=None), get_ocr_fingerprint(reader, scale=None))
+        self.assertNotEqual(get_ocr_fingerprint(reader, scale=None), get_ocr_fingerprint(reader, scale=0.5))
+
+    def test_persistent_results(self):
+        """results survive the cache and are found again after reopening the database"""
+        cache = OcrCache(self.path)
+        cache.put('key', [(BOX, 'DUPONT', np.float64(0.9))])
+        cache.close()
+        cache = OcrCache(self.path)
+        self.assertEqual(cache.get('key'), [([[10, 10], [30, 10], [30, 20], [10, 20]], 'DUPONT', 0.9)])
+        self.assertIsNone(cache.get('unknown'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+    def test_eviction(self):
+        """least recently used results are evicted when the size limit is exceeded"""
+        cache = OcrCache(self.path, max_bytes=150)
+        cache.put('first', [(BOX, 'DUPONT', 0.9)])
+        cache.put('second', [(BOX, 'DUPONT', 0.9)])
+        cache.get('first')
+        cache.put('third', [(BOX, 'DUPONT', 0.9)])
+        self.assertLessEqual(cache.get_size(), 150)
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('third'))
+        cache.close()
+
+    def test_running_total(self):
+        """the size of the results is only summed in the database when opening it and when evicting"""
+        cache = OcrCache(self.path, max_bytes=150)
+        statements = []
+        cache._connection.set_trace_callback(statements.append)
+        cache.put('first', [(BOX, 'DUPONT', 0.9)])
+        cache.put('first', [(BOX, 'DURAND', 0.9)])
+        self.assertEqual(cache.total_bytes, cache.get_size())
+        self.assertEqual(sum('SUM(size)' in statement for statement in statements), 1)
+        cache.put('second', [(BOX, 'DUPONT', 0.9)])
+        cache.put('third', [(BOX, 'DUPONT', 0.9)])
+        # Results are evicted down to 90% of the limit
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.total_bytes, cache.get_size())
+        cache.close()
+        reopened = OcrCache(self.path)
+        self.assertEqual(reopened.total_bytes, cache.total_bytes)
+        reopened.close()
+
+    def test_get_text_areas_with_cache(self):
+        """the OCR is skipped for pixels already read with the same parameters"""
+        cache = OcrCache(self.path)
+        reader = FakeReader(WORDS)
+        first = get_text_areas(self.pixels, reader=reader, ocr_cache=cache)
+        second = get_text_areas(self.pixels.copy(), reader=reader, ocr_cache=cache)
+        self.assertEqual(reader.calls, 1)
+        self.assertEqual(first[0][1:], second[0][1:])
+        get_text_areas(self.pixels, reader=reader, ocr_cache=cache, regions=[(0, 0, 32, 32)])
+        self.assertEqual(reader.calls, 2)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,10 +10,20 @@ from PIL import Image
 
 from deidcm.dicom.deid_mammogram import (
     deidentify_image_png,
+    deidentify_images,
+    get_batch_shape,
     get_text_areas,
+    pad_image,
 )
 from deidcm.config import Config
 
+from helpers import CORNER_WORD, FakeReader, write_synthetic_dicom
+
+
+def write_sample_dicom(path: str, rows: int, columns: int) -> None:
+    """Write a small 8-bit monochrome DICOM file filled with gray pixels"""
+    write_synthetic_dicom(path, np.full((rows, columns), 128, dtype=np.uint8))
+
 
 class OcrDeidentificationTest(unittest.TestCase):
 
@@ -63,3 +73,31 @@ class OcrDeidentificationTest(unittest.TestCase):
             set(['JTRX4', 'DSLC72']),
             "Words detected should match words written on PNG image"
         )
+
+    def test_pad_image(self):
+        """padding keeps the original pixels in the top-left corner"""
+        pixels = np.ones((3, 2), dtype=np.uint8)
+        padded = pad_image(pixels, (4, 4))
+        self.assertEqual(padded.shape, (4, 4))
+        self.assertEqual(padded.sum(), 6)
+        self.assertTrue((padded[:3, :2] == 1).all())
+        self.assertEqual(get_batch_shape(300, 256), (512, 256))
+
+    def test_deidentify_images(self):
+        """images are submitted by batches of similar sizes"""
+        reader = FakeReader([CORNER_WORD])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for i, shape in enumerate([(40, 30), (50, 30), (300, 30)]):
+                paths.append(os.path.join(tmpdir, f'{i}.dcm'))
+                write_sample_dicom(paths[-1], *shape)
+            results = dict(deidentify_images(paths, batch_size=4, reader=reader))
+
+        self.assertEqual(set(results), set(paths))
+        self.assertEqual(
+            sorted(reader.batches),
+            [[(256, 256)] * 2, [(512, 256)]]
+        )
+        for path, shape in zip(paths, [(40, 30), (50, 30), (300, 30)]):
+            self.assertEqual(results[path].shape, shape)
+            self.assertEqual(results[path][0, 0], 0)
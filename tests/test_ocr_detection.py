@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from deidcm.dicom.ocr_detection import (
+    UNRECOGNIZED_TEXT,
+    could_contain_word,
+    horizontal_to_box,
+    read_text_detection_only
+)
+
+from helpers import FakeReader
+
+
+class OcrDetectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pixels = np.zeros((400, 400), dtype=np.uint8)
+
+    def test_could_contain_word(self):
+        """a box is a candidate when its aspect ratio fits the length of a word"""
+        box = horizontal_to_box([0, 60, 0, 20])
+        self.assertTrue(could_contain_word(box, [3]))
+        self.assertFalse(could_contain_word(box, [20]))
+        self.assertFalse(could_contain_word(box, []))
+
+    def test_no_authorized_words(self):
+        """the recognizer is never run without authorized words"""
+        reader = FakeReader(detections=([[0, 60, 0, 20]], [[[0, 50], [60, 50], [60, 70], [0, 70]]]))
+        ocr_data = read_text_detection_only(self.pixels, reader, [])
+        self.assertEqual(reader.recognized, [])
+        self.assertEqual([found[1] for found in ocr_data], [UNRECOGNIZED_TEXT] * 2)
+        self.assertEqual(ocr_data[0][0], [[0, 0], [60, 0], [60, 20], [0, 20]])
+
+    def test_candidates_are_recognized(self):
+        """only boxes that could contain an authorized word are recognized"""
+        reader = FakeReader(detections=([[0, 60, 0, 20], [0, 380, 100, 120]], []))
+        ocr_data = read_text_detection_only(self.pixels, reader, ['LCC'])
+        self.assertEqual(reader.recognized, [[0, 60, 0, 20]])
+        self.assertEqual([found[1] for found in ocr_data], [UNRECOGNIZED_TEXT, 'LCC'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import threading
+from unittest import mock
+
+from deidcm.dicom import ocr_reader
+from deidcm.dicom.ocr_reader import (
+    get_reader,
+    get_reader_key,
+    warm_up_reader,
+    set_max_cached_readers,
+    clear_reader_cache,
+    get_cached_reader_count,
+    MAX_CACHED_READERS
+)
+
+
+class OcrReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        clear_reader_cache()
+        self.patcher = mock.patch.object(
+            ocr_reader, 'Reader', side_effect=lambda *args, **kwargs: mock.Mock())
+        self.reader_cls = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        set_max_cached_readers(MAX_CACHED_READERS)
+        clear_reader_cache()
+
+    def test_get_reader_is_cached(self):
+        """same configuration returns the same reader, built once"""
+        reader1 = get_reader(['fr'])
+        reader2 = get_reader(('fr',))
+        self.assertIs(reader1, reader2)
+        self.assertEqual(self.reader_cls.call_count, 1)
+
+    def test_get_reader_key(self):
+        """language order does not matter, options do"""
+        self.assertEqual(get_reader_key(['fr', 'en']), get_reader_key(['en', 'fr']))
+        self.assertNotEqual(
+            get_reader_key(['fr']),
+            get_reader_key(['fr'], quantize=False)
+        )
+
+    def test_cache_is_bounded(self):
+        """least recently used reader is evicted"""
+        set_max_cached_readers(2)
+        fr_reader = get_reader(['fr'])
+        get_reader(['en'])
+        get_reader(['fr'])
+        get_reader(['de'])
+        self.assertEqual(get_cached_reader_count(), 2)
+        self.assertIs(get_reader(['fr']), fr_reader)
+        self.assertEqual(self.reader_cls.call_count, 3)
+
+    def test_warm_up_reader(self):
+        """warm up runs the reader once"""
+        reader = warm_up_reader(['fr'])
+        reader.readtext.assert_called_once()
+        self.assertIs(get_reader(['fr']), reader)
+
+    def test_concurrent_access(self):
+        """concurrent callers share a single reader"""
+        readers = []
+
+        def worker():
+            readers.append(get_reader(['fr']))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.reader_cls.call_count, 1)
+        self.assertTrue(all(reader is readers[0] for reader in readers))
+
+    def test_build_does_not_block_other_readers(self):
+        """a reader being built does not block the readers of other languages"""
+        building, release = threading.Event(), threading.Event()
+
+        def build(languages, **kwargs):
+            if languages == ['fr']:
+                building.set()
+                release.wait(5)
+            return mock.Mock()
+
+        self.reader_cls.side_effect = build
+        thread = threading.Thread(target=get_reader, args=(['fr'],))
+        thread.start()
+        try:
+            self.assertTrue(building.wait(5))
+            get_reader(['en'])
+            self.assertTrue(thread.is_alive())
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(get_cached_reader_count(), 2)
+        self.assertEqual(self.reader_cls.call_count, 2)
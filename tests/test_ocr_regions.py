@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from deidcm.dicom.ocr_regions import (
+    get_bounding_box,
+    scale_ocr_data,
+    translate_ocr_data,
+    read_text_cascade,
+    get_edge_bands,
+    get_roi_regions,
+    read_text_in_regions,
+    get_tiles,
+    merge_tiled_ocr_data,
+    read_text_tiled
+)
+
+from helpers import FakeReader
+
+BOX = [[10, 10], [30, 10], [30, 20], [10, 20]]
+
+
+class OcrRegionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pixels = np.zeros((400, 200), dtype=np.uint8)
+
+    def test_box_helpers(self):
+        """boxes are scaled and translated point by point"""
+        self.assertEqual(get_bounding_box(BOX), (10, 10, 30, 20))
+        scaled = scale_ocr_data([(BOX, 'LCC', 0.9)], 2)
+        self.assertEqual(get_bounding_box(scaled[0][0]), (20, 20, 60, 40))
+        moved = translate_ocr_data([(BOX, 'LCC', 0.9)], 5, -5)
+        self.assertEqual(get_bounding_box(moved[0][0]), (15, 5, 35, 15))
+        self.assertEqual(moved[0][1:], ('LCC', 0.9))
+
+    def test_cascade_confident_box(self):
+        """confident boxes are mapped back without a second pass"""
+        reader = FakeReader([], results=[[(BOX, 'LCC', 0.9)]])
+        ocr_data = read_text_cascade(self.pixels, reader, scale=0.5)
+        self.assertEqual(reader.shapes, [(200, 100)])
+        self.assertEqual(get_bounding_box(ocr_data[0][0]), (20, 20, 60, 40))
+
+    def test_cascade_low_confidence_box(self):
+        """low confidence boxes are read again on a full-resolution crop"""
+        reader = FakeReader([], results=[
+            [(BOX, 'LCO', 0.1)],
+            [([[0, 0], [5, 0], [5, 5], [0, 5]], 'LCC', 0.9)]
+        ])
+        ocr_data = read_text_cascade(self.pixels, reader, scale=0.5, padding=10)
+        self.assertEqual(reader.shapes, [(200, 100), (40, 60)])
+        self.assertEqual(ocr_data[0][1], 'LCC')
+        self.assertEqual(get_bounding_box(ocr_data[0][0]), (10, 10, 15, 15))
+
+    def test_cascade_unconfirmed_box_is_kept(self):
+        """a box that cannot be read again is still hidden"""
+        reader = FakeReader([], results=[[(BOX, 'LCO', 0.1)]])
+        ocr_data = read_text_cascade(self.pixels, reader, scale=0.5)
+        self.assertEqual(len(ocr_data), 1)
+        self.assertEqual(ocr_data[0][1], 'LCO')
+
+    def test_cascade_fallback(self):
+        """the full-resolution image is read when nothing is found"""
+        reader = FakeReader([], results=[[], [(BOX, 'LCC', 0.9)]])
+        ocr_data = read_text_cascade(self.pixels, reader, scale=0.5)
+        self.assertEqual(reader.shapes, [(200, 100), (400, 200)])
+        self.assertEqual(ocr_data, [(BOX, 'LCC', 0.9)])
+
+        reader = FakeReader([], results=[[]])
+        self.assertEqual(read_text_cascade(
+            self.pixels, reader, scale=0.5, full_resolution_fallback=False), [])
+        self.assertEqual(len(reader.shapes), 1)
+
+    def test_edge_bands(self):
+        """edge bands cover the borders, and side bands overlap the top and bottom bands"""
+        regions = get_roi_regions(self.pixels, 'edges')
+        mask = np.zeros(self.pixels.shape, dtype=int)
+        for x1, y1, x2, y2 in regions:
+            mask[y1:y2, x1:x2] += 1
+        self.assertTrue(mask[0, :].all() and mask[-1, :].all())
+        self.assertTrue(mask[:, 0].all() and mask[:, -1].all())
+        self.assertFalse(mask[200, 100])
+        # 1 - (1 - 2 * 0.15) ** 2 of the image is covered
+        self.assertAlmostEqual((mask > 0).mean(), 0.51, places=2)
+
+        # A word on the border between the top and left bands fits in the left band
+        word = (5, 50, 25, 70)
+        self.assertTrue(any(x1 <= word[0] and y1 <= word[1] and word[2] <= x2 and word[3] <= y2
+                            for x1, y1, x2, y2 in regions))
+        bands = get_edge_bands((400, 200), overlap=0)
+        self.assertEqual(bands[2], (0, 60, 30, 340))
+        self.assertEqual(get_edge_bands((400, 200), overlap=1000)[2], (0, 0, 30, 400))
+
+    def test_template_regions(self):
+        """templates are selected by manufacturer"""
+        templates = {'ACME': [(0.5, 0, 1, 0.25)]}
+        self.assertEqual(
+            get_roi_regions(self.pixels, templates, 'ACME'), [(100, 0, 200, 100)])
+        self.assertEqual(
+            get_roi_regions(self.pixels, templates, 'OTHER'), [(0, 0, 200, 400)])
+        with self.assertRaises(ValueError):
+            get_roi_regions(self.pixels, 'breast')
+
+    def test_background_regions(self):
+        """the region opposite to the breast is kept"""
+        pixels = self.pixels.copy()
+        pixels[:, :96] = 200
+        self.assertEqual(get_roi_regions(pixels, 'auto'), [(96, 0, 200, 400)])
+        self.assertEqual(get_roi_regions(self.pixels, 'auto'), [(0, 0, 200, 400)])
+
+    def test_bright_background_regions(self):
+        """the whole image is read when the bright component covers it"""
+        # White background of a MONOCHROME1 image, with a dark corner label
+        pixels = np.full((400, 200), 255, dtype=np.uint8)
+        pixels[8:24, 8:40] = 0
+        self.assertEqual(get_roi_regions(pixels, 'auto'), [(0, 0, 200, 400)])
+        # Breast leaving only thin bands around it
+        pixels = self.pixels.copy()
+        pixels[16:392, 16:184] = 200
+        self.assertEqual(get_roi_regions(pixels, 'auto'), [(0, 0, 200, 400)])
+
+    def test_read_text_in_regions(self):
+        """boxes are translated back to image coordinates"""
+        reader = FakeReader([], results=[[(BOX, 'LCC', 0.9)], [(BOX, 'RCC', 0.9)]])
+        ocr_data = read_text_in_regions(
+            self.pixels, [(0, 0, 50, 50), (100, 300, 200, 400)], reader.readtext, workers=1)
+        self.assertEqual(sorted(reader.shapes), [(50, 50), (100, 100)])
+        self.assertEqual(
+            [get_bounding_box(found[0]) for found in ocr_data],
+            [(10, 10, 30, 20), (110, 310, 130, 320)]
+        )
+
+    def test_get_tiles(self):
+        """tiles overlap and cover the whole region"""
+        tiles = get_tiles((0, 0, 200, 400), tile_size=128, overlap=32)
+        mask = np.zeros(self.pixels.shape, dtype=int)
+        for x1, y1, x2, y2 in tiles:
+            self.assertLessEqual(max(x2 - x1, y2 - y1), 128)
+            mask[y1:y2, x1:x2] += 1
+        self.assertTrue(mask.min() >= 1)
+        self.assertEqual(tiles[0], (0, 0, 128, 128))
+        self.assertEqual(tiles[-1], (72, 272, 200, 400))
+        self.assertEqual(get_tiles((0, 0, 50, 50), tile_size=128, overlap=32), [(0, 0, 50, 50)])
+        with self.assertRaises(ValueError):
+            get_tiles((0, 0, 200, 400), tile_size=128, overlap=128)
+
+    def test_merge_tiled_ocr_data(self):
+        """a word cut by a tile border is merged with the full word of the next tile"""
+        cut = ([[90, 10], [100, 10], [100, 20], [90, 20]], 'DUP', 0.4)
+        full = ([[90, 10], [130, 10], [130, 20], [90, 20]], 'DUPONT', 0.9)
+        neighbour = ([[95, 30], [130, 30], [130, 40], [95, 40]], 'PAUL', 0.9)
+        ocr_data = merge_tiled_ocr_data([(0, cut), (1, full), (1, neighbour)])
+        self.assertEqual(len(ocr_data), 2)
+        self.assertEqual(ocr_data[0][1:], ('DUPONT', 0.9))
+        self.assertEqual(get_bounding_box(ocr_data[0][0]), (90, 10, 130, 20))
+
+    def test_read_text_tiled(self):
+        """every tile is read and boxes are translated back to image coordinates"""
+        reader = FakeReader([], results=[[(BOX, 'LCC', 0.9)]])
+        ocr_data = read_text_tiled(self.pixels, reader.readtext, tile_size=256, overlap=64, workers=1)
+        self.assertEqual(reader.shapes, [(256, 200), (256, 200)])
+        self.assertEqual([get_bounding_box(found[0]) for found in ocr_data], [(10, 10, 30, 20)])
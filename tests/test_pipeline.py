@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import filecmp
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from deidcm.dicom.df2dicom import df2dicom
+from deidcm.dicom.dicom2df import dicom2df
+from deidcm.dicom.pipeline import Stage, run_pipeline
+
+from helpers import write_synthetic_dicom
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_every_item_is_processed(self):
+        results = []
+        lock = threading.Lock()
+
+        def collect(item):
+            with lock:
+                results.append(item)
+
+        stages = [Stage('double', lambda x: 2 * x, 3), Stage('collect', collect, 2)]
+        report = run_pipeline(range(20), stages, queue_size=2)
+        self.assertEqual(sorted(results), list(range(0, 40, 2)))
+        self.assertEqual(report['stages']['double']['items'], 20)
+        self.assertIn(report['bottleneck'], ('double', 'collect'))
+
+    def test_backpressure(self):
+        """a slow stage limits the number of items in flight"""
+        in_flight, peak = [0], [0]
+        lock = threading.Lock()
+
+        def produce(item):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            return item
+
+        def consume(item):
+            time.sleep(0.005)
+            with lock:
+                in_flight[0] -= 1
+
+        report = run_pipeline(range(30), [Stage('produce', produce), Stage('consume', consume)],
+                              queue_size=2)
+        # Queue of 2 items, plus one item in each worker
+        self.assertLessEqual(peak[0], 4)
+        self.assertEqual(report['bottleneck'], 'consume')
+
+    def test_error_is_raised(self):
+        def fail(item):
+            if item == 3:
+                raise ValueError('corrupted file')
+            return item
+
+        with self.assertRaises(ValueError):
+            run_pipeline(range(50), [Stage('fail', fail, 2), Stage('sink', lambda x: None)],
+                         queue_size=1)
+
+    def test_df2dicom_pipeline(self):
+        """the pipeline writes the same files as the sequential loop"""
+        with tempfile.TemporaryDirectory() as indir, tempfile.TemporaryDirectory() as sequential_dir, \
+                tempfile.TemporaryDirectory() as pipeline_dir:
+            for i in range(4):
+                write_synthetic_dicom(os.path.join(indir, f'{i}.dcm'),
+                                      np.full((40 + i, 30), 128, dtype=np.uint8))
+            df = dicom2df(indir, with_pixels=True)
+            df2dicom(df, sequential_dir, output_file_formats=['png', 'dcm'])
+            report = df2dicom(df, pipeline_dir, output_file_formats=['png', 'dcm'],
+                              pipeline_options={'read_workers': 2, 'queue_size': 1})
+            self.assertEqual(sorted(os.listdir(sequential_dir)), sorted(os.listdir(pipeline_dir)))
+            for filename in os.listdir(sequential_dir):
+                self.assertTrue(filecmp.cmp(os.path.join(sequential_dir, filename),
+                                            os.path.join(pipeline_dir, filename), shallow=False))
+        self.assertEqual(report['stages']['write']['items'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from deidcm.dicom.pixel_cache import PixelCache, get_pixel_cache, read_dicom
+
+from helpers import write_synthetic_dicom
+
+
+BUDGET = 16 * 1024 * 1024
+
+
+class TestPixelCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pixels = np.arange(64 * 32, dtype=np.uint16).reshape(64, 32)
+        self.path = os.path.join(self.tmpdir.name, 'image.dcm')
+        write_synthetic_dicom(self.path, self.pixels)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read_decodes_once(self):
+        cache = PixelCache(BUDGET)
+        first = cache.read(self.path)
+        second = cache.read(self.path)
+        self.assertIs(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        np.testing.assert_array_equal(cache.get_pixels(self.path), self.pixels)
+
+    def test_pixels_are_read_only(self):
+        pixels = PixelCache(BUDGET).get_pixels(self.path)
+        with self.assertRaises(ValueError):
+            pixels[0, 0] = 1
+
+    def test_eviction_under_budget(self):
+        other = os.path.join(self.tmpdir.name, 'other.dcm')
+        write_synthetic_dicom(other, self.pixels)
+        file_bytes = self.pixels.nbytes * 2
+        cache = PixelCache(max_bytes=file_bytes)
+        cache.read(self.path)
+        cache.read(other)
+        self.assertEqual(len(cache), 1)
+        self.assertLessEqual(cache.current_bytes, file_bytes)
+        cache.read(self.path)
+        self.assertEqual(cache.misses, 3)
+
+    def test_file_larger_than_budget_is_not_cached(self):
+        cache = PixelCache(max_bytes=16)
+        ds = cache.read(self.path)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.current_bytes, 0)
+        # Pixels that are not shared are not frozen
+        self.assertTrue(ds.pixel_array.flags.writeable)
+
+    def test_modified_file_is_read_again(self):
+        cache = PixelCache(BUDGET)
+        cache.read(self.path)
+        new_pixels = np.zeros((16, 16), dtype=np.uint16)
+        write_synthetic_dicom(self.path, new_pixels)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        np.testing.assert_array_equal(cache.get_pixels(self.path), new_pixels)
+        self.assertEqual(cache.misses, 2)
+
+    def test_no_cache_by_default(self):
+        """files are read once by the deidentification, the default cache keeps nothing"""
+        self.assertEqual(get_pixel_cache().max_bytes, 0)
+        ds = read_dicom(self.path)
+        self.assertIsNot(ds, read_dicom(self.path))
+        self.assertEqual(len(get_pixel_cache()), 0)
+        # The pixels are only decoded when accessed
+        self.assertIsNone(ds._pixel_array)
+        self.assertTrue(ds.pixel_array.flags.writeable)
+
+    def test_read_dicom_with_empty_cache(self):
+        cache = PixelCache(BUDGET)
+        read_dicom(self.path, cache=cache)
+        self.assertEqual(len(cache), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from deidcm.config import Config
+from deidcm.dicom.deid_mammogram import deidentify_image_png, save_deidentified_image_png
+from deidcm.dicom.lut import window_image
+from deidcm.dicom.png_export import check_png_options, encode_png, to_png_depth, write_pngs
+
+from helpers import WORD, FakeReader, create_synthetic_dataset, write_synthetic_dicom
+
+
+class PngExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pixels = (np.arange(100 * 80, dtype=np.uint16) % 4096).reshape(100, 80)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read(self, filename):
+        return np.array(Image.open(os.path.join(self.tmpdir.name, filename)))
+
+    def test_to_png_depth(self):
+        self.assertEqual(to_png_depth(self.pixels).dtype, np.uint16)
+        eight_bits = to_png_depth(self.pixels, 8)
+        self.assertEqual(eight_bits.dtype, np.uint8)
+        np.testing.assert_array_equal(eight_bits, self.pixels >> 4)
+        self.assertEqual(to_png_depth(self.pixels.astype(np.uint8)).dtype, np.uint8)
+        np.testing.assert_array_equal(to_png_depth(np.array([[-5, 70000]]), 16), [[0, 65535]])
+
+    def test_lossless_16_bits(self):
+        for strategy in ('default', 'rle', 'huffman'):
+            for compression in (0, 1, 9):
+                outfile = os.path.join(self.tmpdir.name, 'image')
+                save_deidentified_image_png(self.pixels, outfile,
+                                            {'compression': compression, 'strategy': strategy})
+                np.testing.assert_array_equal(self.read('image.png'), self.pixels)
+
+    def test_compression_level(self):
+        fast = encode_png(self.pixels, compression=0)
+        small = encode_png(self.pixels, compression=9)
+        self.assertLess(len(small), len(fast))
+
+    def test_rgb(self):
+        rgb = np.zeros((10, 12, 3), dtype=np.uint8)
+        rgb[..., 0] = 255
+        save_deidentified_image_png(rgb, os.path.join(self.tmpdir.name, 'rgb'))
+        np.testing.assert_array_equal(self.read('rgb.png'), rgb)
+
+    def test_write_pngs(self):
+        paths = [os.path.join(self.tmpdir.name, f'{i}.png') for i in range(4)]
+        write_pngs(paths, [self.pixels + i for i in range(4)], workers=2, bit_depth=16)
+        np.testing.assert_array_equal(self.read('3.png'), self.pixels + 3)
+        with self.assertRaises(ValueError):
+            write_pngs(paths, [self.pixels])
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            check_png_options({'bit_depth': 12})
+        with self.assertRaises(ValueError):
+            check_png_options({'compression': 10})
+        with self.assertRaises(ValueError):
+            check_png_options({'strategy': 'lzw'})
+        with self.assertRaises(ValueError):
+            check_png_options({'level': 1})
+        with self.assertRaises(ValueError):
+            save_deidentified_image_png(self.pixels, os.path.join(self.tmpdir.name, 'image'),
+                                        {'window': True})
+
+    def test_windowed_png(self):
+        """the windowed image read by the OCR is redacted and written on 8 bits"""
+        Config()
+        path = os.path.join(self.tmpdir.name, 'image.dcm')
+        ds = create_synthetic_dataset(self.pixels)
+        ds.WindowCenter, ds.WindowWidth = 2048, 4096
+        ds.save_as(path, write_like_original=False)
+        deidentify_image_png(path, self.tmpdir.name, 'windowed', reader=FakeReader([WORD]),
+                             png_options={'window': True, 'compression': 1})
+        windowed = self.read('windowed.png')
+        self.assertEqual(windowed.dtype, np.uint8)
+        self.assertEqual(windowed.shape, self.pixels.shape)
+        # The default margin of 300 pixels hides this small image entirely
+        self.assertTrue((windowed == 0).all())
+
+        deidentify_image_png(path, self.tmpdir.name, 'clean', reader=FakeReader([]),
+                             png_options={'window': True})
+        np.testing.assert_array_equal(self.read('clean.png'), window_image(ds, self.pixels))
+
+        write_synthetic_dicom(path, self.pixels)
+        deidentify_image_png(path, self.tmpdir.name, 'raw', reader=FakeReader([WORD]),
+                             png_options={'bit_depth': 16})
+        self.assertEqual(self.read('raw.png').dtype, np.uint16)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from deidcm.config import Config
+from deidcm.dicom.deid_mammogram import deidentify_image_ndarray, get_text_areas
+from deidcm.dicom.df2dicom import df2dicom
+from deidcm.dicom.dicom2df import dicom2df
+from deidcm.dicom.pixel_cache import read_dicom
+from deidcm.dicom.profiling import NullProfiler, Profiler, get_profiler, profiling
+
+from helpers import WORD, FakeReader, write_synthetic_dicom
+
+
+WORDS = [WORD, ([[50, 20], [70, 20], [70, 30], [50, 30]], 'LCC', 0.9)]
+
+
+class Sampler:
+
+    def __init__(self):
+        self.calls = []
+
+    def start(self):
+        self.calls.append('start')
+
+    def stop(self):
+        self.calls.append('stop')
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        Config()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_disabled_by_default(self):
+        profiler = get_profiler()
+        self.assertIsInstance(profiler, NullProfiler)
+        with profiler.file('image.dcm'), profiler.stage('ocr'):
+            profiler.count('boxes')
+
+    def test_nested_records(self):
+        sampler = Sampler()
+        profiler = Profiler(sampler=sampler)
+        with profiler.file('a.dcm') as record:
+            with profiler.stage('ocr'):
+                pass
+            with profiler.file('inner'):
+                with profiler.stage('ocr'):
+                    pass
+                profiler.count('boxes', 3)
+            profiler.set_image_size(100, 80)
+        self.assertEqual(len(profiler.records), 1)
+        self.assertIs(profiler.records[0], record)
+        self.assertEqual(record['file'], 'a.dcm')
+        self.assertEqual((record['rows'], record['columns']), (100, 80))
+        self.assertEqual(record['counters'], {'boxes': 3})
+        self.assertGreaterEqual(record['total_seconds'], record['stages']['ocr'])
+        self.assertEqual(sampler.calls, ['start', 'stop'])
+        self.assertEqual(profiler.get_stats()['files'], 1)
+
+    def test_records_per_thread(self):
+        profiler = Profiler()
+
+        def work(name):
+            with profiler.file(name):
+                profiler.count('boxes')
+
+        threads = [threading.Thread(target=work, args=(str(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(record['file'] for record in profiler.records), ['0', '1', '2', '3'])
+        self.assertTrue(all(record['counters'] == {'boxes': 1} for record in profiler.records))
+        self.assertEqual(profiler.get_stats()['counters'], {'boxes': 4})
+
+    def test_worker_threads(self):
+        """the regions and tiles read by worker threads are timed in the record of the file"""
+        profiler = Profiler()
+        pixels = np.zeros((100, 80), dtype=np.uint8)
+        with profiling(profiler):
+            with profiler.file('regions.dcm'):
+                get_text_areas(pixels, reader=FakeReader([]), regions=[(0, 0, 80, 20), (0, 80, 80, 100)])
+            with profiler.file('tiles.dcm'):
+                get_text_areas(pixels, reader=FakeReader([]), tile_size=40, tile_overlap=10)
+        total = sum(record['stages']['readtext'] for record in profiler.records)
+        self.assertAlmostEqual(total, profiler.get_stats()['stages']['readtext'])
+
+    def test_deidentify_image_ndarray(self):
+        path = os.path.join(self.tmpdir.name, 'image.dcm')
+        write_synthetic_dicom(path, np.full((100, 80), 1000, dtype=np.uint16))
+        jsonl_path = os.path.join(self.tmpdir.name, 'records.jsonl')
+        with profiling(Profiler(jsonl_path=jsonl_path)) as profiler:
+            deidentify_image_ndarray(read_dicom(path), reader=FakeReader(WORDS))
+        self.assertIsInstance(get_profiler(), NullProfiler)
+
+        record = profiler.records[0]
+        self.assertEqual(record['file'], path)
+        self.assertEqual((record['rows'], record['columns']), (100, 80))
+        self.assertEqual(record['counters'], {'boxes': 2})
+        self.assertTrue({'decode', 'lut', 'ocr', 'readtext', 'authorized_words', 'redaction'}
+                        <= set(record['stages']))
+        with open(jsonl_path, encoding='utf8') as f:
+            self.assertEqual(json.loads(f.readline())['file'], path)
+
+    def test_df2dicom(self):
+        indir = os.path.join(self.tmpdir.name, 'in')
+        outdir = os.path.join(self.tmpdir.name, 'out')
+        os.mkdir(indir)
+        os.mkdir(outdir)
+        for i in range(2):
+            write_synthetic_dicom(os.path.join(indir, f'{i}.dcm'), np.full((60, 50), i, dtype=np.uint8))
+        df = dicom2df(indir)
+        with profiling() as profiler:
+            df2dicom(df, outdir, do_image_deidentification=True, output_file_formats=['dcm', 'png'],
+                     reader=FakeReader(WORDS))
+        self.assertEqual(len(profiler.records), 2)
+        for record in profiler.records:
+            self.assertTrue({'decode', 'ocr', 'redaction', 'encode', 'write'} <= set(record['stages']))
+        output = os.path.join(self.tmpdir.name, 'records.jsonl')
+        profiler.write_jsonl(output)
+        with open(output, encoding='utf8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_sampler_rejected_by_pipeline(self):
+        """sampling profilers cannot profile the files deidentified at once by the pipeline"""
+        indir = os.path.join(self.tmpdir.name, 'in')
+        os.mkdir(indir)
+        write_synthetic_dicom(os.path.join(indir, '0.dcm'), np.zeros((60, 50), dtype=np.uint8))
+        df = dicom2df(indir)
+        with profiling(Profiler(sampler=Sampler())):
+            with self.assertRaises(ValueError):
+                df2dicom(df, self.tmpdir.name, output_file_formats=['dcm'], pipeline_options={})
+
+
+if __name__ == '__main__':
+    unittest.main()
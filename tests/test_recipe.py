@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from deidcm.config import Config
+from deidcm.dicom.deid_mammogram import get_attribute_action
+from deidcm.dicom.recipe import (
+    CompiledRecipe,
+    get_cache_dir,
+    get_range_rule,
+    get_recipe_cache_path,
+    is_dicom2df_tag,
+    load_compiled_recipe,
+    write_recipe_cache
+)
+
+RECIPE = {
+    'general_rules': {
+        '0x00100010': ['PatientName', 'PN', 'PSEUDONYMISER'],
+        '0x00080060': ['Modality', 'CS', 'CONSERVER'],
+        '0x00081110': ['ReferencedStudySequence', 'SQ', 'CONSERVER'],
+        '0x00081155': ['ReferencedSOPInstanceUID', 'UI', 'EFFACER'],
+        '0x0040A730': ['ContentSequence', 'SQ', 'CONSERVER']
+    },
+    'specific_rules': {
+        '0x00081155': {'sequence': '0x00081110', 'rule': 'CONSERVER'}
+    }
+}
+
+
+class RecipeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'recipe.json')
+        self.write_recipe(RECIPE)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_recipe(self, recipe):
+        with open(self.path, 'w', encoding='utf8') as f:
+            json.dump(recipe, f)
+
+    def test_range_rules(self):
+        for tag in (0x50ffffff, 0x50a23e56, 0x60003000, 0x60564000, 0x605d3000, 0x00091010):
+            self.assertEqual(get_range_rule(tag), 'RETIRER')
+        for tag in (0x00100010, 0x60003001, 0x60000010, 0x51000010):
+            self.assertIsNone(get_range_rule(tag))
+
+    def test_rules(self):
+        recipe = CompiledRecipe(RECIPE)
+        self.assertEqual(recipe.get_rules(['0x00100010']), ['PSEUDONYMISER'])
+        self.assertEqual(recipe.get_rules(['0x00100030']), ['RETIRER'])
+        self.assertEqual(recipe.get_rules(['0x00081110', '0x00081155']), ['CONSERVER'])
+        self.assertEqual(recipe.get_rules(['0x00081110', '0x00080060', '0x00081155']), ['CONSERVER'])
+        self.assertEqual(recipe.get_rules(['0x00081155']), ['EFFACER'])
+        self.assertEqual(recipe.get_rules(['0x00080060', '0x00081155']), ['CONSERVER', 'EFFACER'])
+        # dicom2df tags are lowercase: uppercase tags of the recipe never matched
+        self.assertEqual(recipe.get_rules(['0x0040a730']), ['RETIRER'])
+
+    def test_same_actions_as_json_recipe(self):
+        """the compiled recipe resolves the attributes of dicom2df like the JSON recipe"""
+        recipe = Config().recipe
+        compiled = CompiledRecipe(recipe)
+        tags = [tag.lower() for tag in recipe['general_rules'] if is_dicom2df_tag(tag.lower())]
+        tags += ['0x50001000', '0x60004000', '0x00091001']
+        attributes = [f'Attribute_{tag}_CS_1____' for tag in tags]
+        for parent, rule in recipe['specific_rules'].items():
+            attributes.append(f'Sequence_{rule["sequence"]}_SQ_1__Attribute_{parent}_UI_1____')
+        attributes.append('Sequence_0x00081110_SQ_1__Attribute_0x00081150_UI_1____')
+        for attribute in attributes:
+            self.assertEqual(get_attribute_action(attribute, compiled),
+                             get_attribute_action(attribute, recipe), attribute)
+
+    def test_disk_cache(self):
+        cache_dir = os.path.join(self.tmpdir.name, 'cache')
+        cache_path = get_recipe_cache_path(self.path, cache_dir)
+        compiled = load_compiled_recipe(self.path, cache_dir=cache_dir)
+        self.assertEqual(os.listdir(cache_dir), [os.path.basename(cache_path)])
+        self.assertEqual(compiled.recipe, RECIPE)
+        # The cache is plain JSON
+        with open(cache_path, encoding='utf8') as f:
+            self.assertEqual(json.load(f)['general_rules'][str(0x00100010)], 'PSEUDONYMISER')
+
+        with mock.patch('deidcm.dicom.recipe.parse_tag') as parse:
+            cached = load_compiled_recipe(self.path, cache_dir=cache_dir)
+        parse.assert_not_called()
+        self.assertEqual(cached.recipe, RECIPE)
+        self.assertEqual(cached.general_rules, compiled.general_rules)
+        self.assertEqual(cached.specific_rules, compiled.specific_rules)
+
+        # The cache is rebuilt when the recipe changes
+        recipe = dict(RECIPE, general_rules={'0x00100010': ['PatientName', 'PN', 'EFFACER']})
+        self.write_recipe(recipe)
+        compiled = load_compiled_recipe(self.path, cache_dir=cache_dir)
+        self.assertEqual(compiled.get_rules(['0x00100010']), ['EFFACER'])
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_default_cache_dir(self):
+        """the cache is written in the cache directory of the user, not next to the recipe"""
+        cache_home = os.path.join(self.tmpdir.name, 'home')
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_home}):
+            load_compiled_recipe(self.path)
+            self.assertTrue(os.path.exists(get_recipe_cache_path(self.path)))
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ['home', 'recipe.json'])
+
+    def test_no_cache_dir(self):
+        """without home directory, the recipe is compiled in memory only"""
+        environ = {key: value for key, value in os.environ.items() if key not in ('HOME', 'XDG_CACHE_HOME')}
+        with mock.patch.dict(os.environ, environ, clear=True), \
+                mock.patch('os.path.expanduser', return_value='~'), \
+                mock.patch('deidcm.dicom.recipe.write_recipe_cache') as write_cache:
+            self.assertIsNone(get_cache_dir())
+            compiled = load_compiled_recipe(self.path)
+        write_cache.assert_not_called()
+        self.assertEqual(compiled.get_rules(['0x00100010']), ['PSEUDONYMISER'])
+        # Relative cache homes are ignored
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': 'cache'}):
+            self.assertTrue(os.path.isabs(get_cache_dir()))
+
+    def test_cache_disabled(self):
+        cache_home = os.path.join(self.tmpdir.name, 'home')
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_home}):
+            load_compiled_recipe(self.path, use_cache=False)
+        self.assertFalse(os.path.exists(cache_home))
+
+    def test_unwritable_cache(self):
+        cache_dir = os.path.join(self.tmpdir.name, 'cache')
+        os.makedirs(get_recipe_cache_path(self.path, cache_dir))
+        with mock.patch('deidcm.dicom.recipe.write_recipe_cache', wraps=write_recipe_cache) as write:
+            compiled = load_compiled_recipe(self.path, cache_dir=cache_dir)
+        write.assert_called_once()
+        self.assertEqual(compiled.get_rules(['0x00100010']), ['PSEUDONYMISER'])
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_missing_recipe(self):
+        with self.assertRaises(FileNotFoundError):
+            load_compiled_recipe(os.path.join(self.tmpdir.name, 'missing.json'))
+
+    def test_config(self):
+        config = Config()
+        self.assertIs(config.compiled_recipe.recipe, config.recipe)
+
+
+if __name__ == '__main__':
+    unittest.main()
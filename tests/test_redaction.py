@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from benchmarks.benchmark import legacy_pil_blur
+from deidcm.dicom.deid_mammogram import hide_text
+from deidcm.dicom.redaction import (
+    get_redaction_boxes,
+    clip_boxes,
+    merge_boxes,
+    redact_rectangles,
+    box_blur,
+    pixelate
+)
+
+
+def make_ocr_data(x1, y1, x2, y2, text='PATIENT'):
+    return ([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], text, 0.9)
+
+
+class RedactionTest(unittest.TestCase):
+
+    def test_get_redaction_boxes(self):
+        """boxes are normalized, enlarged and single characters are ignored"""
+        boxes = get_redaction_boxes([
+            make_ocr_data(10, 20, 30, 40),
+            make_ocr_data(30, 40, 10, 20),
+            make_ocr_data(0, 0, 5, 5, text='I')
+        ], margin=2)
+        self.assertEqual(boxes.tolist(), [[8, 18, 32, 42], [8, 18, 32, 42]])
+
+    def test_clip_boxes(self):
+        """boxes are clipped to the image and dropped when outside"""
+        boxes = np.array([[-5, -5, 5, 5], [8, 8, 20, 20], [12, 0, 15, 3]])
+        self.assertEqual(
+            clip_boxes(boxes, (10, 10)).tolist(),
+            [[0, 0, 5, 5], [8, 8, 9, 9]]
+        )
+
+    def test_merge_boxes(self):
+        """overlapping boxes are merged, even transitively"""
+        boxes = np.array([[0, 0, 5, 5], [20, 20, 25, 25], [5, 5, 10, 10], [9, 0, 12, 2]])
+        self.assertEqual(
+            sorted(merge_boxes(boxes).tolist()),
+            [[0, 0, 12, 10], [20, 20, 25, 25]]
+        )
+
+    def test_redact_preserves_dtype(self):
+        """uint8, uint16 and RGB images keep their dtype and shape"""
+        for pixels, white in [
+            (np.full((50, 50), 100, dtype=np.uint8), 255),
+            (np.full((50, 50), 1000, dtype=np.uint16), 65535),
+            (np.full((50, 50, 3), 100, dtype=np.uint8), 255),
+        ]:
+            result = redact_rectangles(
+                pixels, [make_ocr_data(10, 10, 20, 20)], color_value='white', margin=1)
+            self.assertEqual(result.dtype, pixels.dtype)
+            self.assertEqual(result.shape, pixels.shape)
+            self.assertTrue((result[9:22, 9:22] == white).all())
+            self.assertTrue((result[:9] == pixels[:9]).all())
+            self.assertTrue((pixels[10:20, 10:20] != white).all())
+
+    def test_hide_text_inplace(self):
+        """hide_text writes in the given array only when asked to"""
+        pixels = np.full((50, 50), 100, dtype=np.uint16)
+        result = hide_text(pixels, [make_ocr_data(10, 10, 20, 20)], margin=0)
+        self.assertEqual(pixels.min(), 100)
+        self.assertEqual(result[15, 15], 0)
+        result = hide_text(pixels, [make_ocr_data(10, 10, 20, 20)], margin=0, inplace=True)
+        self.assertIs(result, pixels)
+        self.assertEqual(pixels[15, 15], 0)
+
+    def test_box_blur(self):
+        """each pixel is the mean of its neighbourhood, borders are extended"""
+        rng = np.random.default_rng(0)
+        region = rng.integers(0, 4096, size=(40, 30), dtype=np.uint16)
+        blurred = box_blur(region, 2)
+        self.assertEqual(blurred.dtype, np.uint16)
+        self.assertEqual(blurred[10, 10], np.rint(region[8:13, 8:13].mean()))
+        padded = np.pad(region.astype(float), 2, mode='edge')
+        self.assertEqual(blurred[0, 0], np.rint(padded[0:5, 0:5].mean()))
+        self.assertTrue((box_blur(np.full((5, 5, 3), 7, dtype=np.uint8), 3) == 7).all())
+
+    def test_blur_is_stronger_than_legacy_blur(self):
+        """the default blur removes at least as much detail as the previous implementation"""
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 256, size=(200, 200), dtype=np.uint8)
+        ocr_data = [make_ocr_data(60, 60, 140, 140)]
+        legacy = legacy_pil_blur(pixels, ocr_data, margin=0)
+        blurred = hide_text(pixels, ocr_data, mode='blur', margin=0)
+        self.assertEqual(blurred.dtype, np.uint8)
+        self.assertTrue((blurred[:59] == pixels[:59]).all())
+        self.assertLessEqual(
+            blurred[80:120, 80:120].std(), legacy[80:120, 80:120].std())
+
+    def test_pixelate(self):
+        """blocks are filled with their mean value"""
+        region = np.arange(36, dtype=np.uint8).reshape(6, 6)
+        result = pixelate(region, 4)
+        self.assertEqual(result.shape, (6, 6))
+        self.assertTrue((result[:4, :4] == np.rint(region[:4, :4].mean())).all())
+        result = hide_text(region, [make_ocr_data(0, 0, 5, 5)], mode='pixelate', margin=0, strength=3)
+        self.assertEqual(result[0, 0], np.rint(region[:3, :3].mean()))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from deidcm.dicom.word_matcher import (
+    AuthorizedWordMatcher,
+    get_deletions,
+    get_edit_distance
+)
+
+
+class WordMatcherTest(unittest.TestCase):
+
+    def test_get_deletions(self):
+        self.assertEqual(get_deletions('LCC', 1), {'LCC', 'CC', 'LC'})
+        self.assertEqual(get_deletions('AB', 2), {'AB', 'A', 'B', ''})
+
+    def test_get_edit_distance(self):
+        self.assertEqual(get_edit_distance('RMLO', 'RML0', 2), 1)
+        self.assertEqual(get_edit_distance('RMLO', 'RML', 2), 1)
+        self.assertEqual(get_edit_distance('RMLO', 'LCC', 1), 2)
+
+    def test_exact_match(self):
+        """OCR texts are uppercased, only exact matches are allowed by default"""
+        matcher = AuthorizedWordMatcher(['RMLO', 'LCC'])
+        self.assertEqual(matcher.match('rmlo'), 'RMLO')
+        self.assertIsNone(matcher.match('RML0'))
+        self.assertFalse(matcher.is_authorized('DUPONT'))
+
+    def test_fuzzy_match(self):
+        """near matches are found through the deletion index"""
+        matcher = AuthorizedWordMatcher(['RMLO', 'LCC', 'OBLIQUE G'], max_distance=1)
+        self.assertEqual(matcher.match('RML0'), 'RMLO')
+        self.assertEqual(matcher.match('RMO'), 'RMLO')
+        self.assertEqual(matcher.match('OBLIQUEG'), 'OBLIQUE G')
+        self.assertIsNone(matcher.match('LMO'))
+
+    def test_stats(self):
+        matcher = AuthorizedWordMatcher(['RMLO'], max_distance=1)
+        for text in ['RMLO', 'RML0', 'DUPONT', 'MARTIN']:
+            matcher.match(text)
+        stats = matcher.get_stats()
+        self.assertEqual((stats['lookups'], stats['exact_hits'], stats['fuzzy_hits'], stats['misses']),
+                         (4, 1, 1, 2))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        matcher.reset_stats()
+        self.assertEqual(matcher.get_stats()['lookups'], 0)
+
+    def test_invalid_distance(self):
+        with self.assertRaises(ValueError):
+            AuthorizedWordMatcher(['RMLO'], max_distance=5)
+
+
+if __name__ == '__main__':
+    unittest.main()